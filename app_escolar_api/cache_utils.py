@@ -0,0 +1,117 @@
+import hashlib
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from app_escolar_api.models import VersionTabla
+
+
+class CacheUtils:
+
+    # De qué tablas depende la respuesta de cada recurso
+    DEPENDENCIAS = {
+        "administradores": ("administradores", "usuarios"),
+        "alumnos": ("alumnos", "usuarios"),
+        "maestros": ("maestros", "usuarios"),
+        "materias": ("materias", "maestros", "usuarios"),
+        "busqueda": ("administradores", "alumnos", "maestros", "usuarios"),
+    }
+
+    @staticmethod
+    def versiones(request, recurso):
+        """Versiones de las tablas del recurso; se consultan una sola vez por petición."""
+        cache = request.__dict__.setdefault("_versiones_tablas", {})
+        if recurso not in cache:
+            cache[recurso] = VersionTabla.obtener(CacheUtils.DEPENDENCIAS[recurso])
+        return cache[recurso]
+
+    @staticmethod
+    def etag(request, recurso):
+        """
+        ETag fuerte a partir de las versiones de las tablas y de la URL completa
+        (la misma lista con otros ?fields=/?after= es otra representación).
+        """
+        versiones = CacheUtils.versiones(request, recurso)
+        firma = ".".join(str(versiones[tabla][0]) for tabla in CacheUtils.DEPENDENCIAS[recurso])
+        ruta = hashlib.md5(request.get_full_path().encode("utf-8")).hexdigest()[:16]
+        return f"{recurso}-{firma}-{ruta}"
+
+    @staticmethod
+    def last_modified(request, recurso):
+        fechas = [modificado for version, modificado in CacheUtils.versiones(request, recurso).values() if modificado]
+        return max(fechas) if fechas else None
+
+    @staticmethod
+    def guardar_respuesta(clave, response):
+        """
+        Guarda el cuerpo JSON de una respuesta 200 y regresa la respuesta a enviar.
+        Las respuestas en streaming se copian mientras se envían y solo se guardan
+        si terminan sin pasar de RESPONSE_CACHE_MAX_BYTES.
+        """
+        cache = VersionTabla.cache()
+        if response.status_code != 200:
+            return response
+
+        if isinstance(response, StreamingHttpResponse):
+            limite = getattr(settings, "RESPONSE_CACHE_MAX_BYTES", 5 * 1024 * 1024)
+
+            def copiar(contenido):
+                partes, total = [], 0
+                for parte in contenido:
+                    if partes is not None:
+                        total += len(parte)
+                        if total <= limite:
+                            partes.append(parte)
+                        else:
+                            partes = None
+                    yield parte
+                if partes is not None:
+                    cache.set(clave, b"".join(partes))
+
+            response.streaming_content = copiar(response.streaming_content)
+            return response
+
+        if isinstance(response, Response):
+            contenido = JSONRenderer().render(response.data)
+            cache.set(clave, contenido)
+            return HttpResponse(contenido, content_type="application/json", status=200)
+
+        return response
+
+    @staticmethod
+    def cacheable(recurso):
+        """
+        Decorador para los GET de las vistas:
+          - 304 si If-None-Match / If-Modified-Since coinciden, sin tocar las filas.
+          - Si ya hay una respuesta para la misma URL y las mismas versiones de
+            tablas, se regresa del cache sin consultar la BD.
+        Cualquier escritura (vistas, señales, cascadas) incrementa la versión de su
+        tabla, así que las entradas viejas dejan de usarse y el LRU las descarta.
+        """
+        decorador = condition(
+            etag_func=lambda request, *args, **kwargs: CacheUtils.etag(request, recurso),
+            last_modified_func=lambda request, *args, **kwargs: CacheUtils.last_modified(request, recurso),
+        )
+
+        def envolver(vista):
+            def vista_cache(request, *args, **kwargs):
+                clave = "respuesta:" + CacheUtils.etag(request, recurso)
+                contenido = VersionTabla.cache().get(clave)
+                if contenido is not None:
+                    return HttpResponse(contenido, content_type="application/json", status=200)
+                return CacheUtils.guardar_respuesta(clave, vista(request, *args, **kwargs))
+
+            vista_304 = decorador(vista_cache)
+
+            def vista_condicional(request, *args, **kwargs):
+                response = vista_304(request, *args, **kwargs)
+                # Que el navegador siempre revalide en lugar de usar su copia sin preguntar
+                patch_cache_control(response, private=True, no_cache=True)
+                return response
+            return vista_condicional
+
+        return method_decorator(envolver)
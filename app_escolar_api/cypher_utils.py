@@ -1,33 +1,125 @@
 import base64
-from cryptography.fernet import Fernet, InvalidToken
+import hashlib
+import hmac
+import threading
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from django.conf import settings
 
 class CypherUtils:
+    """
+    Cifrado simétrico (Fernet) con una llave derivada por PBKDF2 de
+    settings.CRYPTO_PASSWORD. Derivar la llave es lo caro, así que el Fernet de
+    cada contraseña se guarda en memoria del proceso; cifrar o descifrar ya no
+    vuelve a correr PBKDF2.
+
+    Rotación: con CRYPTO_PASSWORDS_ANTERIORES se arma un MultiFernet que cifra
+    con la contraseña actual y descifra con cualquiera; rota() re-cifra un valor
+    viejo con la actual. Cambiar la lista no tira las llaves ya derivadas.
+    """
+
+    # Parámetros de PBKDF2: cambiarlos deja ilegible todo lo que ya está cifrado
+    SALT = b'hdjk'
+    ITERACIONES = 1000
+    # Contraseñas distintas que se recuerdan (actual + anteriores)
+    MAX_LLAVES = 32
+
+    _llaves = {}
+    # (contraseñas de settings, MultiFernet) con el que se armó la última vez
+    _multi = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _bytes(password):
+        return password.encode('utf-8') if isinstance(password, str) else password
+
+    @staticmethod
+    def passwords():
+        """Contraseña actual primero y luego las anteriores, sin repetir."""
+        passwords = [settings.CRYPTO_PASSWORD] + list(getattr(settings, "CRYPTO_PASSWORDS_ANTERIORES", ()))
+        vistas = []
+        for password in map(CypherUtils._bytes, passwords):
+            if password and password not in vistas:
+                vistas.append(password)
+        return tuple(vistas)
+
+    @staticmethod
+    def fernet():
+        """MultiFernet de las contraseñas vigentes; se rearma solo si cambian los settings."""
+        passwords = CypherUtils.passwords()
+        multi = CypherUtils._multi
+        if multi is None or multi[0] != passwords:
+            multi = (passwords, MultiFernet([CypherUtils.cipherFernet(p) for p in passwords]))
+            CypherUtils._multi = multi
+        return multi[1]
 
     @staticmethod
     def encripta(plaintext):
-        password = settings.CRYPTO_PASSWORD
-        enc_bytes =  CypherUtils.encrypt1(plaintext.encode('utf-8'), password.encode('utf-8'))
-        return enc_bytes.decode('utf-8')
+        return CypherUtils.fernet().encrypt(plaintext.encode('utf-8')).decode('utf-8')
 
     @staticmethod
     def desencripta(cyphertext):
-        password = settings.CRYPTO_PASSWORD
-        denc_bytes =  CypherUtils.decrypt1(cyphertext.encode('utf-8'), password.encode('utf-8'))
-        return denc_bytes.decode('utf-8')
+        return CypherUtils.fernet().decrypt(cyphertext.encode('utf-8')).decode('utf-8')
 
     @staticmethod
-    def cipherFernet(password):
-        key = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=b'hdjk', iterations=1000, backend=default_backend()).derive(password)
+    def encripta_many(textos):
+        """encripta() de cada texto con el mismo Fernet; None se deja como None."""
+        fernet = CypherUtils.fernet()
+        return [None if texto is None else fernet.encrypt(texto.encode('utf-8')).decode('utf-8') for texto in textos]
+
+    @staticmethod
+    def desencripta_many(cifrados):
+        """desencripta() de cada valor; None se deja como None. Lanza InvalidToken como desencripta()."""
+        fernet = CypherUtils.fernet()
+        return [None if cifrado is None else fernet.decrypt(cifrado.encode('utf-8')).decode('utf-8') for cifrado in cifrados]
+
+    @staticmethod
+    def rota(cyphertext):
+        """Re-cifra con la contraseña actual un valor cifrado con cualquiera de las vigentes."""
+        return CypherUtils.fernet().rotate(cyphertext.encode('utf-8')).decode('utf-8')
+
+    @staticmethod
+    def rota_many(cifrados):
+        fernet = CypherUtils.fernet()
+        return [None if cifrado is None else fernet.rotate(cifrado.encode('utf-8')).decode('utf-8') for cifrado in cifrados]
+
+    @staticmethod
+    def huella(valor):
+        """
+        HMAC-SHA256 (hex) del valor normalizado, para buscar por igualdad en
+        columnas cifradas sin descifrar nada. La llave es CRYPTO_HUELLA_KEY y no
+        la contraseña de cifrado, así que rotar ésta no cambia las huellas.
+        """
+        if valor is None or valor == "":
+            return None
+        llave = CypherUtils._bytes(settings.CRYPTO_HUELLA_KEY)
+        return hmac.new(llave, str(valor).strip().upper().encode('utf-8'), hashlib.sha256).hexdigest()
+
+    @staticmethod
+    def derivar(password):
+        """PBKDF2 sin cache; usar cipherFernet()."""
+        key = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=CypherUtils.SALT, iterations=CypherUtils.ITERACIONES, backend=default_backend()).derive(CypherUtils._bytes(password))
         return Fernet(base64.urlsafe_b64encode(key))
 
+    @staticmethod
+    def cipherFernet(password):
+        password = CypherUtils._bytes(password)
+        fernet = CypherUtils._llaves.get(password)
+        if fernet is None:
+            # Dos hilos pueden derivar la misma llave a la vez; el resultado es idéntico
+            fernet = CypherUtils.derivar(password)
+            with CypherUtils._lock:
+                if len(CypherUtils._llaves) >= CypherUtils.MAX_LLAVES:
+                    CypherUtils._llaves.clear()
+                CypherUtils._llaves[password] = fernet
+        return fernet
+
     @staticmethod
     def encrypt1(plaintext, password):
         return CypherUtils.cipherFernet(password).encrypt(plaintext)
 
     @staticmethod
     def decrypt1(ciphertext, password):
-        return CypherUtils.cipherFernet(password).decrypt(ciphertext)
\ No newline at end of file
+        return CypherUtils.cipherFernet(password).decrypt(ciphertext)
@@ -4,9 +4,26 @@ import requests
 import datetime
 import random
 import string
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from requests.adapters import HTTPAdapter
 
 class DataUtils:
 
+    # Formatos que cuentan como imagen en is_url_image / are_urls_images
+    IMAGE_FORMATS = ("image/png", "image/jpeg", "image/jpg")
+    # Segundos que se recuerda una URL que no respondió (las que sí, URL_CHECK_TTL)
+    TTL_ERROR = 30
+    MAX_URLS_CACHE = 10000
+
+    _session = None
+    _pool = None
+    _lock = threading.Lock()
+    # url -> (content-type o None si falló, expira)
+    _tipos = {}
+
     @staticmethod
     def generate_frontend_enc_key():
         key_1 = DataUtils.randomNumber(4)
@@ -64,14 +81,101 @@ class DataUtils:
     def is_url(text):
         return text.startswith('http://') or text.startswith('https://')
 
+    @staticmethod
+    def session():
+        """Session compartida: conexiones keep-alive por host, tantas como hilos de revisión."""
+        if DataUtils._session is None:
+            with DataUtils._lock:
+                if DataUtils._session is None:
+                    workers = getattr(settings, "URL_CHECK_WORKERS", 8)
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=0)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    DataUtils._session = session
+        return DataUtils._session
+
+    @staticmethod
+    def pool():
+        if DataUtils._pool is None:
+            with DataUtils._lock:
+                if DataUtils._pool is None:
+                    DataUtils._pool = ThreadPoolExecutor(
+                        max_workers=getattr(settings, "URL_CHECK_WORKERS", 8), thread_name_prefix="url-check"
+                    )
+        return DataUtils._pool
+
+    @staticmethod
+    def guardado(url):
+        """(True, content-type) si la URL sigue en cache; (False, None) si hay que revisarla."""
+        guardado = DataUtils._tipos.get(url)
+        if guardado is not None and guardado[1] > time.monotonic():
+            return True, guardado[0]
+        return False, None
+
+    @staticmethod
+    def content_type(url):
+        """
+        Content-Type (sin parámetros, en minúsculas) de la URL o None si no
+        responde a tiempo, no es http(s) o no trae el encabezado. Los resultados
+        se recuerdan URL_CHECK_TTL segundos (TTL_ERROR si falló).
+        """
+        encontrado, tipo = DataUtils.guardado(url)
+        if encontrado:
+            return tipo
+
+        ahora = time.monotonic()
+        tipo = None
+        if DataUtils.is_url(url):
+            timeout = getattr(settings, "URL_CHECK_TIMEOUT", 3)
+            try:
+                r = DataUtils.session().head(url, timeout=timeout, allow_redirects=True)
+                if r.status_code in (405, 501):
+                    # Servidores que no aceptan HEAD: GET sin descargar el cuerpo
+                    with DataUtils.session().get(url, timeout=timeout, stream=True) as r:
+                        pass
+                if r.ok and r.headers.get("content-type"):
+                    tipo = r.headers["content-type"].split(";")[0].strip().lower()
+            except requests.RequestException:
+                pass
+
+        ttl = getattr(settings, "URL_CHECK_TTL", 300) if tipo else DataUtils.TTL_ERROR
+        with DataUtils._lock:
+            if len(DataUtils._tipos) >= DataUtils.MAX_URLS_CACHE:
+                DataUtils._tipos = {u: v for u, v in DataUtils._tipos.items() if v[1] > ahora}
+                if len(DataUtils._tipos) >= DataUtils.MAX_URLS_CACHE:
+                    DataUtils._tipos = {}
+            DataUtils._tipos[url] = (tipo, ahora + ttl)
+        return tipo
+
+    @staticmethod
+    def are_urls_images(urls, formatos=None):
+        """
+        {url: bool} de varias URLs a la vez: las que no están en cache se revisan
+        en paralelo (URL_CHECK_WORKERS hilos, cada petición con URL_CHECK_TIMEOUT),
+        así el tiempo total es el de las más lentas y no la suma.
+        """
+        formatos = formatos or DataUtils.IMAGE_FORMATS
+        urls = list(dict.fromkeys(urls))
+        # Solo van al pool las que no están en cache; las que no son http(s) no se revisan
+        tipos = {}
+        pendientes = []
+        for url in urls:
+            encontrado, tipo = DataUtils.guardado(url)
+            if encontrado or not DataUtils.is_url(url):
+                tipos[url] = tipo
+            else:
+                pendientes.append(url)
+        if len(pendientes) == 1:
+            tipos[pendientes[0]] = DataUtils.content_type(pendientes[0])
+        elif pendientes:
+            tipos.update(zip(pendientes, DataUtils.pool().map(DataUtils.content_type, pendientes)))
+        return {url: tipos[url] in formatos for url in urls}
+
     @staticmethod
     def is_url_image(image_url):
-        image_formats = ("image/png", "image/jpeg", "image/jpg")
-        r = requests.head(image_url)
-        print("Content type:: "+str(r.headers["content-type"]))
-        if r.headers["content-type"] in image_formats:
-            return True
-        return False
+        """Compatibilidad: una sola URL. Regresa False (en lugar de lanzar) si no responde."""
+        return DataUtils.content_type(image_url) in DataUtils.IMAGE_FORMATS
 
     @staticmethod
     def getUrl(request):
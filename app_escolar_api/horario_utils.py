@@ -0,0 +1,273 @@
+import heapq
+from bisect import bisect_left, bisect_right
+from itertools import count
+from django.db.models import Q, Value
+from django.db.models.functions import Concat
+
+from app_escolar_api.models import Maestros, Materias
+
+
+class IndiceHorario:
+    """
+    Intervalos [hora_inicio, hora_fin) agrupados por (recurso, día), donde el
+    recurso es ("salon", salón) o ("profesor", id). Cada grupo está ordenado por
+    hora de inicio y tiene encima un árbol de segmentos con el máximo de
+    hora_fin de cada rango. Una consulta corta los candidatos con una búsqueda
+    binaria (los que empiezan antes de que termine) y baja por el árbol solo
+    por las ramas que terminan después de que empieza: O(log n) más O(log n)
+    por choque encontrado, aunque haya una clase larga al principio del día o
+    el catálogo ya traiga choques viejos. Las clases que terminan justo cuando
+    empieza otra no chocan.
+    """
+
+    def __init__(self, filas=()):
+        # (recurso, día) -> [inicios], [(inicio, fin, id, nrc)], árbol de máximos de fin
+        self._inicios = {}
+        self._intervalos = {}
+        self._arboles = {}
+        grupos = {}
+        for fila in filas:
+            for clave, intervalo in HorarioUtils.intervalos(fila):
+                grupos.setdefault(clave, []).append(intervalo)
+        # Al construir se ordena cada grupo una vez: O(n log n)
+        for clave, intervalos in grupos.items():
+            intervalos.sort(key=HorarioUtils.orden)
+            self._intervalos[clave] = intervalos
+            self._inicios[clave] = [intervalo[0] for intervalo in intervalos]
+
+    def agregar(self, fila):
+        """Agrega una materia ya revisada (p. ej. la anterior de un lote)."""
+        for clave, intervalo in HorarioUtils.intervalos(fila):
+            inicios = self._inicios.setdefault(clave, [])
+            intervalos = self._intervalos.setdefault(clave, [])
+            posicion = bisect_right(inicios, intervalo[0])
+            inicios.insert(posicion, intervalo[0])
+            intervalos.insert(posicion, intervalo)
+            # El árbol del grupo se rehace (O(n)) en la siguiente consulta
+            self._arboles.pop(clave, None)
+
+    def arbol(self, clave):
+        arbol = self._arboles.get(clave)
+        if arbol is None:
+            arbol = self._arboles[clave] = HorarioUtils.arbol_maximos([intervalo[1] for intervalo in self._intervalos[clave]])
+        return arbol
+
+    def choques(self, fila):
+        """Lista de choques de `fila` (ver HorarioUtils.choque) contra lo indexado."""
+        choques = []
+        for clave, (inicio, fin, materia_id, nrc) in HorarioUtils.intervalos(fila):
+            inicios = self._inicios.get(clave)
+            if not inicios:
+                continue
+            intervalos = self._intervalos[clave]
+            # Candidatos: los que empiezan antes de que termine `fila`; de ésos,
+            # los que terminan después de que empieza
+            candidatos = bisect_left(inicios, fin)
+            for i in HorarioUtils.terminan_despues(self.arbol(clave), candidatos, inicio):
+                otro = intervalos[i]
+                if materia_id is None or otro[2] != materia_id:
+                    choques.append(HorarioUtils.choque(clave, otro, max(inicio, otro[0]), min(fin, otro[1])))
+        return choques
+
+
+class HorarioUtils:
+
+    # Columnas de Materias que necesita el índice
+    COLUMNAS = ("id", "nrc", "salon", "profesor_id", "dias", "hora_inicio", "hora_fin")
+
+    @staticmethod
+    def orden(intervalo):
+        # Solo por horas: el id de una materia nueva es None
+        return intervalo[0], intervalo[1]
+
+    @staticmethod
+    def arbol_maximos(valores):
+        """
+        Árbol de segmentos en un arreglo: las hojas (desde la posición `hojas`)
+        son los valores y cada nodo guarda el máximo de sus dos hijos; None en
+        las hojas sobrantes. Regresa (hojas, nodos).
+        """
+        hojas = 1
+        while hojas < len(valores):
+            hojas *= 2
+        nodos = [None] * hojas + list(valores) + [None] * (hojas - len(valores))
+        for nodo in range(hojas - 1, 0, -1):
+            izquierdo, derecho = nodos[2 * nodo], nodos[2 * nodo + 1]
+            nodos[nodo] = izquierdo if derecho is None or (izquierdo is not None and izquierdo >= derecho) else derecho
+        return hojas, nodos
+
+    @staticmethod
+    def terminan_despues(arbol, limite, inicio):
+        """Posiciones i < limite (en orden) cuyo valor es mayor que `inicio`; no entra a ramas que no tienen ninguna."""
+        hojas, nodos = arbol
+        posiciones = []
+        # (nodo, primera hoja que cubre, tamaño)
+        pendientes = [(1, 0, hojas)]
+        while pendientes:
+            nodo, desde, tamano = pendientes.pop()
+            if desde >= limite or nodos[nodo] is None or nodos[nodo] <= inicio:
+                continue
+            if nodo >= hojas:
+                posiciones.append(desde)
+                continue
+            mitad = tamano // 2
+            pendientes.append((2 * nodo + 1, desde + mitad, mitad))
+            pendientes.append((2 * nodo, desde, mitad))
+        return posiciones
+
+    @staticmethod
+    def fila(materia):
+        return {columna: getattr(materia, columna) for columna in HorarioUtils.COLUMNAS}
+
+    @staticmethod
+    def recursos(fila):
+        recursos = []
+        if fila.get("salon"):
+            recursos.append(("salon", fila["salon"]))
+        if fila.get("profesor_id"):
+            recursos.append(("profesor", fila["profesor_id"]))
+        return recursos
+
+    @staticmethod
+    def intervalos(fila):
+        """((recurso, día), (inicio, fin, id, nrc)) de la materia; nada si le falta horario."""
+        inicio, fin = fila.get("hora_inicio"), fila.get("hora_fin")
+        if inicio is None or fin is None or fin <= inicio:
+            return []
+        intervalo = (inicio, fin, fila.get("id"), fila.get("nrc"))
+        return [((recurso, dia), intervalo)
+                for recurso in HorarioUtils.recursos(fila)
+                for dia in Materias.indices_dias(fila.get("dias"))]
+
+    @staticmethod
+    def choque(clave, otro, desde, hasta):
+        (tipo, recurso), dia = clave
+        return {
+            "tipo": tipo,
+            "recurso": recurso,
+            "dia": Materias.DIAS[dia],
+            "materia": otro[2],
+            "nrc": otro[3],
+            "desde": desde.strftime("%H:%M"),
+            "hasta": hasta.strftime("%H:%M"),
+        }
+
+    @staticmethod
+    def mensaje(choque):
+        recurso = "el salón %s" % choque["recurso"] if choque["tipo"] == "salon" else "el profesor"
+        return "Choca con la materia %s en %s el %s de %s a %s." % (
+            choque["nrc"], recurso, choque["dia"], choque["desde"], choque["hasta"])
+
+    @staticmethod
+    def indice(filas, excluir=()):
+        """
+        Índice con las materias guardadas que comparten salón o profesor con
+        alguna de `filas` (sin las de `excluir`). La consulta va por los índices
+        de salon y profesor, así que solo se leen esas materias y no el catálogo.
+        """
+        salones = {fila["salon"] for fila in filas if fila.get("salon")}
+        profesores = {fila["profesor_id"] for fila in filas if fila.get("profesor_id")}
+        if not salones and not profesores:
+            return IndiceHorario()
+        materias = (Materias.objects
+                    .filter(Q(salon__in=salones) | Q(profesor_id__in=profesores))
+                    .exclude(id__in=[i for i in excluir if i is not None])
+                    .exclude(hora_inicio=None).exclude(hora_fin=None))
+        return IndiceHorario(dict(zip(HorarioUtils.COLUMNAS, valores))
+                             for valores in materias.values_list(*HorarioUtils.COLUMNAS))
+
+    @staticmethod
+    def validar(datos, materia=None):
+        """
+        Choques de una materia que se va a crear (materia=None) o actualizar con
+        `datos` (validated_data del serializer). Regresa la lista de mensajes.
+
+        Una sola consulta por materia_dias_hora_idx: las que comparten algún día
+        (dias_mask IN mascaras_con) y se traslapan en horas, del mismo salón o
+        profesor. Se llama dentro del transaction.atomic de la vista: la fila del
+        profesor se bloquea (select_for_update) para que dos altas concurrentes
+        del mismo profesor no pasen las dos la revisión. El salón no tiene fila
+        que bloquear; dos altas simultáneas en el mismo salón y hora aún pueden
+        entrar las dos, y las encuentra /materias/conflictos/.
+        """
+        fila = HorarioUtils.fila(materia) if materia is not None else dict.fromkeys(HorarioUtils.COLUMNAS)
+        for columna in HorarioUtils.COLUMNAS:
+            if columna in datos:
+                fila[columna] = datos[columna]
+        if "profesor" in datos:
+            fila["profesor_id"] = datos["profesor"].pk if datos["profesor"] is not None else None
+        if not HorarioUtils.intervalos(fila):
+            return []
+        recursos = Q()
+        if fila.get("salon"):
+            recursos |= Q(salon=fila["salon"])
+        if fila.get("profesor_id"):
+            Maestros.objects.select_for_update().filter(pk=fila["profesor_id"]).exists()
+            recursos |= Q(profesor_id=fila["profesor_id"])
+        materias = (Materias.objects
+                    .filter(recursos,
+                            dias_mask__in=Materias.mascaras_con(Materias.mascara_dias(fila["dias"])),
+                            hora_inicio__lt=fila["hora_fin"], hora_fin__gt=fila["hora_inicio"])
+                    .exclude(id=fila["id"]))
+        # Solo llegan las que chocan: el índice de memoria solo arma los mensajes
+        choques = IndiceHorario(dict(zip(HorarioUtils.COLUMNAS, valores))
+                                for valores in materias.values_list(*HorarioUtils.COLUMNAS)).choques(fila)
+        return [HorarioUtils.mensaje(choque) for choque in choques]
+
+    @staticmethod
+    def auditar(filas):
+        """
+        Todos los pares de materias que chocan, en un barrido por (recurso, día):
+        se ordena por hora de inicio y se mantiene un heap con las clases en curso
+        ordenadas por hora de fin. O(n log n) más el número de choques.
+        """
+        grupos = {}
+        for fila in filas:
+            for clave, intervalo in HorarioUtils.intervalos(fila):
+                grupos.setdefault(clave, []).append(intervalo)
+
+        conflictos = []
+        desempate = count()
+        for clave in sorted(grupos, key=lambda c: (c[0][0], str(c[0][1]), c[1])):
+            en_curso = []
+            for intervalo in sorted(grupos[clave], key=HorarioUtils.orden):
+                inicio, fin = intervalo[0], intervalo[1]
+                while en_curso and en_curso[0][0] <= inicio:
+                    heapq.heappop(en_curso)
+                for _, _, otro in en_curso:
+                    choque = HorarioUtils.choque(clave, otro, inicio, min(fin, otro[1]))
+                    choque["materias"] = [otro[2], intervalo[2]]
+                    choque["nrcs"] = [otro[3], intervalo[3]]
+                    del choque["materia"], choque["nrc"]
+                    conflictos.append(choque)
+                heapq.heappush(en_curso, (fin, next(desempate), intervalo))
+        return conflictos
+
+    # Columnas de cada clase en la cuadrícula semanal (semana)
+    CLASE = ("id", "nrc", "nombre_materia", "seccion", "salon", "programa_educativo", "profesor_id",
+             "hora_inicio", "hora_fin")
+
+    @staticmethod
+    def semana(materias):
+        """
+        Cuadrícula semanal de un queryset de materias: {"Lunes": [clases por hora
+        de inicio], ..., "Domingo": []} más "sin_horario" con las que no tienen
+        días u horas. Los días salen de dias_mask, sin volver a leer el texto.
+        Se leen solo las columnas de CLASE y el nombre del profesor.
+        """
+        filas = materias.values(*HorarioUtils.CLASE, "dias_mask",
+                                profesor_nombre=Concat("profesor__user__first_name", Value(" "), "profesor__user__last_name"))
+        dias = {dia: [] for dia in Materias.DIAS}
+        sin_horario = []
+        total = 0
+        for fila in filas.order_by("hora_inicio", "nrc"):
+            total += 1
+            mascara = fila.pop("dias_mask")
+            if fila["profesor_id"] is None:
+                fila["profesor_nombre"] = "Sin asignar"
+            if fila["hora_inicio"] is None or not mascara:
+                sin_horario.append(fila)
+                continue
+            for dia in Materias.dias_mascara(mascara):
+                dias[dia].append(fila)
+        return {"total": total, "dias": dias, "sin_horario": sin_horario}
@@ -0,0 +1,303 @@
+import csv
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, models, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from app_escolar_api.cypher_utils import CypherUtils
+from app_escolar_api.list_utils import ListUtils
+from app_escolar_api.models import (
+    CONTADORES_USUARIOS, TABLAS_VERSIONADAS, Alumnos, Contador, MaestroMateria, Maestros, Roles,
+    TokenBusqueda, VersionTabla,
+)
+
+
+def _inicializar_worker():
+    # Con "spawn" (macOS/Windows) el proceso hijo arranca sin Django configurado
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _hashear(password):
+    return make_password(password)
+
+
+class ImportUtils:
+    """
+    Alta masiva de alumnos y maestros desde CSV o JSONL (importar/<tipo>/ y el
+    comando importar_usuarios). El comando hashea las contraseñas en varios
+    procesos; la vista, que acepta pocas filas, en su propio hilo. Las filas se
+    insertan con bulk_create; como bulk_create no manda señales, aquí se
+    actualizan a mano versiones, contadores, índice de búsqueda y materias de
+    los maestros.
+    """
+
+    # Filas por bloque de validación e inserción
+    CHUNK_SIZE = 1000
+    # Con menos contraseñas que esto no vale la pena levantar procesos
+    MINIMO_PARALELO = 32
+
+    CAMPOS_USUARIO = ("first_name", "last_name", "email", "password")
+    # tipo -> (modelo del perfil, grupo, campos del perfil, campo único)
+    TIPOS = {
+        "alumnos": (
+            Alumnos, "alumno",
+            ("matricula", "curp", "rfc", "fecha_nacimiento", "edad", "telefono", "ocupacion"),
+            "matricula",
+        ),
+        "maestros": (
+            Maestros, "maestro",
+            ("id_trabajador", "fecha_nacimiento", "telefono", "rfc", "cubiculo", "area_investigacion"),
+            "id_trabajador",
+        ),
+    }
+    # Igual que en los POST individuales
+    MAYUSCULAS = ("curp", "rfc")
+    # Campos cifrados que tampoco se pueden repetir; se comparan por su huella
+    HUELLAS = {"alumnos": "curp"}
+
+    @staticmethod
+    def formato(nombre="", content_type="", formato=None):
+        """csv o jsonl a partir del parámetro explícito, la extensión o el Content-Type."""
+        formato = (formato or "").lower()
+        nombre = (nombre or "").lower()
+        content_type = (content_type or "").lower()
+        if formato in ("csv", "jsonl"):
+            return formato
+        if formato:
+            raise ValueError("Formato no soportado: %s (usa csv o jsonl)." % formato)
+        if nombre.endswith(".csv") or "csv" in content_type:
+            return "csv"
+        if nombre.endswith((".jsonl", ".ndjson")) or "ndjson" in content_type or "jsonl" in content_type:
+            return "jsonl"
+        raise ValueError("No se pudo determinar el formato del archivo; indica formato=csv o formato=jsonl.")
+
+    @staticmethod
+    def leer(archivo, formato):
+        """
+        Regresa la lista de filas (dict) de un archivo binario. Lanza ValueError
+        si el archivo no se puede leer; los errores de cada fila se reportan después.
+        """
+        texto = io.TextIOWrapper(archivo, encoding="utf-8-sig", newline="")
+        try:
+            if formato == "csv":
+                lector = csv.DictReader(texto)
+                faltantes = [c for c in ImportUtils.CAMPOS_USUARIO if c not in (lector.fieldnames or ())]
+                if faltantes:
+                    raise ValueError("Faltan columnas en el CSV: " + ", ".join(faltantes))
+                return list(lector)
+
+            filas = []
+            for numero, linea in enumerate(texto, start=1):
+                if not linea.strip():
+                    continue
+                try:
+                    fila = json.loads(linea)
+                except ValueError:
+                    raise ValueError("La línea %d no es JSON válido." % numero)
+                if not isinstance(fila, dict):
+                    raise ValueError("La línea %d no es un objeto JSON." % numero)
+                filas.append(fila)
+            return filas
+        except UnicodeDecodeError:
+            raise ValueError("El archivo debe estar en UTF-8.")
+        finally:
+            texto.detach()
+
+    @staticmethod
+    def limpiar(valor):
+        if isinstance(valor, str):
+            valor = valor.strip()
+        return None if valor == "" else valor
+
+    @staticmethod
+    def construir(fila, tipo):
+        """Regresa (user, perfil, materias, errores) de una fila, sin tocar la BD."""
+        modelo, grupo, campos, unico = ImportUtils.TIPOS[tipo]
+        errores = {}
+
+        datos_usuario = {campo: ImportUtils.limpiar(fila.get(campo)) for campo in ImportUtils.CAMPOS_USUARIO}
+        for campo, valor in datos_usuario.items():
+            if valor is None:
+                errores[campo] = ["Este campo es requerido."]
+        email = datos_usuario["email"] or ""
+        user = User(username=email, email=email, first_name=datos_usuario["first_name"] or "",
+                    last_name=datos_usuario["last_name"] or "", is_active=True)
+        user.password = datos_usuario["password"]
+        try:
+            user.clean_fields(exclude=["password"] + list(errores) + ([] if email else ["username"]))
+        except ValidationError as e:
+            # username es el mismo email
+            mensajes = e.message_dict
+            mensajes.setdefault("email", []).extend(mensajes.pop("username", []))
+            errores.update({campo: lista for campo, lista in mensajes.items() if lista})
+
+        datos_perfil = {campo: ImportUtils.limpiar(fila.get(campo)) for campo in campos}
+        for campo in ImportUtils.MAYUSCULAS:
+            if isinstance(datos_perfil.get(campo), str):
+                datos_perfil[campo] = datos_perfil[campo].upper()
+        perfil = modelo(user=user, **datos_perfil)
+        try:
+            perfil.clean_fields(exclude=["user"])
+        except ValidationError as e:
+            errores.update(e.message_dict)
+        # "2001-02-03" en el archivo se toma en la zona horaria del servidor
+        for field in modelo._meta.concrete_fields:
+            valor = getattr(perfil, field.attname)
+            if isinstance(field, models.DateTimeField) and isinstance(valor, datetime) and timezone.is_naive(valor) and settings.USE_TZ:
+                setattr(perfil, field.attname, timezone.make_aware(valor))
+
+        materias = MaestroMateria.normalizar(fila.get("materias_json")) if modelo is Maestros else None
+        return user, perfil, materias, errores
+
+    @staticmethod
+    def validar(filas, tipo):
+        """
+        Valida por bloques: una consulta por bloque para correos ya registrados,
+        otra para el campo único del perfil (matrícula / id de trabajador) y, en
+        alumnos, otra para las CURP ya registradas (por curp_huella).
+        Regresa (validas, errores) con validas = [(fila, user, perfil, materias)].
+        """
+        modelo, grupo, campos, unico = ImportUtils.TIPOS[tipo]
+        validas, errores = [], []
+        vistos_email, vistos_unico, vistos_huella = {}, {}, {}
+        cifrado = ImportUtils.HUELLAS.get(tipo)
+
+        for bloque in ListUtils.bloques(enumerate(filas, start=1), ImportUtils.CHUNK_SIZE):
+            construidas = [(numero,) + ImportUtils.construir(fila, tipo) for numero, fila in bloque]
+
+            emails = [user.username for numero, user, perfil, materias, e in construidas if user.username]
+            registrados = set()
+            for username, email in User.objects.filter(Q(username__in=emails) | Q(email__in=emails)).values_list("username", "email"):
+                registrados.update((username, email))
+            unicos = [getattr(perfil, unico) for numero, user, perfil, materias, e in construidas if getattr(perfil, unico)]
+            unicos_registrados = set(modelo.objects.filter(**{unico + "__in": unicos}).values_list(unico, flat=True))
+            huellas, huellas_registradas = {}, set()
+            if cifrado:
+                huellas = {numero: CypherUtils.huella(getattr(perfil, cifrado)) for numero, user, perfil, materias, e in construidas}
+                columna = cifrado + "_huella"
+                huellas_registradas = set(modelo.objects.filter(**{columna + "__in": [h for h in huellas.values() if h]})
+                                          .values_list(columna, flat=True))
+
+            for numero, user, perfil, materias, errores_fila in construidas:
+                email = user.username
+                if email and "email" not in errores_fila:
+                    if email in registrados:
+                        errores_fila["email"] = ["El email %s ya está registrado." % email]
+                    elif email in vistos_email:
+                        errores_fila["email"] = ["Email repetido en la fila %d." % vistos_email[email]]
+                valor = getattr(perfil, unico)
+                if valor and unico not in errores_fila:
+                    if valor in unicos_registrados:
+                        errores_fila[unico] = ["%s ya está registrado." % valor]
+                    elif valor in vistos_unico:
+                        errores_fila[unico] = ["Valor repetido en la fila %d." % vistos_unico[valor]]
+                huella = huellas.get(numero)
+                if huella and cifrado not in errores_fila:
+                    if huella in huellas_registradas:
+                        errores_fila[cifrado] = ["%s ya está registrado." % getattr(perfil, cifrado)]
+                    elif huella in vistos_huella:
+                        errores_fila[cifrado] = ["Valor repetido en la fila %d." % vistos_huella[huella]]
+
+                if errores_fila:
+                    errores.append({"fila": numero, "errores": errores_fila})
+                    continue
+                vistos_email[email] = numero
+                if valor:
+                    vistos_unico[valor] = numero
+                if huella:
+                    vistos_huella[huella] = numero
+                validas.append((numero, user, perfil, materias))
+
+        return validas, errores
+
+    @staticmethod
+    def hashear(passwords, workers=None):
+        """
+        make_password de cada contraseña, repartido entre procesos (PBKDF2 es CPU
+        puro). workers=1 hashea en el proceso actual, como en las peticiones web.
+        """
+        workers = workers or getattr(settings, "IMPORT_HASH_WORKERS", 0) or os.cpu_count() or 1
+        if workers <= 1 or len(passwords) < ImportUtils.MINIMO_PARALELO:
+            return [make_password(password) for password in passwords]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_worker) as pool:
+            return list(pool.map(_hashear, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+    @staticmethod
+    def insertar(validas, tipo):
+        """
+        Inserta usuarios, membresías de grupo, perfiles y (maestros) materias por
+        bloques con bulk_create. Llamar dentro de una transacción.
+        """
+        modelo, grupo, campos, unico = ImportUtils.TIPOS[tipo]
+        id_grupo = Roles.id_grupo(grupo)
+        Membresia = User.groups.through
+
+        for bloque in ListUtils.bloques(validas, ImportUtils.CHUNK_SIZE):
+            usuarios = User.objects.bulk_create([user for numero, user, perfil, materias in bloque])
+            if usuarios and usuarios[0].pk is None:
+                # Backends sin RETURNING en inserciones masivas (MySQL)
+                ids = dict(User.objects.filter(username__in=[u.username for u in usuarios]).values_list("username", "id"))
+                for user in usuarios:
+                    user.pk = ids[user.username]
+
+            Membresia.objects.bulk_create([Membresia(user_id=user.pk, group_id=id_grupo) for user in usuarios])
+
+            perfiles = []
+            for numero, user, perfil, materias in bloque:
+                perfil.user = user
+                perfiles.append(perfil)
+            modelo.objects.bulk_create(perfiles)
+            if perfiles and perfiles[0].pk is None:
+                ids = dict(modelo.objects.filter(user_id__in=[u.pk for u in usuarios]).values_list("user_id", "id"))
+                for perfil in perfiles:
+                    perfil.pk = ids[perfil.user_id]
+
+            if modelo is Maestros:
+                MaestroMateria.objects.bulk_create(
+                    [MaestroMateria(maestro=perfil, nombre=nombre, orden=orden)
+                     for (numero, user, perfil, materias) in bloque for orden, nombre in enumerate(materias)],
+                    batch_size=ImportUtils.CHUNK_SIZE
+                )
+            TokenBusqueda.indexar(perfiles, nuevos=True)
+
+        # Lo que harían las señales de post_save
+        Contador.sumar(CONTADORES_USUARIOS[modelo][0], len(validas))
+        VersionTabla.incrementar(TABLAS_VERSIONADAS[User], TABLAS_VERSIONADAS[modelo])
+
+    @staticmethod
+    def importar(filas, tipo, todo_o_nada=False, workers=None):
+        """
+        Valida, hashea e inserta. Las filas válidas se insertan aunque otras tengan
+        errores, salvo con todo_o_nada=True.
+        Regresa {"recibidas": N, "creados": N, "errores": [{"fila": n, "errores": {campo: [...]}}]}.
+        Lanza ValueError si la inserción choca con un alta concurrente (no se inserta nada).
+        """
+        validas, errores = ImportUtils.validar(filas, tipo)
+        resultado = {"recibidas": len(filas), "creados": 0, "errores": errores}
+        if not validas or (errores and todo_o_nada):
+            return resultado
+
+        # Fuera de la transacción: es lo más lento y no necesita la BD
+        hashes = ImportUtils.hashear([user.password for numero, user, perfil, materias in validas], workers)
+        for (numero, user, perfil, materias), password in zip(validas, hashes):
+            user.password = password
+
+        try:
+            with transaction.atomic():
+                ImportUtils.insertar(validas, tipo)
+        except IntegrityError:
+            # Alguien registró el mismo email o matrícula mientras se hasheaba
+            raise ValueError("Algunos registros se dieron de alta mientras se importaba; vuelve a intentar.")
+        resultado["creados"] = len(validas)
+        return resultado
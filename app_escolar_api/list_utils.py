@@ -0,0 +1,213 @@
+from itertools import islice
+from django.http import StreamingHttpResponse
+from rest_framework import serializers, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from app_escolar_api.serializers import RowConverter
+
+
+class ListUtils:
+
+    # Tamaño de página cuando se pide ?after= sin ?limit=
+    LIMITE_DEFAULT = 50
+    # Tope para que nadie pida la tabla completa con ?limit=
+    LIMITE_MAXIMO = 1000
+    # Filas que se leen de la BD (y se escriben al socket) por bloque al hacer streaming
+    CHUNK_SIZE = 500
+
+    @staticmethod
+    def quiere_paginar(request):
+        """La paginación es opcional: solo se activa con ?after= o ?limit="""
+        return "after" in request.GET or "limit" in request.GET
+
+    @staticmethod
+    def leer_cursor(request):
+        """
+        Lee ?after=<id>&limit=N y regresa (after, limit).
+        Lanza ValueError con un mensaje legible si algún valor no es válido.
+        """
+        after = request.GET.get("after") or None
+        limit = request.GET.get("limit") or ListUtils.LIMITE_DEFAULT
+
+        if after is not None:
+            try:
+                after = int(after)
+            except (TypeError, ValueError):
+                raise ValueError("El parámetro 'after' debe ser un id entero.")
+
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            raise ValueError("El parámetro 'limit' debe ser un entero.")
+        if limit < 1:
+            raise ValueError("El parámetro 'limit' debe ser mayor a 0.")
+
+        return after, min(limit, ListUtils.LIMITE_MAXIMO)
+
+    @staticmethod
+    def leer_campos(request):
+        """?fields=id,matricula,user.first_name y/o ?exclude=... -> (fields, exclude)"""
+        campos = []
+        for param in ("fields", "exclude"):
+            valor = request.GET.get(param)
+            campos.append([c.strip() for c in valor.split(",") if c.strip()] if valor else None)
+        return tuple(campos)
+
+    @staticmethod
+    def proyectar(queryset, serializer):
+        """
+        Reduce el SELECT a las columnas que el serializer (ya recortado) realmente usa:
+        campos simples por su "source", serializers anidados como "user__<campo>" y
+        SerializerMethodField según Meta.campos_sql.
+        """
+        campos_sql = getattr(serializer.Meta, "campos_sql", {})
+        campos_prefetch = getattr(serializer.Meta, "campos_prefetch", {})
+        columnas = {"id"}
+        relaciones = set()
+
+        for nombre, field in serializer.fields.items():
+            if nombre in campos_prefetch:
+                continue
+            if nombre in campos_sql:
+                rutas = campos_sql[nombre]
+            elif isinstance(field, serializers.Serializer):
+                rutas = [field.source + "__" + hijo.source for hijo in field.fields.values()]
+            elif field.source == "*":
+                continue
+            else:
+                rutas = [field.source]
+            for ruta in rutas:
+                columnas.add(ruta)
+                if "__" in ruta:
+                    relaciones.add(ruta.rsplit("__", 1)[0])
+
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if relaciones:
+            queryset = queryset.select_related(*relaciones)
+        prefetch = [campos_prefetch[nombre][0] for nombre in serializer.fields if nombre in campos_prefetch]
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset.only(*columnas)
+
+    @staticmethod
+    def convertidor(queryset, serializer):
+        """
+        Regresa (queryset, convertir_lote). Si el serializer se puede compilar, el
+        queryset pasa a values_list() y las filas se convierten con RowConverter;
+        si no, se usan instancias del modelo y serializer.to_representation.
+        """
+        convertir = RowConverter.compilar(serializer)
+        if convertir:
+            convertir.indice("id")
+            return queryset.prefetch_related(None).values_list(*convertir.columnas), convertir
+        return queryset, None
+
+    @staticmethod
+    def bloques(iterable, tamano):
+        iterable = iter(iterable)
+        while True:
+            bloque = list(islice(iterable, tamano))
+            if not bloque:
+                return
+            yield bloque
+
+    @staticmethod
+    def preparar(request, queryset, serializer_class):
+        """
+        Aplica ?fields=/?exclude= de la petición.
+        Regresa (queryset proyectado, serializer recortado); usar serializer.to_representation(obj).
+        Lanza ValueError si algún campo no existe.
+        """
+        fields, exclude = ListUtils.leer_campos(request)
+        serializer = serializer_class(fields=fields, exclude=exclude)
+        if fields or exclude:
+            queryset = ListUtils.proyectar(queryset, serializer)
+        return queryset, serializer
+
+    @staticmethod
+    def paginar(request, queryset, serializer_class):
+        """
+        Paginación por cursor (keyset) sobre "id":
+          WHERE id > after ORDER BY id LIMIT limit + 1
+        A diferencia de OFFSET, el costo no crece con el número de página.
+
+        Respuesta: { "results": [...], "next": <id o null>, "limit": N }
+        donde "next" es el valor a mandar en ?after= para la siguiente página.
+        """
+        try:
+            after, limit = ListUtils.leer_cursor(request)
+            queryset, serializer = ListUtils.preparar(request, queryset, serializer_class)
+        except ValueError as e:
+            return Response({"details": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = queryset.order_by("id")
+        if after is not None:
+            queryset = queryset.filter(id__gt=after)
+
+        # Ruta rápida: tuplas de values_list() en lugar de instancias del modelo
+        queryset, convertir = ListUtils.convertidor(queryset, serializer)
+
+        # Pedimos un registro de más para saber si existe otra página
+        filas = list(queryset[:limit + 1])
+        hay_mas = len(filas) > limit
+        filas = filas[:limit]
+
+        if convertir:
+            lista = convertir.lote(filas)
+        else:
+            lista = [serializer.to_representation(obj) for obj in filas]
+
+        siguiente = None
+        if hay_mas:
+            siguiente = filas[-1][convertir.indice("id")] if convertir else filas[-1].id
+
+        return Response(
+            {
+                "results": lista,
+                "next": siguiente,
+                "limit": limit,
+            },
+            200
+        )
+
+    @staticmethod
+    def iter_json(queryset, serializer, chunk_size=None):
+        """
+        Genera el arreglo JSON por bloques: lee `chunk_size` filas con un cursor
+        del lado del servidor (queryset.iterator), las serializa y las entrega.
+        Cada fila se renderiza con el mismo JSONRenderer de DRF, así que los bytes
+        son idénticos a Response(serializer.data).
+        """
+        chunk_size = chunk_size or ListUtils.CHUNK_SIZE
+        renderer = JSONRenderer()
+        primero = True
+
+        # Ruta rápida: tuplas de values_list() en lugar de instancias del modelo
+        queryset, convertir = ListUtils.convertidor(queryset, serializer)
+
+        yield b"["
+        for filas in ListUtils.bloques(queryset.iterator(chunk_size=chunk_size), chunk_size):
+            if convertir:
+                items = convertir.lote(filas)
+            else:
+                items = [serializer.to_representation(obj) for obj in filas]
+            yield (b"" if primero else b",") + b",".join(renderer.render(item) for item in items)
+            primero = False
+        yield b"]"
+
+    @staticmethod
+    def stream(request, queryset, serializer_class, chunk_size=None):
+        """
+        Respuesta en streaming para las listas completas: la memoria por petición
+        depende del tamaño del bloque y no del tamaño de la tabla.
+        """
+        try:
+            queryset, serializer = ListUtils.preparar(request, queryset, serializer_class)
+        except ValueError as e:
+            return Response({"details": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return StreamingHttpResponse(
+            ListUtils.iter_json(queryset, serializer, chunk_size),
+            content_type="application/json",
+            status=200
+        )
@@ -0,0 +1,87 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+from django.contrib.auth.models import User
+from django.db.models import OuterRef, Subquery
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import Throttled
+
+from app_escolar_api.models import Roles
+
+
+class LoginUtils:
+    """
+    Pasos de login/:
+      - Una consulta trae al usuario, su token (JOIN) y el id de su primer grupo
+        (subconsulta); el nombre del rol sale del mapa Roles.
+      - La contraseña se verifica en un pool acotado de hilos (PBKDF2 suelta el
+        GIL), así un pico de logins no se lleva todo el CPU del proceso. Si no
+        hay turno en LOGIN_HASH_TIMEOUT segundos se responde 429.
+    """
+
+    _pool = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def pool():
+        if LoginUtils._pool is None:
+            with LoginUtils._lock:
+                if LoginUtils._pool is None:
+                    LoginUtils._pool = ThreadPoolExecutor(
+                        max_workers=getattr(settings, "LOGIN_HASH_WORKERS", 4), thread_name_prefix="login-hash"
+                    )
+        return LoginUtils._pool
+
+    @staticmethod
+    def en_pool(funcion, *args):
+        timeout = getattr(settings, "LOGIN_HASH_TIMEOUT", 10)
+        futuro = LoginUtils.pool().submit(funcion, *args)
+        try:
+            return futuro.result(timeout=timeout)
+        except TimeoutError:
+            futuro.cancel()
+            raise Throttled(wait=timeout)
+
+    @staticmethod
+    def buscar(username):
+        primer_grupo = (
+            User.groups.through.objects.filter(user_id=OuterRef("pk")).order_by("id").values("group_id")[:1]
+        )
+        return (
+            User.objects.select_related("auth_token")
+            .annotate(id_grupo=Subquery(primer_grupo))
+            .filter(username=username)
+            .first()
+        )
+
+    @staticmethod
+    def autenticar(username, password):
+        """
+        Igual que authenticate() con ModelBackend: None si no existe, la contraseña
+        no coincide o el usuario está inactivo.
+        """
+        user = LoginUtils.buscar(username)
+        if user is None:
+            # Mismo tiempo de respuesta exista o no el usuario (como ModelBackend)
+            LoginUtils.en_pool(make_password, password)
+            return None
+        # Sin setter: el hilo del pool no debe tocar la BD
+        if not LoginUtils.en_pool(check_password, password, user.password):
+            return None
+        if identify_hasher(user.password).must_update(user.password):
+            user.set_password(password)
+            user.save(update_fields=["password"])
+        return user if user.is_active else None
+
+    @staticmethod
+    def rol(user):
+        """Nombre del rol del usuario traído con buscar()."""
+        return Roles.nombre(user.id_grupo)
+
+    @staticmethod
+    def token(user):
+        try:
+            return user.auth_token
+        except Token.DoesNotExist:
+            return Token.objects.get_or_create(user=user)[0]
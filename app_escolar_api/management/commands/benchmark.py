@@ -0,0 +1,600 @@
+import base64
+import datetime
+import io
+import json
+import os
+import random
+import socketserver
+import tempfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+import tracemalloc
+
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage
+from django.core.management.base import BaseCommand
+from django.template import engines
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from app_escolar_api.cypher_utils import CypherUtils
+from app_escolar_api.data_utils import DataUtils
+from app_escolar_api.horario_utils import HorarioUtils
+from app_escolar_api.media_utils import MediaUtils
+from app_escolar_api.login_utils import LoginUtils
+from app_escolar_api.puentes.mail import MailsBridge
+from app_escolar_api.models import Alumnos, Maestros, Materias, Roles, TokenBusqueda
+from app_escolar_api.serializers import AlumnoSerializer, RowConverter
+from app_escolar_api.utils import Utils
+from app_escolar_api.views.auth import CustomAuthToken
+from app_escolar_api.views.busqueda import BuscarView
+from app_escolar_api.views.horario import HorarioProfesorView
+from app_escolar_api.views.materias import MateriasAll
+
+
+class SesionSMTP(socketserver.StreamRequestHandler):
+    """Lo mínimo de SMTP para que smtplib entregue: acepta todo y cuenta los DATA."""
+
+    def handle(self):
+        # Simula el saludo y handshake de un servidor remoto
+        time.sleep(self.server.latencia)
+        self.wfile.write(b"220 bench ESMTP\r\n")
+        en_datos = False
+        for linea in self.rfile:
+            if en_datos:
+                if linea == b".\r\n":
+                    en_datos = False
+                    with self.server.lock:
+                        self.server.recibidos += 1
+                    self.wfile.write(b"250 OK\r\n")
+                continue
+            comando = linea[:4].upper()
+            if comando == b"DATA":
+                en_datos = True
+                self.wfile.write(b"354 Fin con <CRLF>.<CRLF>\r\n")
+            elif comando == b"QUIT":
+                self.wfile.write(b"221 Adios\r\n")
+                return
+            else:
+                self.wfile.write(b"250 OK\r\n")
+
+
+class ServidorSMTP(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # Con el socketserver por defecto (5) las conexiones de más se rechazan
+    request_queue_size = 1024
+
+    def __init__(self, latencia):
+        super().__init__(("127.0.0.1", 0), SesionSMTP)
+        self.latencia = latencia
+        self.recibidos = 0
+        self.lock = threading.Lock()
+
+
+class RespuestaHTTP(BaseHTTPRequestHandler):
+    """/<n>.png responde image/png y cualquier otra ruta text/html, tras server.latencia segundos."""
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        time.sleep(self.server.latencia)
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png" if self.path.endswith(".png") else "text/html; charset=utf-8")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class ServidorHTTP(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, latencia):
+        super().__init__(("127.0.0.1", 0), RespuestaHTTP)
+        self.latencia = latencia
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide escenarios de rendimiento sobre datos sembrados dentro de una transacción "
+        "que se revierte al terminar (no deja datos en la BD)."
+    )
+
+    ESCENARIOS = ("serializacion", "busqueda", "indices", "login", "cifrado", "correo", "urls", "archivos", "horario", "dias")
+
+    def add_arguments(self, parser):
+        parser.add_argument("escenario", choices=self.ESCENARIOS)
+        parser.add_argument("--filas", type=int, default=10000, help="Filas a sembrar")
+        parser.add_argument("--repeticiones", type=int, default=3, help="Se reporta la mejor corrida")
+        parser.add_argument("--latencia-smtp", type=float, default=20, help="ms de saludo del SMTP simulado (correo)")
+        parser.add_argument("--latencia-http", type=float, default=20, help="ms por respuesta del HTTP simulado (urls)")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            getattr(self, "bench_" + options["escenario"])(options)
+            transaction.set_rollback(True)
+
+    # =========================
+    # Utilidades
+    # =========================
+    def medir(self, nombre, funcion, unidades, repeticiones):
+        mejor = None
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            funcion()
+            duracion = time.perf_counter() - inicio
+            mejor = duracion if mejor is None else min(mejor, duracion)
+        self.stdout.write("%-40s %10.1f ms %12.0f /s" % (nombre, mejor * 1000, unidades / mejor))
+        return mejor
+
+    def sembrar_alumnos(self, filas, prefijo="bench"):
+        ahora = timezone.now()
+        User.objects.bulk_create(
+            [User(username="%s%d@bench.mx" % (prefijo, i), email="%s%d@bench.mx" % (prefijo, i),
+                  first_name="Nombre%d" % i, last_name="Apellido%d" % i, password="!")
+             for i in range(filas)],
+            batch_size=1000
+        )
+        usuarios = User.objects.filter(username__startswith=prefijo, username__endswith="@bench.mx").values_list("id", flat=True)
+        Alumnos.objects.bulk_create(
+            [Alumnos(user_id=user_id, matricula="2025%06d" % i, curp="CURP%014d" % i, rfc="RFC%010d" % i,
+                     fecha_nacimiento=ahora, edad=20, telefono="2220000000", ocupacion="Estudiante",
+                     update=ahora)
+             for i, user_id in enumerate(usuarios)],
+            batch_size=1000
+        )
+
+    def sembrar_maestros_materias(self, filas):
+        """Un maestro por cada 10 alumnos sembrados y una materia por alumno."""
+        usuarios = list(User.objects.filter(username__endswith="@bench.mx").values_list("id", flat=True)[:filas // 10 or 1])
+        Maestros.objects.bulk_create(
+            [Maestros(user_id=user_id, id_trabajador="T%06d" % i, rfc="RFCM%09d" % i) for i, user_id in enumerate(usuarios)],
+            batch_size=1000
+        )
+        maestros = list(Maestros.objects.filter(id_trabajador__startswith="T").values_list("id", flat=True))
+        Materias.objects.bulk_create(
+            [Materias(nrc="B%07d" % i, nombre_materia="Materia %d" % i, seccion="1", dias="Lunes, Miércoles",
+                      salon="S%04d" % (i % 500), programa_educativo="Programa %d" % (i % 40),
+                      profesor_id=maestros[i % len(maestros)], creditos=6)
+             for i in range(filas)],
+            batch_size=1000
+        )
+
+    def sembrar_horarios(self):
+        """
+        Días y horas al azar (pero repetibles) a las materias sembradas: uno a
+        tres días, de 7:00 a 21:00 en bloques de media hora.
+        """
+        materias = list(Materias.objects.filter(nrc__startswith="B"))
+        azar = random.Random(len(materias))
+        for materia in materias:
+            materia.dias = ", ".join(sorted(azar.sample(Materias.DIAS[:6], azar.choice((1, 2, 2, 3))), key=Materias.DIAS.index))
+            materia.dias_mask = Materias.mascara_dias(materia.dias)
+            inicio = datetime.datetime(2000, 1, 1, 7) + datetime.timedelta(minutes=30 * azar.randrange(26))
+            materia.hora_inicio = inicio.time()
+            materia.hora_fin = (inicio + datetime.timedelta(minutes=30 * azar.choice((2, 3, 4)))).time()
+        Materias.objects.bulk_update(materias, ["dias", "dias_mask", "hora_inicio", "hora_fin"], batch_size=1000)
+
+    # =========================
+    # Escenarios
+    # =========================
+    def bench_serializacion(self, options):
+        """lista-alumnos: AlumnoSerializer (DRF) contra RowConverter sobre values_list()"""
+        filas = options["filas"]
+        self.sembrar_alumnos(filas)
+        alumnos = Alumnos.objects.select_related("user").order_by("id")
+
+        serializer = AlumnoSerializer()
+        convertir = RowConverter.compilar(serializer)
+
+        drf = self.medir("AlumnoSerializer(many=True).data",
+                         lambda: AlumnoSerializer(alumnos, many=True).data, filas, options["repeticiones"])
+        rapida = self.medir("RowConverter + values_list()",
+                            lambda: [convertir(f) for f in alumnos.values_list(*convertir.columnas)],
+                            filas, options["repeticiones"])
+        self.stdout.write("Mejora: %.1fx" % (drf / rapida))
+
+    def bench_busqueda(self, options):
+        """/buscar/: una y varias palabras, prefijo y aproximada sobre TokenBusqueda"""
+        filas = options["filas"]
+        self.sembrar_alumnos(filas)
+        TokenBusqueda.reindexar_todo()
+        vista = BuscarView.as_view()
+        factory = APIRequestFactory()
+        usuario = User.objects.filter(username__endswith="@bench.mx").first()
+        consultas = ("nombre12", "apellido9", "2025000", "CURP%014d" % (filas // 2), "nombr", "apelido123",
+                     "nombre1 apellido1", "apellido12 nombre1", "nombre apellido")
+
+        def buscar(q):
+            request = factory.get("/buscar/", {"q": q})
+            force_authenticate(request, user=usuario)
+            response = vista(request)
+            if hasattr(response, "render"):
+                response.render()
+            return len(json.loads(response.content))
+
+        self.stdout.write("Tokens indexados: %d" % TokenBusqueda.objects.count())
+        with override_settings(RESPONSE_CACHE_ALIAS="dummy", CACHES={"dummy": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}):
+            for q in consultas:
+                self.medir("buscar(%r) [%d resultados]" % (q, buscar(q)), lambda: buscar(q), 1, options["repeticiones"])
+
+    # Índices de las migraciones 0009 y 0011 (los únicos condicionales también son índices)
+    INDICES = (
+        "auth_user_email_idx", "auth_user_activos_idx", "alumno_matricula_idx",
+        "alumno_curp_huella_idx", "alumno_rfc_huella_idx",
+        "alumno_matricula_unica", "maestro_id_trabajador_idx", "maestro_id_trabajador_unico",
+        "materia_salon_idx", "materia_programa_idx",
+    )
+
+    def bench_indices(self, options):
+        """Planes de las búsquedas frecuentes con y sin los índices de las migraciones 0009 y 0011"""
+        filas = options["filas"]
+        self.sembrar_alumnos(filas)
+        self.sembrar_maestros_materias(filas)
+        # Como en una escuela con varias generaciones egresadas: la mayoría de las cuentas están inactivas
+        activos = User.objects.filter(username__endswith="@bench.mx").order_by("-id").values_list("id", flat=True)[filas // 10]
+        User.objects.filter(username__endswith="@bench.mx", id__lte=activos).update(is_active=False)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+        mitad = filas // 2
+        consultas = (
+            ("registro: email", User.objects.filter(email="bench%d@bench.mx" % mitad)),
+            ("alumno por matrícula", Alumnos.objects.filter(matricula="2025%06d" % mitad)),
+            ("alumno por curp (huella)", Alumnos.objects.filter(curp_huella=CypherUtils.huella("CURP%014d" % mitad))),
+            ("alumno por rfc (huella)", Alumnos.objects.filter(rfc_huella=CypherUtils.huella("RFC%010d" % mitad))),
+            ("maestro por id_trabajador", Maestros.objects.filter(id_trabajador="T%06d" % 1)),
+            ("materias por salón", Materias.objects.filter(salon="S0042")),
+            ("materias por programa", Materias.objects.filter(programa_educativo="Programa 7")),
+            ("usuarios activos", User.objects.filter(is_active=True).values_list("id", flat=True)),
+        )
+
+        def mostrar(titulo):
+            self.stdout.write("== %s ==" % titulo)
+            for nombre, queryset in consultas:
+                self.medir(nombre, lambda: list(queryset.all()), 1, options["repeticiones"])
+                sql, params = queryset.query.sql_with_params()
+                with connection.cursor() as cursor:
+                    # El comentario hace distinto el texto del EXPLAIN; si no, sqlite3 reutiliza
+                    # el plan que ya tenía preparado de la pasada anterior
+                    cursor.execute("%s %s /* %s */" % (connection.ops.explain_query_prefix(), sql, titulo), params)
+                    for fila in cursor.fetchall():
+                        self.stdout.write("    " + " ".join(str(columna) for columna in fila))
+
+        mostrar("con índices")
+        if connection.vendor == "mysql":
+            # En MySQL DROP INDEX hace commit implícito; no se puede revertir
+            return
+        # Los DROP INDEX se revierten con el savepoint (DDL transaccional en PostgreSQL y SQLite)
+        sid = transaction.savepoint()
+        with connection.cursor() as cursor:
+            for indice in self.INDICES:
+                cursor.execute("DROP INDEX IF EXISTS %s" % connection.ops.quote_name(indice))
+        mostrar("sin índices")
+        transaction.savepoint_rollback(sid)
+
+    def bench_login(self, options):
+        """
+        login/: authenticate + groups + get_or_create + perfil (antes) contra
+        LoginUtils (ahora). Cada login hashea con PBKDF2, así que conviene --filas 20.
+        """
+        filas = options["filas"]
+        self.sembrar_alumnos(filas)
+        usuarios = list(User.objects.filter(username__endswith="@bench.mx").order_by("id"))
+        # Un solo hash real para todos (sembrar no debe tardar lo mismo que lo que se mide)
+        encoded = make_password("bench")
+        User.objects.filter(pk__in=[u.pk for u in usuarios]).update(password=encoded)
+        User.groups.through.objects.bulk_create(
+            [User.groups.through(user_id=u.pk, group_id=Roles.id_grupo("alumno")) for u in usuarios]
+        )
+        Token.objects.bulk_create([Token(user=u, key=Token.generate_key()) for u in usuarios])
+
+        def antes(user):
+            user = authenticate(username=user.username, password="bench")
+            rol = [g.name for g in user.groups.all()][0]
+            token, created = Token.objects.get_or_create(user=user)
+            alumno = Alumnos.objects.select_related("user").filter(user=user).first()
+            return dict(AlumnoSerializer(alumno).data, token=token.key, rol=rol)
+
+        factory = APIRequestFactory()
+        vista = CustomAuthToken.as_view()
+
+        def ahora(user):
+            response = vista(factory.post("/login/", {"username": user.username, "password": "bench"}, format="json"))
+            assert response.status_code == 200, response.data
+            return response.data
+
+        for nombre, funcion in (("antes (authenticate, groups, get_or_create)", antes), ("ahora (LoginUtils)", ahora)):
+            with CaptureQueriesContext(connection) as consultas:
+                funcion(usuarios[0])
+            self.medir("%s [%d consultas]" % (nombre, len(consultas)),
+                       lambda: [funcion(u) for u in usuarios], filas, options["repeticiones"])
+
+        # Solo la verificación de contraseña (sin BD: otros hilos no ven los datos sembrados)
+        for nombre, funcion in (("%d hilos sin límite" % filas, lambda _: check_password("bench", encoded)),
+                                ("%d hilos -> pool LoginUtils" % filas, lambda _: LoginUtils.en_pool(check_password, "bench", encoded))):
+            def rafaga():
+                with ThreadPoolExecutor(max_workers=filas) as clientes:
+                    list(clientes.map(funcion, range(filas)))
+            self.medir(nombre, rafaga, filas, options["repeticiones"])
+
+    def bench_cifrado(self, options):
+        """
+        CypherUtils: derivar la llave en cada llamada (antes) contra el Fernet
+        memoizado, uno por uno y por lote. No toca la BD.
+        """
+        filas = options["filas"]
+        textos = ["CURP%014d" % i for i in range(filas)]
+        password = CypherUtils._bytes(settings.CRYPTO_PASSWORD)
+
+        def antes_encripta():
+            return [CypherUtils.derivar(password).encrypt(t.encode("utf-8")).decode("utf-8") for t in textos]
+
+        cifrados = CypherUtils.encripta_many(textos)
+
+        def antes_desencripta():
+            return [CypherUtils.derivar(password).decrypt(c.encode("utf-8")).decode("utf-8") for c in cifrados]
+
+        repeticiones = options["repeticiones"]
+        self.medir("encripta antes (PBKDF2 por llamada)", antes_encripta, filas, repeticiones)
+        self.medir("encripta (llave en cache)", lambda: [CypherUtils.encripta(t) for t in textos], filas, repeticiones)
+        self.medir("encripta_many", lambda: CypherUtils.encripta_many(textos), filas, repeticiones)
+        self.medir("desencripta antes (PBKDF2 por llamada)", antes_desencripta, filas, repeticiones)
+        self.medir("desencripta (llave en cache)", lambda: [CypherUtils.desencripta(c) for c in cifrados], filas, repeticiones)
+        self.medir("desencripta_many", lambda: CypherUtils.desencripta_many(cifrados), filas, repeticiones)
+
+    def bench_correo(self, options):
+        """
+        Un hilo y una conexión SMTP por correo (antes) contra la cola de
+        MailsBridge, con un servidor SMTP local que tarda --latencia-smtp ms en
+        saludar. Conviene --filas 500.
+        """
+        filas = options["filas"]
+        servidor = ServidorSMTP(options["latencia_smtp"] / 1000)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        host, puerto = servidor.server_address
+
+        def mensajes():
+            return [MailsBridge.mensaje("Aviso %d" % i, "", "escuela@bench.mx", "alumno%d@bench.mx" % i,
+                                        html_message="<p>Aviso %d</p>" % i) for i in range(filas)]
+
+        fallidos = []
+
+        def enviar(msg):
+            try:
+                msg.send()
+            except Exception as e:
+                fallidos.append(e)
+
+        def antes():
+            hilos = [threading.Thread(target=enviar, args=(msg,)) for msg in mensajes()]
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+
+        def ahora():
+            MailsBridge.encolar(*mensajes())
+            MailsBridge.esperar()
+
+        # Mail merge: el mismo aviso a todos con su nombre
+        asunto = "Aviso para {{ nombre }}"
+        cuerpo = "<h1>Información académica</h1><p>Hola {{ nombre }}, la inscripción del próximo período " \
+                 "está abierta. Revisa tu matrícula {{ matricula }} en el módulo de Alumnos.</p>" * 20
+        destinatarios = [{"email": "alumno%d@bench.mx" % i, "nombre": "José Ángel %d" % i, "matricula": "2025%06d" % i}
+                         for i in range(filas)]
+
+        def antes_combinar():
+            # Lo que había que hacer antes: compilar y reemplazar acentos con 10 replace por correo
+            for datos in destinatarios:
+                html = engines["django"].from_string(cuerpo).render(datos)
+                for letra, entidad in (("á", "&aacute;"), ("é", "&eacute;"), ("í", "&iacute;"), ("ó", "&oacute;"),
+                                       ("ú", "&uacute;"), ("Á", "&Aacute;"), ("É", "&Eacute;"), ("Í", "&Iacute;"),
+                                       ("Ó", "&Oacute;"), ("Ú", "&Uacute;")):
+                    html = html.replace(letra, entidad)
+                MailsBridge.mensaje(engines["django"].from_string(asunto).render(datos), "", "escuela@bench.mx",
+                                    datos["email"], html_message=html)
+
+        def ahora_combinar():
+            # Mismo trabajo de render con plantillas compiladas una vez y entidades en una pasada
+            plantilla_asunto, plantilla_cuerpo = MailsBridge.plantilla(asunto, html=False), MailsBridge.plantilla(cuerpo)
+            for datos in destinatarios:
+                MailsBridge.mensaje(plantilla_asunto.render(datos), "", "escuela@bench.mx", datos["email"],
+                                    html_message=MailsBridge.entidades(plantilla_cuerpo.render(datos)))
+
+        repeticiones = options["repeticiones"]
+        try:
+            with override_settings(EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+                                   EMAIL_HOST=host, EMAIL_PORT=puerto, EMAIL_USE_TLS=False,
+                                   EMAIL_HOST_USER="", EMAIL_HOST_PASSWORD=""):
+                self.medir("antes (hilo + conexión por correo)", antes, filas, repeticiones)
+                self.medir("MailsBridge (%d hilos, conexión reutilizada)" % settings.MAIL_WORKERS,
+                           ahora, filas, repeticiones)
+                self.stdout.write("== mail merge (%d bytes por correo) ==" % len(cuerpo.encode("utf-8")))
+                self.medir("render antes (compila + 10 replace)", antes_combinar, filas, repeticiones)
+                self.medir("render ahora (plantilla en cache + entidades)", ahora_combinar, filas, repeticiones)
+                self.medir("combinar(sincrono=True) render + envío", lambda: MailsBridge.combinar(
+                    asunto, cuerpo, destinatarios, "escuela@bench.mx", sincrono=True), filas, repeticiones)
+        finally:
+            servidor.shutdown()
+            servidor.server_close()
+        self.stdout.write("Correos recibidos por el servidor: %d (fallidos antes: %d)" % (servidor.recibidos, len(fallidos)))
+
+    def bench_urls(self, options):
+        """
+        DataUtils: requests.head sin sesión, una tras otra (antes), contra
+        are_urls_images en paralelo con sesión keep-alive, en frío y con el
+        cache lleno. Servidor HTTP local con --latencia-http ms por respuesta.
+        """
+        filas = options["filas"]
+        servidor = ServidorHTTP(options["latencia_http"] / 1000)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        host, puerto = servidor.server_address
+        urls = ["http://%s:%d/%d.%s" % (host, puerto, i, "png" if i % 2 else "html") for i in range(filas)]
+
+        def antes():
+            return [requests.head(url).headers["content-type"] in DataUtils.IMAGE_FORMATS for url in urls]
+
+        def frio():
+            DataUtils._tipos.clear()
+            return DataUtils.are_urls_images(urls)
+
+        try:
+            assert [v for v in frio().values()] == antes()
+            self.medir("antes (head sin sesión, en serie)", antes, filas, options["repeticiones"])
+            self.medir("are_urls_images (%d hilos, sin cache)" % settings.URL_CHECK_WORKERS, frio, filas, options["repeticiones"])
+            self.medir("are_urls_images (con cache)", lambda: DataUtils.are_urls_images(urls), filas, options["repeticiones"])
+        finally:
+            servidor.shutdown()
+            servidor.server_close()
+
+    def bench_archivos(self, options):
+        """
+        Memoria pico (tracemalloc) y tiempo de base64 / guardado de un video de
+        --filas MB: read() + b64encode (antes) contra los caminos por pedazos.
+        """
+        megas = options["filas"]
+        with tempfile.TemporaryDirectory() as carpeta:
+            origen = os.path.join(carpeta, "video.mp4")
+            with open(origen, "wb") as archivo:
+                archivo.write(b"\x00\x00\x00\x18ftypmp42")
+                for _ in range(megas):
+                    archivo.write(os.urandom(1024 * 1024))
+
+            def antes():
+                with open(origen, "rb") as archivo:
+                    return "data:video/mp4;base64," + str(base64.b64encode(archivo.read()).decode())
+
+            def unido():
+                with open(origen, "rb") as archivo:
+                    return Utils.b64Join(archivo, "data:video/mp4;base64,")
+
+            def streaming():
+                with open(origen, "rb") as archivo, open(os.devnull, "w") as destino:
+                    for chunk in Utils.b64Chunks(archivo):
+                        destino.write(chunk)
+
+            def guardar():
+                with open(origen, "rb") as archivo:
+                    MediaUtils.guardar(archivo, "video.mp4")
+
+            with override_settings(MEDIA_ROOT=carpeta, MEDIA_MAX_UPLOAD_BYTES=(megas + 1) * 1024 * 1024):
+                for nombre, funcion in (("antes (read + b64encode + concatenar)", antes),
+                                        ("b64Join (mismo str, por pedazos)", unido),
+                                        ("b64Chunks a un archivo", streaming),
+                                        ("MediaUtils.guardar (default_storage)", guardar)):
+                    tracemalloc.start()
+                    funcion()
+                    pico = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                    self.medir("%s [pico %.1f MB]" % (nombre, pico / 1024 / 1024), funcion, megas, options["repeticiones"])
+
+    def bench_horario(self, options):
+        """
+        Choques de horario: auditoría del catálogo con el barrido de
+        HorarioUtils.auditar contra comparar todos los pares, y la revisión de
+        una materia nueva (HorarioUtils.validar) contra recorrer el catálogo, y
+        lo que pesa el horario de un profesor contra la lista completa.
+        """
+        filas = options["filas"]
+        self.sembrar_alumnos(filas)
+        self.sembrar_maestros_materias(filas)
+        self.sembrar_horarios()
+
+        catalogo = [dict(zip(HorarioUtils.COLUMNAS, valores))
+                    for valores in Materias.objects.exclude(hora_inicio=None).values_list(*HorarioUtils.COLUMNAS)]
+
+        def pares():
+            choques = 0
+            for i, a in enumerate(catalogo):
+                dias_a = set(Materias.indices_dias(a["dias"]))
+                for b in catalogo[i + 1:]:
+                    if (a["salon"] == b["salon"] or a["profesor_id"] == b["profesor_id"]) \
+                            and a["hora_inicio"] < b["hora_fin"] and b["hora_inicio"] < a["hora_fin"] \
+                            and dias_a & set(Materias.indices_dias(b["dias"])):
+                        choques += 1
+            return choques
+
+        self.stdout.write("choques en el catálogo: %d" % len(HorarioUtils.auditar(catalogo)))
+        self.medir("auditar (barrido por salón/profesor)", lambda: HorarioUtils.auditar(catalogo), filas, options["repeticiones"])
+        if filas <= 5000:
+            self.medir("todos los pares", pares, filas, 1)
+        else:
+            self.stdout.write("todos los pares: se omite con más de 5000 filas")
+
+        nueva = {"salon": "S0042", "profesor": Maestros.objects.first(), "dias": "Lunes",
+                 "hora_inicio": datetime.time(10), "hora_fin": datetime.time(11)}
+
+        def recorrer():
+            # Antes no se revisaba; lo ingenuo es leer todo y comparar
+            return [m for m in Materias.objects.exclude(hora_inicio=None).values_list(*HorarioUtils.COLUMNAS)
+                    if (m[2] == nueva["salon"] or m[3] == nueva["profesor"].pk)
+                    and m[5] < nueva["hora_fin"] and nueva["hora_inicio"] < m[6] and 0 in Materias.indices_dias(m[4])]
+
+        self.medir("validar una materia (índices)", lambda: HorarioUtils.validar(nueva), 1, options["repeticiones"])
+        self.medir("validar leyendo el catálogo", recorrer, 1, options["repeticiones"])
+
+        # Lo que baja el front para armar el horario de un profesor: antes la lista completa
+        factory = APIRequestFactory()
+        usuario = User.objects.filter(username__endswith="@bench.mx").first()
+        maestro = nueva["profesor"]
+
+        def bajar(vista, ruta, **kwargs):
+            request = factory.get(ruta)
+            force_authenticate(request, user=usuario)
+            response = vista(request, **kwargs)
+            if response.streaming:
+                return len(b"".join(response.streaming_content))
+            if hasattr(response, "render"):
+                response.render()
+            return len(response.content)
+
+        with override_settings(RESPONSE_CACHE_ALIAS="dummy", CACHES={"dummy": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}):
+            for nombre, vista, ruta, kwargs in (
+                ("lista-materias/ (todo el catálogo)", MateriasAll.as_view(), "/lista-materias/", {}),
+                ("horario/profesor/<id>/", HorarioProfesorView.as_view(), "/horario/profesor/%d/" % maestro.pk, {"id": maestro.pk}),
+            ):
+                tamano = bajar(vista, ruta, **kwargs)
+                self.medir("%s [%.1f KB]" % (nombre, tamano / 1024), lambda: bajar(vista, ruta, **kwargs), 1, options["repeticiones"])
+
+    def bench_dias(self, options):
+        """
+        ¿Qué materias hay el miércoles entre 10:00 y 12:00? dias LIKE '%Miércoles%'
+        contra dias_mask IN (...) sobre el índice (dias_mask, hora_inicio, hora_fin).
+        """
+        filas = options["filas"]
+        self.sembrar_alumnos(filas)
+        self.sembrar_maestros_materias(filas)
+        self.sembrar_horarios()
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+        desde, hasta = datetime.time(10), datetime.time(12)
+        ventana = {"hora_fin__gt": desde, "hora_inicio__lt": hasta}
+        consultas = (
+            ("LIKE '%Miércoles%'", Materias.objects.filter(dias__contains="Miércoles", **ventana)),
+            ("dias_mask IN (...)", Materias.objects.filter(dias_mask__in=Materias.mascaras_con(Materias.mascara_dias("Miércoles")), **ventana)),
+            ("LIKE lunes o viernes", Materias.objects.filter(Q(dias__contains="Lunes") | Q(dias__contains="Viernes"), **ventana)),
+            ("dias_mask lunes o viernes", Materias.objects.filter(dias_mask__in=Materias.mascaras_con(Materias.mascara_dias("Lunes, Viernes")), **ventana)),
+        )
+        for nombre, queryset in consultas:
+            queryset = queryset.values_list("id", flat=True)
+            encontradas = len(list(queryset))
+            self.medir("%s [%d]" % (nombre, encontradas), lambda: list(queryset.all()), 1, options["repeticiones"])
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute("%s %s" % (connection.ops.explain_query_prefix(), sql), params)
+                for fila in cursor.fetchall():
+                    self.stdout.write("    " + " ".join(str(columna) for columna in fila))
@@ -0,0 +1,32 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+
+from app_escolar_api.import_utils import ImportUtils
+
+
+class Command(BaseCommand):
+    help = "Alta masiva de alumnos o maestros desde un archivo CSV o JSONL (igual que POST /importar/<tipo>/)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("tipo", choices=sorted(ImportUtils.TIPOS))
+        parser.add_argument("archivo")
+        parser.add_argument("--formato", choices=("csv", "jsonl"), help="Por defecto se deduce de la extensión")
+        parser.add_argument("--todo-o-nada", action="store_true", help="No insertar nada si alguna fila tiene errores")
+        parser.add_argument("--workers", type=int, default=None, help="Procesos para hashear contraseñas")
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        try:
+            formato = ImportUtils.formato(options["archivo"], formato=options["formato"])
+            with open(options["archivo"], "rb") as archivo:
+                filas = ImportUtils.leer(archivo, formato)
+            resultado = ImportUtils.importar(filas, options["tipo"], options["todo_o_nada"], options["workers"])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for error in resultado["errores"]:
+            detalle = "; ".join("%s: %s" % (campo, " ".join(mensajes)) for campo, mensajes in error["errores"].items())
+            self.stderr.write("Fila %d: %s" % (error["fila"], detalle))
+        self.stdout.write("Filas: %d, creados: %d, con errores: %d (%.1f s)" % (
+            resultado["recibidas"], resultado["creados"], len(resultado["errores"]), time.perf_counter() - inicio
+        ))
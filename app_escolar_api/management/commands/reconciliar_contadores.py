@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from app_escolar_api.models import Contador
+
+
+class Command(BaseCommand):
+    help = "Recalcula los contadores de usuarios activos (total-usuarios/) desde las tablas."
+
+    def handle(self, *args, **options):
+        for nombre, (anterior, nuevo) in Contador.reconciliar().items():
+            estado = "OK" if anterior == nuevo else "corregido"
+            self.stdout.write(f"{nombre}: {anterior} -> {nuevo} ({estado})")
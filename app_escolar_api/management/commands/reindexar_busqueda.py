@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from app_escolar_api.models import TokenBusqueda
+
+
+class Command(BaseCommand):
+    help = "Reconstruye desde cero el índice de búsqueda de personas (/buscar/)."
+
+    def handle(self, *args, **options):
+        TokenBusqueda.reindexar_todo()
+        self.stdout.write(f"Tokens indexados: {TokenBusqueda.objects.count()}")
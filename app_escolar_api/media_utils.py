@@ -0,0 +1,184 @@
+import mimetypes
+import posixpath
+import re
+import secrets
+import tempfile
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date
+
+from app_escolar_api.utils import Utils
+
+
+class ArchivoDemasiadoGrande(ValueError):
+    pass
+
+
+class MediaUtils:
+    """
+    Archivos subidos bajo <CARPETA>/ en default_storage: el disco en MEDIA_ROOT
+    en desarrollo o un bucket (p. ej. GCS con DEFAULT_FILE_STORAGE) donde el
+    disco es de solo lectura, como App Engine estándar. Se escriben y se sirven
+    por pedazos de CHUNK_SIZE, así la memoria por petición es la misma para un
+    logo que para un video de 50 MB. El tipo se decide por los primeros bytes
+    (Utils.mimeFromBytes), no por el nombre.
+    """
+
+    CARPETA = "archivos"
+    CHUNK_SIZE = 64 * 1024
+    # Bytes que se copian en memoria al recibir un cuerpo sin tamaño; lo demás va a un temporal
+    MAX_MEMORIA = 2 * 1024 * 1024
+    RANGO = re.compile(r"^bytes=(\d*)-(\d*)$")
+    # Tipos que mimetypes no conoce
+    EXTENSIONES = {"video/x-m4v": ".m4v"}
+
+    @staticmethod
+    def ruta(nombre):
+        """Nombre en el storage de un archivo guardado; lanza ValueError si el nombre sale de la carpeta."""
+        ruta = posixpath.normpath(posixpath.join(MediaUtils.CARPETA, nombre))
+        if "\\" in nombre or not ruta.startswith(MediaUtils.CARPETA + "/"):
+            raise ValueError("Nombre de archivo no válido.")
+        return ruta
+
+    @staticmethod
+    def recibir(stream, limite):
+        """
+        (archivo con seek, primeros 16 bytes) de `stream`. Un archivo subido ya
+        trae su tamaño; el cuerpo de la petición se copia por pedazos a un
+        temporal (como hace Django con los multipart grandes) sin pasar del límite.
+        """
+        if isinstance(stream, File):
+            if stream.size > limite:
+                raise ArchivoDemasiadoGrande("El archivo pasa de %d bytes." % limite)
+            stream.seek(0)
+            head = stream.read(16)
+            stream.seek(0)
+            return stream, head
+
+        temporal = tempfile.SpooledTemporaryFile(max_size=MediaUtils.MAX_MEMORIA)
+        tamano = 0
+        try:
+            while True:
+                chunk = stream.read(MediaUtils.CHUNK_SIZE)
+                if not chunk:
+                    break
+                tamano += len(chunk)
+                if tamano > limite:
+                    raise ArchivoDemasiadoGrande("El archivo pasa de %d bytes." % limite)
+                temporal.write(chunk)
+        except BaseException:
+            temporal.close()
+            raise
+        temporal.seek(0)
+        head = temporal.read(16)
+        temporal.seek(0)
+        archivo = File(temporal)
+        archivo.size = tamano
+        return archivo, head
+
+    @staticmethod
+    def guardar(stream, nombre_original=""):
+        """
+        Copia `stream` (archivo subido o el cuerpo de la petición) a default_storage
+        por pedazos. Regresa {"nombre", "url", "content_type", "tamano"}.
+        Lanza ArchivoDemasiadoGrande si pasa de MEDIA_MAX_UPLOAD_BYTES (y no deja nada).
+        """
+        limite = getattr(settings, "MEDIA_MAX_UPLOAD_BYTES", 100 * 1024 * 1024)
+        archivo, head = MediaUtils.recibir(stream, limite)
+        try:
+            content_type = Utils.mimeFromBytes(head, nombre_original)
+            # La extensión sale del contenido, no del nombre que mandó el cliente
+            extension = MediaUtils.EXTENSIONES.get(content_type) or mimetypes.guess_extension(content_type) or ".bin"
+            nombre = secrets.token_urlsafe(16) + extension
+            ruta = default_storage.save(MediaUtils.ruta(nombre), archivo)
+            tamano = archivo.size
+        finally:
+            if archivo is not stream:
+                archivo.close()
+
+        nombre = posixpath.relpath(ruta, MediaUtils.CARPETA)
+        return {
+            "nombre": nombre,
+            "url": "/%s/%s" % (MediaUtils.CARPETA, nombre),
+            "content_type": content_type,
+            "tamano": tamano,
+        }
+
+    @staticmethod
+    def leer(ruta, inicio, cantidad):
+        with default_storage.open(ruta, "rb") as archivo:
+            archivo.seek(inicio)
+            while cantidad > 0:
+                chunk = archivo.read(min(MediaUtils.CHUNK_SIZE, cantidad))
+                if not chunk:
+                    return
+                cantidad -= len(chunk)
+                yield chunk
+
+    @staticmethod
+    def rango(header, tamano):
+        """
+        (inicio, fin) inclusivos del encabezado Range, None si no aplica (sin
+        Range, varios rangos o unidad distinta: se manda completo) o False si
+        no se puede satisfacer (416).
+        """
+        coincide = MediaUtils.RANGO.match(header.replace(" ", "")) if header else None
+        if not coincide or coincide.group(1) == coincide.group(2) == "":
+            return None
+        inicio, fin = coincide.groups()
+        if inicio == "":
+            # bytes=-N: los últimos N bytes
+            sufijo = int(fin)
+            if sufijo == 0:
+                return False
+            return max(0, tamano - sufijo), tamano - 1
+        inicio = int(inicio)
+        fin = tamano - 1 if fin == "" else min(int(fin), tamano - 1)
+        if inicio >= tamano or inicio > fin:
+            return False
+        return inicio, fin
+
+    @staticmethod
+    def servir(request, nombre):
+        """Respuesta de un archivo guardado, con soporte de Range (206 / 416). Lanza FileNotFoundError."""
+        ruta = MediaUtils.ruta(nombre)
+        with default_storage.open(ruta, "rb") as archivo:
+            content_type = Utils.mimeFromBytes(archivo.read(16), nombre)
+        tamano = default_storage.size(ruta)
+
+        rango = MediaUtils.rango(request.headers.get("Range"), tamano)
+        if rango is False:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = "bytes */%d" % tamano
+            return response
+        if rango is None:
+            inicio, fin, status = 0, tamano - 1, 200
+        else:
+            (inicio, fin), status = rango, 206
+
+        response = StreamingHttpResponse(MediaUtils.leer(ruta, inicio, fin - inicio + 1), content_type=content_type, status=status)
+        response["Content-Length"] = str(fin - inicio + 1)
+        response["Accept-Ranges"] = "bytes"
+        try:
+            response["Last-Modified"] = http_date(default_storage.get_modified_time(ruta).timestamp())
+        except NotImplementedError:
+            pass
+        if status == 206:
+            response["Content-Range"] = "bytes %d-%d/%d" % (inicio, fin, tamano)
+        return response
+
+    @staticmethod
+    def servir_b64(nombre):
+        """El archivo como data URI en streaming (para clientes que esperan base64)."""
+        ruta = MediaUtils.ruta(nombre)
+        with default_storage.open(ruta, "rb") as archivo:
+            content_type = Utils.mimeFromBytes(archivo.read(16), nombre)
+
+        def contenido():
+            yield "data:%s;base64," % content_type
+            with default_storage.open(ruta, "rb") as archivo:
+                yield from Utils.b64Chunks(archivo)
+
+        return StreamingHttpResponse(contenido(), content_type="text/plain")
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.10 on 2026-10-17 22:28
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_escolar_api', '0004_materias'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionTabla',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('tabla', models.CharField(max_length=64, unique=True)),
+                ('version', models.BigIntegerField(default=0)),
+                ('modificado', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.10 on 2026-10-17 22:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_escolar_api', '0005_versiontabla'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Contador',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('nombre', models.CharField(max_length=64, unique=True)),
+                ('valor', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
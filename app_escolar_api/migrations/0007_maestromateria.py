@@ -0,0 +1,77 @@
+# Generated by Django 4.2.10 on 2026-10-17 22:32
+
+import ast
+import json
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def parsear_materias(texto):
+    # Misma lógica que MaestroMateria.normalizar (copiada para no depender del modelo actual)
+    if not texto:
+        return []
+    try:
+        materias = json.loads(texto)
+    except ValueError:
+        try:
+            materias = ast.literal_eval(texto)
+        except (ValueError, SyntaxError):
+            materias = [texto]
+    if isinstance(materias, str):
+        materias = [materias]
+    if not isinstance(materias, (list, tuple)):
+        return []
+    return [str(nombre) for nombre in materias if nombre not in (None, "")]
+
+
+def materias_json_a_tabla(apps, schema_editor):
+    Maestros = apps.get_model('app_escolar_api', 'Maestros')
+    MaestroMateria = apps.get_model('app_escolar_api', 'MaestroMateria')
+    filas = []
+    for maestro_id, texto in Maestros.objects.values_list('id', 'materias_json').iterator(chunk_size=1000):
+        for orden, nombre in enumerate(parsear_materias(texto)):
+            filas.append(MaestroMateria(maestro_id=maestro_id, nombre=nombre, orden=orden))
+        if len(filas) >= 1000:
+            MaestroMateria.objects.bulk_create(filas)
+            filas = []
+    MaestroMateria.objects.bulk_create(filas)
+
+
+def tabla_a_materias_json(apps, schema_editor):
+    Maestros = apps.get_model('app_escolar_api', 'Maestros')
+    MaestroMateria = apps.get_model('app_escolar_api', 'MaestroMateria')
+    materias = {}
+    for maestro_id, nombre in MaestroMateria.objects.order_by('maestro_id', 'orden', 'id').values_list('maestro_id', 'nombre'):
+        materias.setdefault(maestro_id, []).append(nombre)
+    maestros = list(Maestros.objects.filter(id__in=materias))
+    for maestro in maestros:
+        maestro.materias_json = json.dumps(materias[maestro.id])
+    Maestros.objects.bulk_update(maestros, ['materias_json'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_escolar_api', '0006_contador'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MaestroMateria',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('nombre', models.CharField(db_index=True, max_length=255)),
+                ('orden', models.PositiveIntegerField(default=0)),
+                ('maestro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='materias_rel', to='app_escolar_api.maestros')),
+            ],
+            options={
+                'ordering': ('orden', 'id'),
+            },
+        ),
+        migrations.RunPython(materias_json_a_tabla, tabla_a_materias_json),
+        migrations.RemoveField(
+            model_name='maestros',
+            name='materias_json',
+        ),
+    ]
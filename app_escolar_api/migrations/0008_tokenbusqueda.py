@@ -0,0 +1,68 @@
+# Generated by Django 4.2.10 on 2026-10-17 22:34
+
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+PERFILES = (
+    ('Alumnos', 'alumno', ('matricula', 'curp', 'rfc')),
+    ('Maestros', 'maestro', ('id_trabajador', 'rfc')),
+    ('Administradores', 'administrador', ('clave_admin', 'rfc')),
+)
+
+
+def tokenizar(*valores):
+    # Misma lógica que TokenBusqueda.tokenizar (copiada para no depender del modelo actual)
+    tokens = set()
+    for valor in valores:
+        if not valor:
+            continue
+        valor = unicodedata.normalize('NFKD', str(valor)).encode('ascii', 'ignore').decode('ascii').lower().strip()
+        tokens.add(valor.replace(' ', ''))
+        tokens.update(re.split(r'[^a-z0-9]+', valor))
+    tokens.discard('')
+    return {token[:64] for token in tokens}
+
+
+def indexar_perfiles(apps, schema_editor):
+    TokenBusqueda = apps.get_model('app_escolar_api', 'TokenBusqueda')
+    for modelo, tipo, campos in PERFILES:
+        perfiles = apps.get_model('app_escolar_api', modelo).objects.select_related('user').iterator(chunk_size=1000)
+        filas = []
+        for perfil in perfiles:
+            user = perfil.user
+            for token in tokenizar(user.first_name, user.last_name, user.email, *[getattr(perfil, c) for c in campos]):
+                filas.append(TokenBusqueda(token=token, tipo=tipo, perfil_id=perfil.pk, user_id=perfil.user_id))
+            if len(filas) >= 1000:
+                TokenBusqueda.objects.bulk_create(filas)
+                filas = []
+        TokenBusqueda.objects.bulk_create(filas)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('app_escolar_api', '0007_maestromateria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenBusqueda',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('token', models.CharField(max_length=64)),
+                ('tipo', models.CharField(max_length=16)),
+                ('perfil_id', models.BigIntegerField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tokens_busqueda', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token', 'tipo'], name='busqueda_token_idx'), models.Index(fields=['tipo', 'perfil_id'], name='busqueda_perfil_idx')],
+            },
+        ),
+        migrations.RunPython(indexar_perfiles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 4.2.10 on 2026-10-17 22:37
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+# auth_user es de django.contrib.auth, así que sus índices no pueden declararse en
+# un Meta; se crean con SQL según el motor. MySQL no tiene índices parciales.
+INDICES_USUARIOS = {
+    'postgresql': (
+        ('auth_user_email_idx', 'CREATE INDEX IF NOT EXISTS auth_user_email_idx ON auth_user (email)'),
+        ('auth_user_activos_idx', 'CREATE INDEX IF NOT EXISTS auth_user_activos_idx ON auth_user (id) WHERE is_active'),
+    ),
+    'sqlite': (
+        ('auth_user_email_idx', 'CREATE INDEX IF NOT EXISTS auth_user_email_idx ON auth_user (email)'),
+        ('auth_user_activos_idx', 'CREATE INDEX IF NOT EXISTS auth_user_activos_idx ON auth_user (id) WHERE is_active'),
+    ),
+    'mysql': (
+        ('auth_user_email_idx', 'CREATE INDEX auth_user_email_idx ON auth_user (email)'),
+    ),
+}
+
+
+def crear_indices_usuarios(apps, schema_editor):
+    for nombre, sql in INDICES_USUARIOS.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(sql)
+
+
+def borrar_indices_usuarios(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for nombre, sql in INDICES_USUARIOS.get(vendor, ()):
+        if vendor == 'mysql':
+            schema_editor.execute('DROP INDEX %s ON auth_user' % nombre)
+        else:
+            schema_editor.execute('DROP INDEX IF EXISTS %s' % nombre)
+
+
+def validar_duplicados(apps, schema_editor):
+    # Mejor un mensaje con los valores repetidos que un IntegrityError al crear el índice único
+    repetidos = []
+    for modelo, campo in (('Alumnos', 'matricula'), ('Maestros', 'id_trabajador')):
+        valores = (
+            apps.get_model('app_escolar_api', modelo).objects
+            .exclude(Q(**{campo + '__isnull': True}) | Q(**{campo: ''}))
+            .values(campo).annotate(total=Count('id')).filter(total__gt=1)
+            .values_list(campo, flat=True)
+        )
+        repetidos += ['%s.%s=%r' % (modelo, campo, valor) for valor in valores]
+    if repetidos:
+        raise RuntimeError('Hay valores repetidos; corrígelos antes de migrar: ' + ', '.join(repetidos))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('app_escolar_api', '0008_tokenbusqueda'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices_usuarios, borrar_indices_usuarios),
+        migrations.AddIndex(
+            model_name='alumnos',
+            index=models.Index(fields=['matricula'], name='alumno_matricula_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alumnos',
+            index=models.Index(fields=['curp'], name='alumno_curp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='maestros',
+            index=models.Index(fields=['id_trabajador'], name='maestro_id_trabajador_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alumnos',
+            index=models.Index(fields=['rfc'], name='alumno_rfc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materias',
+            index=models.Index(fields=['salon'], name='materia_salon_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='materias',
+            index=models.Index(fields=['programa_educativo'], name='materia_programa_idx'),
+        ),
+        migrations.RunPython(validar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='alumnos',
+            constraint=models.UniqueConstraint(condition=models.Q(('matricula__isnull', False), models.Q(('matricula', ''), _negated=True)), fields=('matricula',), name='alumno_matricula_unica'),
+        ),
+        migrations.AddConstraint(
+            model_name='maestros',
+            constraint=models.UniqueConstraint(condition=models.Q(('id_trabajador__isnull', False), models.Q(('id_trabajador', ''), _negated=True)), fields=('id_trabajador',), name='maestro_id_trabajador_unico'),
+        ),
+    ]
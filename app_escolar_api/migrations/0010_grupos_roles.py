@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+ROLES = ('administrador', 'maestro', 'alumno')
+
+
+def crear_grupos(apps, schema_editor):
+    # Con los grupos creados de antemano el registro solo lee su id (Roles.id_grupo)
+    Group = apps.get_model('auth', 'Group')
+    for nombre in ROLES:
+        Group.objects.get_or_create(name=nombre)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('app_escolar_api', '0009_indices_busqueda'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_grupos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,234 @@
+# Generated by Django 4.2.10 on 2026-10-17 22:54
+
+import base64
+import hashlib
+import hmac
+import re
+import unicodedata
+
+import app_escolar_api.models
+from cryptography.fernet import Fernet, MultiFernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from django.conf import settings
+from django.db import migrations, models
+
+
+BLOQUE = 1000
+
+# modelo -> (tipo en TokenBusqueda, campos indexados en claro, campos cifrados, campo -> huella)
+PERFILES = {
+    'alumnos': ('alumno', ('matricula',), ('curp', 'rfc', 'telefono'), {'curp': 'curp_huella', 'rfc': 'rfc_huella'}),
+    'maestros': ('maestro', ('id_trabajador',), ('rfc', 'telefono'), {'rfc': 'rfc_huella'}),
+    'administradores': ('administrador', ('clave_admin',), ('rfc', 'telefono'), {'rfc': 'rfc_huella'}),
+}
+
+# Copia de TokenBusqueda.tokenizar / token_huella al momento de esta migración
+LONGITUD_MAXIMA = 64
+PREFIJO_HUELLA = '#'
+
+
+def tokenizar(*valores):
+    tokens = set()
+    for valor in valores:
+        if not valor:
+            continue
+        valor = unicodedata.normalize('NFKD', str(valor)).encode('ascii', 'ignore').decode('ascii').lower().strip()
+        tokens.add(valor.replace(' ', ''))
+        tokens.update(re.split(r'[^a-z0-9]+', valor))
+    tokens.discard('')
+    return {token[:LONGITUD_MAXIMA] for token in tokens}
+
+
+# Copia de CypherUtils al momento de esta migración: PBKDF2 y Fernet para cifrar,
+# HMAC-SHA256 para las huellas. De settings solo se leen las llaves.
+SALT = b'hdjk'
+ITERACIONES = 1000
+
+
+def a_bytes(valor):
+    return valor.encode('utf-8') if isinstance(valor, str) else valor
+
+
+def fernet():
+    passwords = []
+    for password in [settings.CRYPTO_PASSWORD] + list(getattr(settings, 'CRYPTO_PASSWORDS_ANTERIORES', ())):
+        password = a_bytes(password)
+        if password and password not in passwords:
+            passwords.append(password)
+    llaves = []
+    for password in passwords:
+        key = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=SALT, iterations=ITERACIONES).derive(password)
+        llaves.append(Fernet(base64.urlsafe_b64encode(key)))
+    return MultiFernet(llaves)
+
+
+def huella(valor):
+    if valor is None or valor == '':
+        return None
+    llave = a_bytes(settings.CRYPTO_HUELLA_KEY)
+    return hmac.new(llave, str(valor).strip().upper().encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def token_huella(valor):
+    huella_valor = huella(valor)
+    return PREFIJO_HUELLA + huella_valor[:LONGITUD_MAXIMA - 1] if huella_valor else None
+
+
+def convertir(apps, schema_editor, cifrar):
+    """
+    Cifra (o descifra, al revertir) curp/rfc/telefono por bloques con SQL directo:
+    los modelos históricos ya usan CampoCifrado y tratarían de descifrar el texto
+    plano al leerlo. En el mismo bloque se calculan las huellas y se rehacen los
+    tokens de búsqueda, que tenían CURP y RFC en claro.
+    """
+    TokenBusqueda = apps.get_model('app_escolar_api', 'TokenBusqueda')
+    quote = schema_editor.quote_name
+    llave = fernet()
+
+    for modelo, (tipo, claros, cifrados, huellas) in PERFILES.items():
+        tabla = quote('app_escolar_api_' + modelo)
+        columnas = ', '.join('p.' + quote(c) for c in claros + cifrados)
+        seleccion = (
+            'SELECT p.id, p.user_id, u.first_name, u.last_name, u.email, %s FROM %s p '
+            'INNER JOIN auth_user u ON u.id = p.user_id WHERE p.id > %%s ORDER BY p.id' % (columnas, tabla)
+        )
+        asignaciones = [quote(c) + ' = %s' for c in cifrados]
+        if cifrar:
+            asignaciones += [quote(h) + ' = %s' for h in huellas.values()]
+        actualizacion = 'UPDATE %s SET %s WHERE id = %%s' % (tabla, ', '.join(asignaciones))
+
+        ultimo = 0
+        while True:
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute(seleccion + ' LIMIT %d' % BLOQUE, [ultimo])
+                filas = cursor.fetchall()
+            if not filas:
+                break
+            ultimo = filas[-1][0]
+
+            cambios, tokens = [], []
+            for fila in filas:
+                perfil_id, user_id, first_name, last_name, email = fila[:5]
+                valores_claros = fila[5:5 + len(claros)]
+                valores = dict(zip(cifrados, fila[5 + len(claros):]))
+                if cifrar:
+                    texto = valores
+                    nuevos = [llave.encrypt(valores[c].encode('utf-8')).decode('utf-8') if valores[c] else valores[c] for c in cifrados]
+                    nuevos += [huella(valores[c]) for c in huellas]
+                else:
+                    texto = {c: llave.decrypt(v.encode('utf-8')).decode('utf-8') if v else v for c, v in valores.items()}
+                    nuevos = [texto[c] for c in cifrados]
+                cambios.append(nuevos + [perfil_id])
+
+                palabras = tokenizar(first_name, last_name, email, *valores_claros)
+                if cifrar:
+                    palabras.update(token_huella(texto[c]) for c in huellas)
+                    palabras.discard(None)
+                else:
+                    palabras |= tokenizar(*[texto[c] for c in huellas])
+                tokens += [TokenBusqueda(token=token, tipo=tipo, perfil_id=perfil_id, user_id=user_id) for token in palabras]
+
+            with schema_editor.connection.cursor() as cursor:
+                cursor.executemany(actualizacion, cambios)
+            TokenBusqueda.objects.filter(tipo=tipo, perfil_id__in=[fila[0] for fila in filas]).delete()
+            TokenBusqueda.objects.bulk_create(tokens, batch_size=BLOQUE)
+
+
+def cifrar(apps, schema_editor):
+    convertir(apps, schema_editor, cifrar=True)
+
+
+def descifrar(apps, schema_editor):
+    convertir(apps, schema_editor, cifrar=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_escolar_api', '0010_grupos_roles'),
+    ]
+
+    operations = [
+        # Un índice sobre el texto cifrado no sirve para nada
+        migrations.RemoveIndex(
+            model_name='alumnos',
+            name='alumno_curp_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='alumnos',
+            name='alumno_rfc_idx',
+        ),
+        migrations.AlterField(
+            model_name='administradores',
+            name='rfc',
+            field=app_escolar_api.models.CampoCifrado(blank=True, max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='administradores',
+            name='telefono',
+            field=app_escolar_api.models.CampoCifrado(blank=True, max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='alumnos',
+            name='curp',
+            field=app_escolar_api.models.CampoCifrado(blank=True, max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='alumnos',
+            name='rfc',
+            field=app_escolar_api.models.CampoCifrado(blank=True, max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='alumnos',
+            name='telefono',
+            field=app_escolar_api.models.CampoCifrado(blank=True, max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='maestros',
+            name='rfc',
+            field=app_escolar_api.models.CampoCifrado(blank=True, max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='maestros',
+            name='telefono',
+            field=app_escolar_api.models.CampoCifrado(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='administradores',
+            name='rfc_huella',
+            field=app_escolar_api.models.CampoHuella(blank=True, editable=False, max_length=64, null=True, origen='rfc'),
+        ),
+        migrations.AddField(
+            model_name='alumnos',
+            name='curp_huella',
+            field=app_escolar_api.models.CampoHuella(blank=True, editable=False, max_length=64, null=True, origen='curp'),
+        ),
+        migrations.AddField(
+            model_name='alumnos',
+            name='rfc_huella',
+            field=app_escolar_api.models.CampoHuella(blank=True, editable=False, max_length=64, null=True, origen='rfc'),
+        ),
+        migrations.AddField(
+            model_name='maestros',
+            name='rfc_huella',
+            field=app_escolar_api.models.CampoHuella(blank=True, editable=False, max_length=64, null=True, origen='rfc'),
+        ),
+        migrations.RunPython(cifrar, descifrar),
+        migrations.AddIndex(
+            model_name='administradores',
+            index=models.Index(fields=['rfc_huella'], name='admin_rfc_huella_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alumnos',
+            index=models.Index(fields=['curp_huella'], name='alumno_curp_huella_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alumnos',
+            index=models.Index(fields=['rfc_huella'], name='alumno_rfc_huella_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='maestros',
+            index=models.Index(fields=['rfc_huella'], name='maestro_rfc_huella_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.10 on 2026-10-17 23:12
+
+import unicodedata
+
+import app_escolar_api.models
+from django.db import migrations, models
+
+
+# Copia de Materias.DIAS / mascara_dias al momento de esta migración
+DIAS = ('lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sabado', 'domingo')
+
+
+def mascara_dias(dias):
+    mascara = 0
+    for dia in (dias or '').split(','):
+        dia = unicodedata.normalize('NFKD', dia).encode('ascii', 'ignore').decode('ascii').lower().strip()
+        if dia in DIAS:
+            mascara |= 1 << DIAS.index(dia)
+    return mascara
+
+
+def llenar_mascaras(apps, schema_editor):
+    """
+    Un UPDATE por cada texto de días distinto ("Lunes, Miércoles", ...): son
+    pocos aunque haya miles de materias.
+    """
+    Materias = apps.get_model('app_escolar_api', 'Materias')
+    for dias in Materias.objects.exclude(dias=None).values_list('dias', flat=True).distinct():
+        mascara = mascara_dias(dias)
+        if mascara:
+            Materias.objects.filter(dias=dias).update(dias_mask=mascara)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_escolar_api', '0011_cifrado_datos_personales'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='materias',
+            name='dias_mask',
+            field=app_escolar_api.models.CampoDias(default=0, editable=False, origen='dias'),
+        ),
+        migrations.RunPython(llenar_mascaras, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='materias',
+            index=models.Index(fields=['dias_mask', 'hora_inicio', 'hora_fin'], name='materia_dias_hora_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.10 on 2026-10-18 09:12
+
+from django.db import migrations
+
+
+# En PostgreSQL, LIKE 'jua%' solo usa un índice con varchar_pattern_ops (o con
+# collation "C"); el de (token, tipo) sigue sirviendo para token = '...'.
+# En SQLite la búsqueda por prefijo es un rango sobre busqueda_token_idx y MySQL
+# usa ese mismo índice para LIKE 'jua%'.
+INDICES = {
+    'postgresql': (
+        ('busqueda_token_patron_idx',
+         'CREATE INDEX IF NOT EXISTS busqueda_token_patron_idx '
+         'ON app_escolar_api_tokenbusqueda (token varchar_pattern_ops, tipo)'),
+    ),
+}
+
+
+def crear_indices(apps, schema_editor):
+    for nombre, sql in INDICES.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(sql)
+
+
+def borrar_indices(apps, schema_editor):
+    for nombre, sql in INDICES.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute('DROP INDEX IF EXISTS %s' % nombre)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_escolar_api', '0012_dias_mascara'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices, borrar_indices),
+    ]
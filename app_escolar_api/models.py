@@ -1,10 +1,28 @@
-from django.db import models
-from django.db.models.signals import post_save
+import ast
+import copy
+import json
+import os
+import re
+import secrets
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from django.core.cache import caches
+from django.core.checks import Error as CheckError, Tags, register
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import connection, models, transaction
+from django.db.models import Count, F, Q
+from django.db.models.signals import post_delete, post_init, post_save
 from django.dispatch import receiver
+from django.utils import timezone
 from rest_framework.authentication import TokenAuthentication
-from django.contrib.auth.models import AbstractUser, User
+from rest_framework.authtoken.models import Token
+from django.contrib.auth.models import AbstractUser, Group, User
 from django.conf import settings
 
+from app_escolar_api.cypher_utils import CypherUtils
+
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -13,17 +31,207 @@ from rest_framework.authentication import TokenAuthentication
 class BearerTokenAuthentication(TokenAuthentication):
     keyword = "Bearer"
 
+    def authenticate_credentials(self, key):
+        # Token + usuario desde el cache del proceso; la consulta solo en un fallo
+        resultado = TokenCache.obtener(key)
+        if resultado is not None:
+            return resultado
+        generacion = TokenCache.generacion(key)
+        user, token = super().authenticate_credentials(key)
+        TokenCache.guardar(key, user, token, generacion)
+        return user, token
+
+
+class TokenCache:
+    """
+    LRU con TTL de token -> (usuario, token) para BearerTokenAuthentication.
+    Un acierto no consulta la BD; un fallo hace solo la consulta del token.
+
+    Las señales de abajo (logout / borrado de token, cambios o borrado del
+    usuario) quitan las entradas de ese token o usuario en este proceso. Los
+    demás workers se enteran solo con VERSIONES_EN_CACHE: la invalidación deja
+    una marca por token en el cache compartido y cada acierto la compara con
+    la que había al guardarlo. Sin cache compartido, en los demás workers un
+    token revocado sigue sirviendo hasta TOKEN_CACHE_TTL segundos.
+    """
+    _entradas = OrderedDict()
+    _lock = threading.Lock()
+    # Invalidaciones en este proceso; evita guardar lo leído antes de una de ellas
+    _invalidaciones = 0
+
+    @staticmethod
+    def ttl():
+        return getattr(settings, "TOKEN_CACHE_TTL", 60)
+
+    @staticmethod
+    def clave(key):
+        return "token-marca:" + key
+
+    @staticmethod
+    def marca(key):
+        if not VersionTabla.en_cache():
+            return None
+        return VersionTabla.cache().get(TokenCache.clave(key))
+
+    @staticmethod
+    def generacion(key):
+        """Se lee antes de consultar la BD y se pasa a guardar()."""
+        return TokenCache._invalidaciones, TokenCache.marca(key)
+
+    @staticmethod
+    def obtener(key):
+        if TokenCache.ttl() <= 0:
+            return None
+        with TokenCache._lock:
+            entrada = TokenCache._entradas.get(key)
+            if entrada is None:
+                return None
+            user, token, marca, expira = entrada
+            if expira < time.monotonic():
+                del TokenCache._entradas[key]
+                return None
+            TokenCache._entradas.move_to_end(key)
+        if marca != TokenCache.marca(key):
+            # Otro worker lo invalidó después de que se guardó aquí
+            with TokenCache._lock:
+                TokenCache._entradas.pop(key, None)
+            return None
+        # Copias: cada petición puede modificar su request.user sin afectar a las demás
+        user = copy.copy(user)
+        token = copy.copy(token)
+        token.user = user
+        return user, token
+
+    @staticmethod
+    def guardar(key, user, token, generacion):
+        if TokenCache.ttl() <= 0:
+            return
+        invalidaciones, marca = generacion
+        with TokenCache._lock:
+            # Si algo se invalidó mientras se consultaba la BD, no guardar datos viejos
+            if invalidaciones != TokenCache._invalidaciones:
+                return
+            TokenCache._entradas[key] = (copy.copy(user), copy.copy(token), marca, time.monotonic() + TokenCache.ttl())
+            TokenCache._entradas.move_to_end(key)
+            while len(TokenCache._entradas) > getattr(settings, "TOKEN_CACHE_MAX_ENTRIES", 10000):
+                TokenCache._entradas.popitem(last=False)
+
+    @staticmethod
+    def invalidar(key=None, user_id=None):
+        """Quita las entradas del token o del usuario y, con cache compartido, avisa a los demás workers."""
+        with TokenCache._lock:
+            TokenCache._invalidaciones += 1
+            for clave, (user, token, marca, expira) in list(TokenCache._entradas.items()):
+                if clave == key or user.pk == user_id:
+                    del TokenCache._entradas[clave]
+        if not VersionTabla.en_cache():
+            return
+        keys = [key] if key else list(Token.objects.filter(user_id=user_id).values_list("key", flat=True))
+        if keys:
+            # Como VersionTabla.publicar: hasta el commit, para que nadie guarde el token viejo bajo la marca nueva.
+            # La marca solo tiene que durar lo que una entrada: después de TOKEN_CACHE_TTL ya expiró en todos
+            marcas = {TokenCache.clave(k): secrets.token_hex(8) for k in keys}
+            transaction.on_commit(lambda: VersionTabla.cache().set_many(marcas, timeout=max(TokenCache.ttl(), 1)))
+
+
+class CampoCifrado(models.CharField):
+    """
+    CharField que se guarda cifrado con CypherUtils. En Python el valor es el
+    texto plano (max_length aplica a él); en la BD es un token Fernet distinto
+    en cada guardado, por eso la columna es TEXT y no admite filtros: para
+    buscar por igualdad se usa un CampoHuella. Solo se descifran las filas que
+    la consulta regresa.
+    """
+
+    def get_internal_type(self):
+        return "TextField"
+
+    def from_db_value(self, value, expression, connection):
+        if not value:
+            return value
+        return CypherUtils.desencripta(value)
+
+    def get_db_prep_save(self, value, connection):
+        value = super().get_db_prep_save(value, connection)
+        if not value:
+            return value
+        return CypherUtils.encripta(value)
+
+    def get_lookup(self, lookup_name):
+        # filter(curp=...) nunca coincidiría con el token cifrado; mejor un FieldError
+        return super().get_lookup(lookup_name) if lookup_name == "isnull" else None
+
+    def get_transform(self, lookup_name):
+        return None
+
+
+class CampoHuella(models.CharField):
+    """
+    Huella (CypherUtils.huella) del campo `origen` del mismo modelo; se calcula
+    al guardar, también en bulk_create. Para buscar:
+        Alumnos.objects.filter(curp_huella=CypherUtils.huella(curp))
+    """
+
+    def __init__(self, *args, origen=None, **kwargs):
+        self.origen = origen
+        kwargs.setdefault("max_length", 64)
+        kwargs.setdefault("null", True)
+        kwargs.setdefault("blank", True)
+        kwargs.setdefault("editable", False)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs["origen"] = self.origen
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        valor = CypherUtils.huella(getattr(model_instance, self.origen))
+        setattr(model_instance, self.attname, valor)
+        return valor
+
+
+class CampoDias(models.PositiveSmallIntegerField):
+    """
+    Máscara de bits de los días del campo de texto `origen` (bit i = Materias.DIAS[i]);
+    se calcula al guardar, también en bulk_create. El texto sigue siendo lo que
+    manda y recibe el front; la máscara es para filtrar con índice:
+        Materias.objects.filter(dias_mask__in=Materias.mascaras_con(Materias.mascara_dias("Miércoles")))
+    """
+
+    def __init__(self, *args, origen=None, **kwargs):
+        self.origen = origen
+        kwargs.setdefault("default", 0)
+        kwargs.setdefault("editable", False)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs["origen"] = self.origen
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        valor = Materias.mascara_dias(getattr(model_instance, self.origen))
+        setattr(model_instance, self.attname, valor)
+        return valor
+
 
 class Administradores(models.Model):
     id = models.BigAutoField(primary_key=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=False, blank=False, default=None)
     clave_admin = models.CharField(max_length=255,null=True, blank=True)
-    telefono = models.CharField(max_length=255, null=True, blank=True)
-    rfc = models.CharField(max_length=255,null=True, blank=True)
+    telefono = CampoCifrado(max_length=255, null=True, blank=True)
+    rfc = CampoCifrado(max_length=255,null=True, blank=True)
     edad = models.IntegerField(null=True, blank=True)
     ocupacion = models.CharField(max_length=255,null=True, blank=True)
     creation = models.DateTimeField(auto_now_add=True, null=True, blank=True)
     update = models.DateTimeField(null=True, blank=True)
+    rfc_huella = CampoHuella(origen="rfc")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["rfc_huella"], name="admin_rfc_huella_idx"),
+        ]
 
     def __str__(self):
         return "Perfil del admin "+self.user.first_name+" "+self.user.last_name
@@ -32,14 +240,33 @@ class Alumnos(models.Model):
     id = models.BigAutoField(primary_key=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=False, blank=False, default=None)
     matricula = models.CharField(max_length=255,null=True, blank=True)
-    curp = models.CharField(max_length=255,null=True, blank=True)
-    rfc = models.CharField(max_length=255,null=True, blank=True)
+    curp = CampoCifrado(max_length=255,null=True, blank=True)
+    rfc = CampoCifrado(max_length=255,null=True, blank=True)
     fecha_nacimiento = models.DateTimeField(auto_now_add=False, null=True, blank=True)
     edad = models.IntegerField(null=True, blank=True)
-    telefono = models.CharField(max_length=255, null=True, blank=True)
+    telefono = CampoCifrado(max_length=255, null=True, blank=True)
     ocupacion = models.CharField(max_length=255,null=True, blank=True)
     creation = models.DateTimeField(auto_now_add=True, null=True, blank=True)
     update = models.DateTimeField(null=True, blank=True)
+    curp_huella = CampoHuella(origen="curp")
+    rfc_huella = CampoHuella(origen="rfc")
+
+    class Meta:
+        indexes = [
+            # Índice normal además del único parcial: SQLite no usa el parcial para matricula = ?
+            models.Index(fields=["matricula"], name="alumno_matricula_idx"),
+            # curp y rfc van cifrados; se buscan por su huella
+            models.Index(fields=["curp_huella"], name="alumno_curp_huella_idx"),
+            models.Index(fields=["rfc_huella"], name="alumno_rfc_huella_idx"),
+        ]
+        constraints = [
+            # La matrícula es opcional; solo las que tienen valor deben ser únicas
+            models.UniqueConstraint(
+                fields=["matricula"],
+                condition=Q(matricula__isnull=False) & ~Q(matricula=""),
+                name="alumno_matricula_unica",
+            ),
+        ]
 
     def __str__(self):
         return "Perfil del alumno "+self.user.first_name+" "+self.user.last_name
@@ -49,17 +276,85 @@ class Maestros(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=False, blank=False, default=None)
     id_trabajador = models.CharField(max_length=255,null=True, blank=True)
     fecha_nacimiento = models.DateTimeField(auto_now_add=False, null=True, blank=True)
-    telefono = models.CharField(max_length=255, null=True, blank=True)
-    rfc = models.CharField(max_length=255,null=True, blank=True)
+    telefono = CampoCifrado(max_length=255, null=True, blank=True)
+    rfc = CampoCifrado(max_length=255,null=True, blank=True)
     cubiculo = models.CharField(max_length=255,null=True, blank=True)
     edad = models.IntegerField(null=True, blank=True)
     area_investigacion = models.CharField(max_length=255,null=True, blank=True)
-    materias_json = models.TextField(null=True, blank=True)
     creation = models.DateTimeField(auto_now_add=True, null=True, blank=True)
     update = models.DateTimeField(null=True, blank=True)
+    rfc_huella = CampoHuella(origen="rfc")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["id_trabajador"], name="maestro_id_trabajador_idx"),
+            models.Index(fields=["rfc_huella"], name="maestro_rfc_huella_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["id_trabajador"],
+                condition=Q(id_trabajador__isnull=False) & ~Q(id_trabajador=""),
+                name="maestro_id_trabajador_unico",
+            ),
+        ]
 
     def __str__(self):
         return "Perfil del maestro "+self.user.first_name+" "+self.user.last_name
+
+    def guardar_materias(self, materias, nuevo=False):
+        """
+        Reemplaza las materias que puede impartir (antes materias_json). Un DELETE
+        y un INSERT sin señales por fila; la versión de "maestros" sube una vez
+        (en un alta ya la subió el INSERT del perfil).
+        """
+        if not nuevo:
+            MaestroMateria.objects.filter(maestro=self)._raw_delete(MaestroMateria.objects.db)
+        MaestroMateria.objects.bulk_create(
+            [MaestroMateria(maestro=self, nombre=nombre, orden=orden)
+             for orden, nombre in enumerate(MaestroMateria.normalizar(materias))]
+        )
+        if not nuevo:
+            VersionTabla.incrementar(TABLAS_VERSIONADAS[MaestroMateria])
+
+
+class MaestroMateria(models.Model):
+    """
+    Materias que puede impartir un maestro, una fila por materia (antes era el
+    TextField Maestros.materias_json). "nombre" tiene índice para buscar qué
+    maestros pueden impartir una materia sin leer a todos.
+    """
+    id = models.BigAutoField(primary_key=True)
+    maestro = models.ForeignKey(Maestros, on_delete=models.CASCADE, related_name='materias_rel')
+    nombre = models.CharField(max_length=255, db_index=True)
+    orden = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ("orden", "id")
+
+    def __str__(self):
+        return f"{self.maestro_id}: {self.nombre}"
+
+    @staticmethod
+    def normalizar(materias):
+        """
+        Acepta lo que antes se guardaba en materias_json: lista, texto JSON o el
+        repr de una lista de Python (lo que dejaba el PUT). Regresa lista de str.
+        """
+        if materias is None or materias == "":
+            return []
+        if isinstance(materias, str):
+            try:
+                materias = json.loads(materias)
+            except ValueError:
+                try:
+                    materias = ast.literal_eval(materias)
+                except (ValueError, SyntaxError):
+                    materias = [materias]
+        if isinstance(materias, str):
+            materias = [materias]
+        if not isinstance(materias, (list, tuple)):
+            return []
+        return [str(nombre) for nombre in materias if nombre not in (None, "")]
     
 class Materias(models.Model):
     id = models.BigAutoField(primary_key=True)
@@ -67,6 +362,7 @@ class Materias(models.Model):
     nombre_materia = models.CharField(max_length=255, null=True, blank=True)
     seccion = models.CharField(max_length=255, null=True, blank=True)
     dias = models.CharField(max_length=255, null=True, blank=True) # Guardaremos los días como texto (ej: "Lunes, Martes")
+    dias_mask = CampoDias(origen="dias")
     hora_inicio = models.TimeField(null=True, blank=True)
     hora_fin = models.TimeField(null=True, blank=True)
     salon = models.CharField(max_length=255, null=True, blank=True)
@@ -76,5 +372,532 @@ class Materias(models.Model):
     creation = models.DateTimeField(auto_now_add=True, null=True, blank=True)
     update = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["salon"], name="materia_salon_idx"),
+            models.Index(fields=["programa_educativo"], name="materia_programa_idx"),
+            # ¿Qué clases hay el miércoles de 10 a 12? dias_mask IN (...) + rango de horas
+            models.Index(fields=["dias_mask", "hora_inicio", "hora_fin"], name="materia_dias_hora_idx"),
+        ]
+
     def __str__(self):
-        return f"{self.nombre_materia} - {self.nrc}"
\ No newline at end of file
+        return f"{self.nombre_materia} - {self.nrc}"
+
+    # Días en el orden de la semana, como los manda el front
+    DIAS = ("Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo")
+
+    @staticmethod
+    def indices_dias(dias):
+        """
+        "Lunes, Miércoles" (o una lista) -> (0, 2). Sin importar acentos ni
+        mayúsculas; lo que no es un día se ignora.
+        """
+        if not dias:
+            return ()
+        if isinstance(dias, str):
+            dias = dias.split(",")
+        indices = set()
+        for dia in dias:
+            indice = _INDICE_DIA.get(TokenBusqueda.normalizar(dia))
+            if indice is not None:
+                indices.add(indice)
+        return tuple(sorted(indices))
+
+    @staticmethod
+    def mascara_dias(dias):
+        """"Lunes, Miércoles" -> 0b101"""
+        mascara = 0
+        for indice in Materias.indices_dias(dias):
+            mascara |= 1 << indice
+        return mascara
+
+    @staticmethod
+    def dias_mascara(mascara):
+        """0b101 -> ["Lunes", "Miércoles"]"""
+        return [dia for i, dia in enumerate(Materias.DIAS) if mascara & (1 << i)]
+
+    @staticmethod
+    def mascaras_con(mascara):
+        """
+        Todas las máscaras que comparten algún día con `mascara`. Son a lo más
+        127: un IN sobre ellas usa el índice de dias_mask, cosa que un AND de
+        bits en SQL no puede.
+        """
+        return [m for m in range(1, 1 << len(Materias.DIAS)) if m & mascara]
+
+
+_INDICE_DIA = {unicodedata.normalize("NFKD", dia).encode("ascii", "ignore").decode("ascii").lower(): i
+               for i, dia in enumerate(Materias.DIAS)}
+
+
+class VersionTabla(models.Model):
+    """
+    Contador de versión por tabla. Se incrementa en cada escritura (ver señales abajo)
+    y sirve para construir ETags sin serializar ni leer las filas.
+    """
+    id = models.BigAutoField(primary_key=True)
+    tabla = models.CharField(max_length=64, unique=True)
+    version = models.BigIntegerField(default=0)
+    modificado = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.tabla} v{self.version}"
+
+    @staticmethod
+    def cache():
+        return caches[getattr(settings, "RESPONSE_CACHE_ALIAS", "default")]
+
+    @staticmethod
+    def en_cache():
+        """
+        Las versiones solo se copian al cache con VERSIONES_EN_CACHE, que exige un
+        backend compartido por todos los procesos (ver revisar_cache_versiones).
+        Con un cache por proceso cada worker se quedaría con su copia vieja.
+        """
+        return getattr(settings, "VERSIONES_EN_CACHE", False)
+
+    @staticmethod
+    def clave(tabla):
+        return "version-tabla:" + tabla
+
+    @staticmethod
+    def incrementar(*tablas):
+        ahora = timezone.now()
+        for tabla in tablas:
+            actualizadas = VersionTabla.objects.filter(tabla=tabla).update(version=F("version") + 1, modificado=ahora)
+            if not actualizadas:
+                VersionTabla.objects.get_or_create(tabla=tabla, defaults={"version": 1, "modificado": ahora})
+        if VersionTabla.en_cache():
+            # La copia en cache se publica hasta que la transacción se confirma,
+            # así nadie guarda datos sin confirmar bajo la versión nueva
+            transaction.on_commit(lambda: VersionTabla.publicar(tablas))
+
+    @staticmethod
+    def publicar(tablas):
+        versiones = VersionTabla.leer_bd(tablas)
+        VersionTabla.cache().set_many({VersionTabla.clave(t): v for t, v in versiones.items()},
+                                      timeout=getattr(settings, "VERSIONES_CACHE_TTL", 10))
+
+    @staticmethod
+    def leer_bd(tablas):
+        """Regresa {tabla: (version, modificado)} en una sola consulta."""
+        versiones = {tabla: (0, None) for tabla in tablas}
+        for tabla, version, modificado in VersionTabla.objects.filter(tabla__in=tablas).values_list("tabla", "version", "modificado"):
+            versiones[tabla] = (version, modificado)
+        return versiones
+
+    @staticmethod
+    def obtener(tablas):
+        """
+        Regresa {tabla: (version, modificado)}. Por omisión es una consulta a la
+        BD (índice único de tabla). Con VERSIONES_EN_CACHE se lee del cache
+        compartido; las que falten se consultan y se guardan con add() para no
+        pisar una versión más nueva publicada por una escritura concurrente. El
+        TTL corto acota lo que dura una versión vieja si una publicación se pierde.
+        """
+        if not VersionTabla.en_cache():
+            return VersionTabla.leer_bd(tablas)
+        cache = VersionTabla.cache()
+        en_cache = cache.get_many([VersionTabla.clave(t) for t in tablas])
+        versiones = {t: en_cache[VersionTabla.clave(t)] for t in tablas if VersionTabla.clave(t) in en_cache}
+        faltantes = [t for t in tablas if t not in versiones]
+        if faltantes:
+            for tabla, version in VersionTabla.leer_bd(faltantes).items():
+                cache.add(VersionTabla.clave(tabla), version, timeout=getattr(settings, "VERSIONES_CACHE_TTL", 10))
+                versiones[tabla] = version
+        return versiones
+
+
+# Backends que viven en la memoria de cada proceso: no sirven para compartir versiones
+CACHES_POR_PROCESO = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@register(Tags.caches)
+def revisar_cache_versiones(app_configs, **kwargs):
+    """manage.py check (y el arranque de runserver) falla si VERSIONES_EN_CACHE apunta a un cache por proceso."""
+    if not getattr(settings, "VERSIONES_EN_CACHE", False):
+        return []
+    alias = getattr(settings, "RESPONSE_CACHE_ALIAS", "default")
+    backend = settings.CACHES.get(alias, {}).get("BACKEND")
+    if backend in CACHES_POR_PROCESO:
+        return [CheckError(
+            "VERSIONES_EN_CACHE requiere un cache compartido por todos los procesos; %s es por proceso." % backend,
+            hint="Usa Redis, memcached o DatabaseCache en CACHE_BACKEND, o quita VERSIONES_EN_CACHE.",
+            id="app_escolar_api.E001",
+        )]
+    return []
+
+
+@register()
+def revisar_storage_archivos(app_configs, **kwargs):
+    """En App Engine estándar el disco es de solo lectura: los archivos subidos necesitan un bucket."""
+    if not os.environ.get("GAE_ENV", "").startswith("standard"):
+        return []
+    if isinstance(default_storage, FileSystemStorage):
+        return [CheckError(
+            "Los archivos subidos (archivos/) se guardarían en MEDIA_ROOT, que en App Engine es de solo lectura.",
+            hint="Configura DEFAULT_FILE_STORAGE con un bucket (p. ej. GoogleCloudStorage y GS_BUCKET_NAME).",
+            id="app_escolar_api.E002",
+        )]
+    return []
+
+
+@register(Tags.security, deploy=True)
+def revisar_llave_cifrado(app_configs, **kwargs):
+    """manage.py check --deploy: la llave de CampoCifrado no debe ser SECRET_KEY."""
+    if settings.CRYPTO_PASSWORD == settings.SECRET_KEY:
+        return [CheckError(
+            "CRYPTO_PASSWORD no está definida y los datos personales se cifran con SECRET_KEY.",
+            hint="Define CRYPTO_PASSWORD (y CRYPTO_HUELLA_KEY) en el entorno antes de guardar datos.",
+            id="app_escolar_api.E003",
+        )]
+    return []
+
+
+# Nombre de la versión que invalida cada modelo al escribirse
+TABLAS_VERSIONADAS = {
+    Administradores: "administradores",
+    Alumnos: "alumnos",
+    Maestros: "maestros",
+    MaestroMateria: "maestros",
+    Materias: "materias",
+    User: "usuarios",
+}
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def incrementar_version_tabla(sender, instance, **kwargs):
+    tabla = TABLAS_VERSIONADAS.get(sender)
+    if tabla is None:
+        return
+    # Actualizar solo last_login no cambia nada de lo que regresa la API
+    update_fields = kwargs.get("update_fields")
+    if update_fields and set(update_fields) <= {"last_login"}:
+        return
+    VersionTabla.incrementar(tabla)
+
+
+class Contador(models.Model):
+    """
+    Totales de usuarios activos por tipo de perfil (total-usuarios/).
+    Se mantienen con las señales de abajo dentro de la misma transacción que la
+    escritura; reconciliar() los recalcula desde cero.
+    """
+    id = models.BigAutoField(primary_key=True)
+    nombre = models.CharField(max_length=64, unique=True)
+    valor = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.nombre}: {self.valor}"
+
+    @staticmethod
+    def sumar(nombre, delta):
+        if not delta:
+            return
+        # Si el contador aún no existe no se crea aquí: obtener() lo calculará completo
+        Contador.objects.filter(nombre=nombre).update(valor=F("valor") + delta)
+
+    @staticmethod
+    def calcular():
+        """Una sola consulta con agregación condicional sobre auth_user."""
+        return User.objects.aggregate(**{
+            nombre: Count(relacion, distinct=True, filter=Q(is_active=True))
+            for nombre, relacion in CONTADORES_USUARIOS.values()
+        })
+
+    @staticmethod
+    def reconciliar():
+        """Recalcula los contadores; regresa {nombre: (anterior, nuevo)}."""
+        with transaction.atomic():
+            reales = Contador.calcular()
+            anteriores = dict(Contador.objects.select_for_update().filter(nombre__in=reales).values_list("nombre", "valor"))
+            for nombre, valor in reales.items():
+                Contador.objects.update_or_create(nombre=nombre, defaults={"valor": valor})
+        return {nombre: (anteriores.get(nombre), valor) for nombre, valor in reales.items()}
+
+    @staticmethod
+    def obtener():
+        """
+        {nombre: valor} leyendo la tabla de contadores (O(1)). Si falta alguno
+        (primera llamada tras migrar o borrarlos) se calculan todos con una sola
+        agregación y se crean los que faltan con un INSERT. Un alta que se
+        confirme entre ese cálculo y el INSERT no se suma; reconciliar_contadores
+        lo corrige.
+        """
+        nombres = [nombre for nombre, relacion in CONTADORES_USUARIOS.values()]
+        valores = dict(Contador.objects.filter(nombre__in=nombres).values_list("nombre", "valor"))
+        if len(valores) < len(nombres):
+            reales = Contador.calcular()
+            Contador.objects.bulk_create(
+                [Contador(nombre=nombre, valor=reales[nombre]) for nombre in nombres if nombre not in valores],
+                ignore_conflicts=True
+            )
+            valores.update({nombre: reales[nombre] for nombre in nombres if nombre not in valores})
+        return valores
+
+
+# Perfil -> (contador, relación inversa desde User)
+CONTADORES_USUARIOS = {
+    Administradores: ("admins", "administradores"),
+    Maestros: ("maestros", "maestros"),
+    Alumnos: ("alumnos", "alumnos"),
+}
+
+
+def perfil_con_usuario_activo(sender, instance):
+    if sender.user.is_cached(instance):
+        return instance.user.is_active
+    return User.objects.filter(pk=instance.user_id, is_active=True).exists()
+
+
+@receiver(post_save)
+def contar_perfil_creado(sender, instance, created, **kwargs):
+    if created and sender in CONTADORES_USUARIOS and perfil_con_usuario_activo(sender, instance):
+        Contador.sumar(CONTADORES_USUARIOS[sender][0], 1)
+
+
+@receiver(post_delete)
+def contar_perfil_eliminado(sender, instance, **kwargs):
+    if sender in CONTADORES_USUARIOS and perfil_con_usuario_activo(sender, instance):
+        Contador.sumar(CONTADORES_USUARIOS[sender][0], -1)
+
+
+@receiver(post_init, sender=User)
+def recordar_usuario_activo(sender, instance, **kwargs):
+    # Valor con el que se cargó el usuario, para detectar activaciones en post_save
+    instance._is_active_inicial = instance.__dict__.get("is_active")
+
+
+@receiver(post_save, sender=User)
+def contar_usuario_activado(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields and "is_active" not in update_fields:
+        return
+    anterior = instance._is_active_inicial
+    instance._is_active_inicial = instance.is_active
+    if created or anterior is None or anterior == instance.is_active:
+        return
+    delta = 1 if instance.is_active else -1
+    for modelo, (nombre, relacion) in CONTADORES_USUARIOS.items():
+        Contador.sumar(nombre, delta * modelo.objects.filter(user=instance).count())
+
+
+class TokenBusqueda(models.Model):
+    """
+    Índice de búsqueda de personas (/buscar/): una fila por palabra normalizada
+    (minúsculas, sin acentos) de nombre, correo e identificadores de cada perfil.
+    Se mantiene con las señales de abajo; reindexar_todo() lo reconstruye.
+    """
+    id = models.BigAutoField(primary_key=True)
+    token = models.CharField(max_length=64)
+    tipo = models.CharField(max_length=16)
+    perfil_id = models.BigIntegerField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tokens_busqueda')
+
+    class Meta:
+        indexes = [
+            # Búsqueda por prefijo (ver prefijo()); en PostgreSQL además busqueda_token_patron_idx
+            models.Index(fields=["token", "tipo"], name="busqueda_token_idx"),
+            models.Index(fields=["tipo", "perfil_id"], name="busqueda_perfil_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.token} -> {self.tipo} {self.perfil_id}"
+
+    LONGITUD_MAXIMA = 64
+
+    @staticmethod
+    def normalizar(texto):
+        texto = unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode("ascii")
+        return texto.lower().strip()
+
+    @staticmethod
+    def tokenizar(*valores):
+        """Palabras alfanuméricas de cada valor más el valor completo (correo, CURP, ...)."""
+        tokens = set()
+        for valor in valores:
+            if not valor:
+                continue
+            valor = TokenBusqueda.normalizar(valor)
+            tokens.add(valor.replace(" ", ""))
+            tokens.update(re.split(r"[^a-z0-9]+", valor))
+        tokens.discard("")
+        return {token[:TokenBusqueda.LONGITUD_MAXIMA] for token in tokens}
+
+    @staticmethod
+    def prefijo(palabra):
+        """
+        Filtro de tokens que empiezan con `palabra`. En SQLite un rango sobre el
+        índice (LIKE con ESCAPE no usa índices ahí y su collation BINARY ordena por
+        bytes). En los demás motores el rango dependería de la collation (en
+        PostgreSQL en_US ignora '@' y '.'), así que va LIKE 'palabra%', que en
+        PostgreSQL usa busqueda_token_patron_idx (varchar_pattern_ops, migración 0013).
+        """
+        if connection.vendor == "sqlite":
+            return Q(token__gte=palabra, token__lt=palabra + "\uffff")
+        return Q(token__startswith=palabra)
+
+    # Los campos cifrados (CURP, RFC) no se indexan en claro sino como "#" + huella:
+    # solo se encuentran con el valor completo
+    PREFIJO_HUELLA = "#"
+
+    @staticmethod
+    def token_huella(valor):
+        huella = CypherUtils.huella(valor)
+        return TokenBusqueda.PREFIJO_HUELLA + huella[:TokenBusqueda.LONGITUD_MAXIMA - 1] if huella else None
+
+    @staticmethod
+    def tokens_perfil(perfil):
+        tipo, campos = PERFILES_BUSQUEDA[type(perfil)]
+        user = perfil.user
+        claros = [getattr(perfil, campo) for campo in campos if not isinstance(perfil._meta.get_field(campo), CampoCifrado)]
+        tokens = TokenBusqueda.tokenizar(user.first_name, user.last_name, user.email, *claros)
+        for campo in campos:
+            if isinstance(perfil._meta.get_field(campo), CampoCifrado):
+                tokens.add(TokenBusqueda.token_huella(getattr(perfil, campo)))
+        tokens.discard(None)
+        return tokens
+
+    @staticmethod
+    def indexar(perfiles, nuevos=False):
+        """(Re)genera los tokens de una lista de perfiles del mismo tipo; nuevos=True si aún no tienen tokens."""
+        if not perfiles:
+            return
+        tipo = PERFILES_BUSQUEDA[type(perfiles[0])][0]
+        if not nuevos:
+            TokenBusqueda.objects.filter(tipo=tipo, perfil_id__in=[p.pk for p in perfiles]).delete()
+        TokenBusqueda.objects.bulk_create(
+            [TokenBusqueda(token=token, tipo=tipo, perfil_id=perfil.pk, user_id=perfil.user_id)
+             for perfil in perfiles for token in TokenBusqueda.tokens_perfil(perfil)],
+            batch_size=1000
+        )
+
+    @staticmethod
+    def reindexar_todo(chunk_size=1000):
+        # DELETE directo: .delete() cargaría cada token para mandar señales
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM " + connection.ops.quote_name(TokenBusqueda._meta.db_table))
+        for modelo in PERFILES_BUSQUEDA:
+            perfiles = modelo.objects.select_related("user").order_by("id").iterator(chunk_size=chunk_size)
+            bloque = []
+            for perfil in perfiles:
+                bloque.append(perfil)
+                if len(bloque) >= chunk_size:
+                    TokenBusqueda.indexar(bloque, nuevos=True)
+                    bloque = []
+            TokenBusqueda.indexar(bloque, nuevos=True)
+
+
+# Perfil -> (tipo, campos propios que se indexan además de nombre y correo)
+PERFILES_BUSQUEDA = {
+    Alumnos: ("alumno", ("matricula", "curp", "rfc")),
+    Maestros: ("maestro", ("id_trabajador", "rfc")),
+    Administradores: ("administrador", ("clave_admin", "rfc")),
+}
+
+
+@receiver(post_save)
+def indexar_perfil(sender, instance, created, **kwargs):
+    if sender in PERFILES_BUSQUEDA:
+        TokenBusqueda.indexar([instance], nuevos=created)
+
+
+@receiver(post_delete)
+def desindexar_perfil(sender, instance, **kwargs):
+    if sender in PERFILES_BUSQUEDA:
+        TokenBusqueda.objects.filter(tipo=PERFILES_BUSQUEDA[sender][0], perfil_id=instance.pk).delete()
+
+
+@receiver(post_init, sender=User)
+def recordar_usuario_indexado(sender, instance, **kwargs):
+    instance._datos_busqueda = TokenBusqueda.tokenizar(
+        *[instance.__dict__.get(campo) for campo in ("first_name", "last_name", "email")]
+    )
+
+
+@receiver(post_save, sender=User)
+def reindexar_usuario(sender, instance, created, **kwargs):
+    # Solo si cambió el nombre o el correo (no en cada login)
+    datos = TokenBusqueda.tokenizar(instance.first_name, instance.last_name, instance.email)
+    if created or datos == instance._datos_busqueda:
+        return
+    instance._datos_busqueda = datos
+    for modelo in PERFILES_BUSQUEDA:
+        perfiles = list(modelo.objects.filter(user=instance))
+        for perfil in perfiles:
+            perfil.user = instance
+        TokenBusqueda.indexar(perfiles)
+
+
+class Roles:
+    """
+    Mapa nombre de grupo (rol) <-> id de grupo en memoria del proceso, para no
+    consultar auth_group en cada registro o login. Los grupos casi nunca cambian;
+    las señales de abajo olvidan un grupo cuando se guarda o se borra.
+    """
+    _ids = {}
+    _nombres = {}
+
+    @staticmethod
+    def id_grupo(nombre):
+        """Id del grupo del rol; lo crea si no existe (como el get_or_create de antes)."""
+        if nombre in Roles._ids:
+            return Roles._ids[nombre]
+        group, created = Group.objects.get_or_create(name=nombre)
+        if created:
+            # Si la transacción se revierte el grupo no existirá: se recuerda hasta el commit
+            transaction.on_commit(lambda: Roles.recordar(group))
+        else:
+            Roles.recordar(group)
+        return group.pk
+
+    @staticmethod
+    def nombre(id_grupo):
+        """Nombre del rol a partir del id de grupo (None si no hay grupo)."""
+        if id_grupo is None:
+            return None
+        if id_grupo not in Roles._nombres:
+            group = Group.objects.filter(pk=id_grupo).first()
+            if group is None:
+                return None
+            Roles.recordar(group)
+        return Roles._nombres[id_grupo]
+
+    @staticmethod
+    def recordar(group):
+        Roles._ids[group.name] = group.pk
+        Roles._nombres[group.pk] = group.name
+
+    @staticmethod
+    def olvidar(group):
+        # Por id y por nombre: si se renombró, el nombre anterior solo se conoce por el id
+        Roles._ids.pop(Roles._nombres.pop(group.pk, None), None)
+        Roles._ids.pop(group.name, None)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def olvidar_rol(sender, instance, **kwargs):
+    Roles.olvidar(instance)
+
+
+@receiver(post_delete, sender=Token)
+def invalidar_token_borrado(sender, instance, **kwargs):
+    # Logout.get y el borrado en cascada de un usuario
+    TokenCache.invalidar(key=instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidar_tokens_usuario(sender, instance, created, update_fields=None, **kwargs):
+    # Cualquier cambio del usuario (desactivación, contraseña, nombre) salvo solo last_login
+    if created or (update_fields and set(update_fields) <= {"last_login"}):
+        return
+    TokenCache.invalidar(user_id=instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def invalidar_usuario_borrado(sender, instance, **kwargs):
+    TokenCache.invalidar(user_id=instance.pk)
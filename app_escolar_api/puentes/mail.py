@@ -1,43 +1,266 @@
-from django.conf import settings
-from django.http import HttpResponse, Http404
-from django.core.mail import EmailMessage
-from rest_framework import status
-from rest_framework.response import Response
-from django.core.mail import EmailMessage
-import datetime
-import os
+import atexit
+import logging
+import queue
 import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.template import engines
+
+from app_escolar_api.list_utils import ListUtils
+
+logger = logging.getLogger(__name__)
+
 
 class MailsBridge:
+    """
+    Los correos se mandan desde un grupo fijo de hilos (MAIL_WORKERS) que leen
+    de una cola acotada (MAIL_QUEUE_SIZE). Cada hilo conserva su conexión SMTP
+    entre correos, toma de la cola hasta LOTE mensajes a la vez y reintenta los
+    que fallan con espera creciente. send_mail_async encola hasta que la
+    transacción actual hace commit: si hay rollback no se manda nada.
+    """
 
-    @staticmethod 
-    def send_mail_async(subject=None,reply_email=None, from_email=None,to_email=None,cc=None,bcc=None,html_message=None):
+    # Mensajes que un hilo saca de la cola de una vez
+    LOTE = 50
+    # Segundos sin correos tras los que un hilo cierra su conexión
+    INACTIVIDAD = 30
+    # Espera antes del primer reintento; se duplica en cada uno
+    ESPERA_REINTENTO = 1.0
+    # Plantillas compiladas que se recuerdan
+    MAX_PLANTILLAS = 128
 
-        if html_message:
-            html_message = html_message.replace("á","&aacute;")
-            html_message = html_message.replace("é","&eacute;")
-            html_message = html_message.replace("í","&iacute;")
-            html_message = html_message.replace("ó","&oacute;")
-            html_message = html_message.replace("ú","&uacute;")
-            html_message = html_message.replace("Á","&Aacute;")
-            html_message = html_message.replace("É","&Eacute;")
-            html_message = html_message.replace("Í","&Iacute;")
-            html_message = html_message.replace("Ó","&Oacute;")
-            html_message = html_message.replace("Ú","&Uacute;")
+    _cola = None
+    _lock = threading.Lock()
+    _plantillas = OrderedDict()
 
-        send_thread = threading.Thread(target=MailsBridge.send_mail_sync, args=(subject, reply_email, from_email, to_email, cc, bcc, html_message))
-        send_thread.start() 
+    @staticmethod
+    def send_mail_async(subject=None,reply_email=None, from_email=None,to_email=None,cc=None,bcc=None,html_message=None):
+        msg = MailsBridge.mensaje(subject, reply_email, from_email, to_email, cc, bcc, MailsBridge.entidades(html_message))
+        transaction.on_commit(lambda: MailsBridge.encolar(msg))
 
     @staticmethod
     def send_mail_sync(subject=None,reply_email=None, from_email=None,to_email=None,cc=None,bcc=None,html_message_custom=None):
+        msg = MailsBridge.mensaje(subject, reply_email, from_email, to_email, cc, bcc, html_message_custom)
+        MailsBridge.cerrar(MailsBridge.entregar([msg]))
+
+    @staticmethod
+    def combinar(subject, html_message, destinatarios, from_email=None, reply_email=None, sincrono=False):
+        """
+        Mail merge: un correo por destinatario con las mismas plantillas.
+        subject y html_message son plantillas de Django ({{ nombre }}, ...) que se
+        compilan una sola vez; destinatarios es un iterable de dicts con "email" y
+        las variables de cada quien (puede ser un generador o un queryset.values()).
+        Se renderiza y se entrega por bloques de LOTE. Por omisión se encola al
+        hacer commit; con sincrono=True se manda aquí por una sola conexión y se
+        regresa el número de correos. Ejemplo, un aviso a todos los alumnos:
+
+            MailsBridge.combinar(
+                "Aviso para {{ nombre }}", "<p>Hola {{ nombre }}, ...</p>",
+                Alumnos.objects.filter(user__is_active=True)
+                    .values(email=F("user__email"), nombre=F("user__first_name")),
+                from_email="escolar@...")
+        """
+        if not sincrono:
+            def despues():
+                # Ya hubo commit: un error al renderizar no debe volver 500 la respuesta
+                try:
+                    MailsBridge._combinar(subject, html_message, destinatarios, from_email, reply_email, MailsBridge.encolar)
+                except Exception:
+                    logger.exception("No se pudieron preparar los correos combinados")
+            transaction.on_commit(despues)
+            return None
+
+        conexion = None
+
+        def entregar(*mensajes):
+            nonlocal conexion
+            conexion = MailsBridge.entregar(mensajes, conexion)
+
+        try:
+            return MailsBridge._combinar(subject, html_message, destinatarios, from_email, reply_email, entregar)
+        finally:
+            MailsBridge.cerrar(conexion)
+
+    @staticmethod
+    def _combinar(subject, html_message, destinatarios, from_email, reply_email, entregar):
+        asunto = MailsBridge.plantilla(subject, html=False)
+        cuerpo = MailsBridge.plantilla(html_message)
+        total = 0
+        for bloque in ListUtils.bloques(destinatarios, MailsBridge.LOTE):
+            entregar(*[
+                MailsBridge.mensaje(asunto.render(datos).strip(), reply_email, from_email, datos["email"],
+                                    html_message=MailsBridge.entidades(cuerpo.render(datos)))
+                for datos in bloque
+            ])
+            total += len(bloque)
+        return total
+
+    @staticmethod
+    def plantilla(texto, html=True):
+        """
+        Plantilla de Django compilada a partir del texto; se compila una vez por
+        texto distinto. Con html=False (asuntos) las variables no se escapan.
+        """
+        clave = (texto, html)
+        with MailsBridge._lock:
+            compilada = MailsBridge._plantillas.get(clave)
+            if compilada is not None:
+                MailsBridge._plantillas.move_to_end(clave)
+                return compilada
+        compilada = engines["django"].from_string(texto if html else "{% autoescape off %}" + texto + "{% endautoescape %}")
+        with MailsBridge._lock:
+            MailsBridge._plantillas[clave] = compilada
+            while len(MailsBridge._plantillas) > MailsBridge.MAX_PLANTILLAS:
+                MailsBridge._plantillas.popitem(last=False)
+        return compilada
 
+    @staticmethod
+    def entidades(html_message):
+        """
+        Todo lo que no es ASCII (á, ñ, ¿, ...) como entidad numérica (&#225;) en
+        una sola pasada en C; antes eran diez replace sobre el cuerpo completo.
+        """
+        if not html_message or html_message.isascii():
+            return html_message
+        return html_message.encode("ascii", "xmlcharrefreplace").decode("ascii")
+
+    @staticmethod
+    def mensaje(subject, reply_email, from_email, to_email, cc=None, bcc=None, html_message=None):
         headers = {}
-        if reply_email!="":
+        if reply_email:
             headers = {'Reply-To': reply_email}
-            
-        if cc:
-            msg = EmailMessage(subject, html_message_custom, from_email, [to_email], bcc=[bcc], headers=headers, cc=[cc])
-        else:
-            msg = EmailMessage(subject, html_message_custom, from_email, [to_email], bcc=[bcc], headers=headers)
+
+        msg = EmailMessage(subject, html_message, from_email, [to_email], bcc=[bcc] if bcc else None,
+                           headers=headers, cc=[cc] if cc else None)
         msg.content_subtype = "html"
-        res = msg.send()
\ No newline at end of file
+        return msg
+
+    # =========================
+    # Cola y grupo de hilos
+    # =========================
+    @staticmethod
+    def cola():
+        """La cola se crea (y se arrancan los hilos) con el primer correo."""
+        if MailsBridge._cola is None:
+            with MailsBridge._lock:
+                if MailsBridge._cola is None:
+                    cola = queue.Queue(maxsize=getattr(settings, "MAIL_QUEUE_SIZE", 1000))
+                    for i in range(max(1, getattr(settings, "MAIL_WORKERS", 2))):
+                        threading.Thread(target=MailsBridge._trabajar, args=(cola,), name="mail-%d" % i, daemon=True).start()
+                    # Los hilos son daemon: al salir se da un margen para vaciar la cola
+                    atexit.register(MailsBridge.esperar, getattr(settings, "MAIL_QUEUE_TIMEOUT", 5))
+                    MailsBridge._cola = cola
+        return MailsBridge._cola
+
+    @staticmethod
+    def encolar(*mensajes):
+        """
+        Pone los mensajes en la cola. Si sigue llena después de MAIL_QUEUE_TIMEOUT
+        segundos, el mensaje lo manda el hilo que encola: eso frena al productor
+        en lugar de acumular correos sin límite. Corre en on_commit, con la
+        escritura ya confirmada, así que si ese envío agota los reintentos se
+        registra (como en _trabajar) en lugar de lanzar.
+        """
+        cola = MailsBridge.cola()
+        timeout = getattr(settings, "MAIL_QUEUE_TIMEOUT", 5)
+        for msg in mensajes:
+            try:
+                cola.put(msg, timeout=timeout)
+            except queue.Full:
+                try:
+                    MailsBridge.cerrar(MailsBridge.entregar([msg]))
+                except Exception:
+                    logger.exception("No se pudo enviar un correo con la cola llena")
+
+    @staticmethod
+    def esperar(timeout=None):
+        """Bloquea hasta que se procesan todos los correos encolados. Regresa False si se agotó el tiempo."""
+        cola = MailsBridge._cola
+        if cola is None:
+            return True
+        limite = None if timeout is None else time.monotonic() + timeout
+        with cola.all_tasks_done:
+            while cola.unfinished_tasks:
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0:
+                    return False
+                cola.all_tasks_done.wait(restante)
+        return True
+
+    @staticmethod
+    def _trabajar(cola):
+        conexion = None
+        while True:
+            try:
+                msg = cola.get(timeout=MailsBridge.INACTIVIDAD) if conexion else cola.get()
+            except queue.Empty:
+                # Mejor cerrarla que esperar a que el servidor la corte
+                MailsBridge.cerrar(conexion)
+                conexion = None
+                continue
+
+            lote = [msg]
+            while len(lote) < MailsBridge.LOTE:
+                try:
+                    lote.append(cola.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                conexion = MailsBridge.entregar(lote, conexion)
+            except Exception:
+                conexion = None
+                logger.exception("No se pudieron enviar %d correos", len(lote))
+            finally:
+                for _ in lote:
+                    cola.task_done()
+
+    @staticmethod
+    def entregar(mensajes, conexion=None):
+        """
+        Manda los mensajes por una sola conexión (get_connection()), de uno en uno
+        para saber cuáles fallaron. Los fallidos se reintentan hasta MAIL_RETRIES
+        veces con otra conexión y espera creciente.
+        Regresa la conexión abierta para reutilizarla; lanza el último error si
+        algún mensaje agotó los reintentos.
+        """
+        pendientes = list(mensajes)
+        espera = MailsBridge.ESPERA_REINTENTO
+        reintentos = getattr(settings, "MAIL_RETRIES", 3)
+        for intento in range(reintentos + 1):
+            fallidos, error = [], None
+            try:
+                if conexion is None:
+                    conexion = get_connection()
+                conexion.open()
+            except Exception as e:
+                fallidos, error = pendientes, e
+            else:
+                for msg in pendientes:
+                    try:
+                        conexion.send_messages([msg])
+                    except Exception as e:
+                        fallidos.append(msg)
+                        error = e
+            if not fallidos:
+                return conexion
+
+            # La conexión pudo quedar a medias; el siguiente intento abre otra
+            MailsBridge.cerrar(conexion)
+            conexion = None
+            pendientes = fallidos
+            if intento < reintentos:
+                time.sleep(espera)
+                espera *= 2
+        raise error
+
+    @staticmethod
+    def cerrar(conexion):
+        if conexion is None:
+            return
+        try:
+            conexion.close()
+        except Exception:
+            pass
@@ -0,0 +1,93 @@
+import copy
+from contextlib import ContextDecorator
+from functools import wraps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryBudget(ContextDecorator):
+    """
+    Falla si el bloque (o la vista decorada) ejecuta más de `max_queries` consultas.
+
+    Como context manager en pruebas:
+        with QueryBudget(1, enforce=True):
+            client.get("/lista-alumnos/")
+
+    Como decorador de vistas:
+        @QueryBudget(1)
+        def get(self, request, *args, **kwargs): ...
+
+    En las vistas solo se activa con settings.QUERY_BUDGET_ENABLED (o enforce=True),
+    así en producción no agrega costo. Si la vista regresa una respuesta en
+    streaming, las consultas de las filas corren mientras se envía el cuerpo:
+    también se cuentan al consumir streaming_content, y el límite es para el total.
+    """
+
+    def __init__(self, max_queries, using=DEFAULT_DB_ALIAS, enforce=None):
+        self.max_queries = max_queries
+        self.using = using
+        self.enforce = enforce
+        self.context = None
+
+    def _recreate_cm(self):
+        # Cada llamada a la vista decorada usa su propia copia (thread-safe)
+        return copy.copy(self)
+
+    def __call__(self, func):
+        @wraps(func)
+        def inner(*args, **kwds):
+            with self._recreate_cm() as presupuesto:
+                response = func(*args, **kwds)
+            if presupuesto.context is not None and getattr(response, "streaming", False):
+                response.streaming_content = presupuesto.contar(response.streaming_content)
+            return response
+        return inner
+
+    def contar(self, contenido):
+        """Pasa el contenido en streaming sumando las consultas de cada bloque al total de la vista."""
+        consultas = list(self.context.captured_queries)
+        iterador = iter(contenido)
+        fin = object()
+        while True:
+            with CaptureQueriesContext(connections[self.using]) as context:
+                parte = next(iterador, fin)
+            consultas.extend(context.captured_queries)
+            self.revisar(consultas)
+            if parte is fin:
+                return
+            yield parte
+
+    def revisar(self, consultas):
+        if len(consultas) > self.max_queries:
+            lista = "\n".join("%d. %s" % (i, q["sql"]) for i, q in enumerate(consultas, start=1))
+            raise QueryBudgetExceeded(
+                "Se ejecutaron %d consultas (máximo %d):\n%s" % (len(consultas), self.max_queries, lista)
+            )
+
+    def activo(self):
+        if self.enforce is not None:
+            return self.enforce
+        return getattr(settings, "QUERY_BUDGET_ENABLED", False)
+
+    def __enter__(self):
+        if self.activo():
+            self.context = CaptureQueriesContext(connections[self.using])
+            self.context.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.context is None:
+            return False
+        self.context.__exit__(exc_type, exc_value, traceback)
+        if exc_type is None:
+            self.revisar(self.context.captured_queries)
+        return False
+
+    @property
+    def executed(self):
+        return len(self.context) if self.context is not None else 0
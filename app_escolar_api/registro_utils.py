@@ -0,0 +1,42 @@
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+
+from app_escolar_api.cypher_utils import CypherUtils
+from app_escolar_api.models import Alumnos, Roles
+
+
+class RegistroUtils:
+    """
+    Alta de un usuario con su perfil (POST de admin/, alumnos/ y maestros/):
+    INSERT del usuario con la contraseña ya hasheada, INSERT de la membresía al
+    grupo del rol (id tomado de Roles, sin consultar auth_group) e INSERT del
+    perfil. Las señales agregan versiones, contador e índice de búsqueda.
+    """
+
+    @staticmethod
+    def email_registrado(email):
+        return User.objects.filter(email=email).exists()
+
+    @staticmethod
+    def curp_registrada(curp, excluir=None):
+        """La CURP va cifrada: se busca por curp_huella (índice alumno_curp_huella_idx)."""
+        huella = CypherUtils.huella(curp)
+        if huella is None:
+            return False
+        return Alumnos.objects.filter(curp_huella=huella).exclude(pk=excluir).exists()
+
+    @staticmethod
+    def registrar(modelo, rol, first_name, last_name, email, password, **campos):
+        """
+        Regresa el perfil creado. Llamar dentro de transaction.atomic: si el perfil
+        viola una restricción única se lanza IntegrityError y la transacción ya no
+        sirve, así que quien llama debe hacer transaction.set_rollback(True) y
+        responder sin más consultas.
+        """
+        user = User(username=email, email=email, first_name=first_name, last_name=last_name,
+                    is_active=True, password=make_password(password))
+        user.save(force_insert=True)
+        User.groups.through.objects.create(user_id=user.pk, group_id=Roles.id_grupo(rol))
+        perfil = modelo(user=user, **campos)
+        perfil.save(force_insert=True)
+        return perfil
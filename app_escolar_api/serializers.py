@@ -1,8 +1,216 @@
+from operator import itemgetter
 from django.contrib.auth.models import User
-from rest_framework import serializers
+from django.utils.translation import gettext_lazy as _
+from rest_framework import ISO_8601, serializers
+from rest_framework.authtoken.serializers import AuthTokenSerializer
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.settings import api_settings
 from .models import *
+from .login_utils import LoginUtils
 
-class UserSerializer(serializers.ModelSerializer):
+
+class DynamicFieldsMixin:
+    """
+    Permite recortar la salida con fields=/exclude= (listas de nombres).
+    Los nombres con punto aplican al serializer anidado: "user.first_name".
+    Un nombre desconocido lanza ValueError.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop("fields", None)
+        exclude = kwargs.pop("exclude", None)
+        super().__init__(*args, **kwargs)
+        if fields:
+            DynamicFieldsMixin._recortar(self, fields, incluir=True)
+        if exclude:
+            DynamicFieldsMixin._recortar(self, exclude, incluir=False)
+
+    @staticmethod
+    def _agrupar(serializer, nombres):
+        # "user.first_name" -> {"user": {"first_name"}}; "id" -> {"id": None}
+        grupos = {}
+        for nombre in nombres:
+            raiz, _, resto = nombre.partition(".")
+            if raiz not in serializer.fields:
+                raise ValueError("Campo desconocido: " + nombre)
+            if resto:
+                if not isinstance(serializer.fields[raiz], serializers.Serializer):
+                    raise ValueError("Campo desconocido: " + nombre)
+                grupos.setdefault(raiz, set())
+                if grupos[raiz] is not None:
+                    grupos[raiz].add(resto)
+            else:
+                grupos[raiz] = None
+        return grupos
+
+    @staticmethod
+    def _recortar(serializer, nombres, incluir):
+        grupos = DynamicFieldsMixin._agrupar(serializer, nombres)
+        for nombre in list(serializer.fields):
+            if incluir and nombre not in grupos:
+                serializer.fields.pop(nombre)
+            elif nombre in grupos:
+                hijos = grupos[nombre]
+                if hijos is None:
+                    if not incluir:
+                        serializer.fields.pop(nombre)
+                else:
+                    DynamicFieldsMixin._recortar(serializer.fields[nombre], hijos, incluir)
+
+
+class RowConverter:
+    """
+    Ruta rápida de solo lectura para listas: convierte las tuplas de
+    queryset.values_list(*converter.columnas) al mismo dict que regresaría
+    serializer.to_representation(obj), sin instanciar modelos ni recorrer
+    get_attribute campo por campo.
+
+    Los convertidores se "compilan" una vez por serializer (ya recortado con
+    fields/exclude). Para los SerializerMethodField el serializer debe declarar
+    sus columnas en Meta.campos_sql y un método valores_<campo>(*valores), o
+    bien en Meta.campos_prefetch = {campo: (relación inversa, columna)} si el
+    valor es la lista de una relación 1-N (se carga con una consulta por bloque,
+    ver lote()); si falta alguno, compilar() regresa None y se usa el serializer normal.
+    """
+
+    # Campos cuyo to_representation no cambia el valor que entrega la BD
+    IDENTIDAD = (serializers.CharField, serializers.IntegerField, PrimaryKeyRelatedField)
+
+    def __init__(self):
+        self.columnas = []
+        self._indices = {}
+        self._prefetch = []
+        self._cargados = {}
+        self.convertir = None
+
+    def __call__(self, fila):
+        return self.convertir(fila)
+
+    def lote(self, filas):
+        """Convierte un bloque de filas; primero carga las relaciones 1-N del bloque."""
+        for nombre, modelo, fk, columna, i_pk in self._prefetch:
+            cargados = {}
+            ids = {fila[i_pk] for fila in filas}
+            if ids:
+                relacionados = modelo.objects.filter(**{fk + "__in": ids}).order_by(fk, *modelo._meta.ordering)
+                for pk, valor in relacionados.values_list(fk, columna):
+                    cargados.setdefault(pk, []).append(valor)
+            self._cargados[nombre] = cargados
+        return [self.convertir(fila) for fila in filas]
+
+    def indice(self, ruta):
+        """Posición de la columna `ruta` en la tupla (la agrega si no existe)."""
+        if ruta not in self._indices:
+            self._indices[ruta] = len(self.columnas)
+            self.columnas.append(ruta)
+        return self._indices[ruta]
+
+    @staticmethod
+    def compilar(serializer):
+        converter = RowConverter()
+        try:
+            converter.convertir = converter._compilar(serializer, "")
+        except ValueError:
+            return None
+        return converter
+
+    def _compilar(self, serializer, prefijo):
+        meta = getattr(serializer, "Meta", None)
+        campos_sql = getattr(meta, "campos_sql", {})
+        campos_prefetch = getattr(meta, "campos_prefetch", {})
+        pasos = []
+
+        for nombre, field in serializer.fields.items():
+            if nombre in campos_prefetch:
+                if prefijo:
+                    raise ValueError(nombre)
+                relacion, columna = campos_prefetch[nombre]
+                inversa = meta.model._meta.get_field(relacion)
+                self._prefetch.append((nombre, inversa.related_model, inversa.field.attname, columna, self.indice("pk")))
+                pasos.append((nombre, self._relacion(nombre, self.indice("pk"))))
+            elif isinstance(field, serializers.SerializerMethodField):
+                metodo = getattr(serializer, "valores_" + nombre, None)
+                if nombre not in campos_sql or metodo is None:
+                    raise ValueError(nombre)
+                pasos.append((nombre, self._metodo(metodo, [self.indice(prefijo + r) for r in campos_sql[nombre]])))
+            elif isinstance(field, serializers.Serializer):
+                # Objeto anidado (ej. "user"): None si la relación es nula
+                hijo = self._compilar(field, prefijo + field.source + "__")
+                pasos.append((nombre, self._anidado(hijo, self.indice(prefijo + field.source))))
+            elif field.source == "*" or "." in field.source:
+                raise ValueError(nombre)
+            else:
+                i = self.indice(prefijo + field.source)
+                if isinstance(field, RowConverter.IDENTIDAD):
+                    pasos.append((nombre, itemgetter(i)))
+                elif isinstance(field, serializers.DateTimeField):
+                    pasos.append((nombre, self._fecha_hora(field, i)))
+                elif isinstance(field, serializers.TimeField):
+                    pasos.append((nombre, self._hora(field, i)))
+                else:
+                    pasos.append((nombre, self._campo(field.to_representation, i)))
+
+        def convertir(fila):
+            return {nombre: paso(fila) for nombre, paso in pasos}
+        return convertir
+
+    @staticmethod
+    def _campo(to_representation, i):
+        def paso(fila):
+            valor = fila[i]
+            return None if valor is None else to_representation(valor)
+        return paso
+
+    @staticmethod
+    def _fecha_hora(field, i):
+        # Igual que DateTimeField.to_representation, pero la zona horaria se resuelve
+        # una sola vez por lista y no una vez por celda
+        if str(getattr(field, "format", api_settings.DATETIME_FORMAT)).lower() != ISO_8601:
+            return RowConverter._campo(field.to_representation, i)
+        zona = field.timezone if hasattr(field, "timezone") else field.default_timezone()
+        to_representation = field.to_representation
+
+        def paso(fila):
+            valor = fila[i]
+            if valor is None:
+                return None
+            if zona is None or valor.tzinfo is None:
+                return to_representation(valor)
+            valor = valor.astimezone(zona).isoformat()
+            if valor.endswith("+00:00"):
+                valor = valor[:-6] + "Z"
+            return valor
+        return paso
+
+    @staticmethod
+    def _hora(field, i):
+        if str(getattr(field, "format", api_settings.TIME_FORMAT)).lower() != ISO_8601:
+            return RowConverter._campo(field.to_representation, i)
+
+        def paso(fila):
+            valor = fila[i]
+            return None if valor is None else valor.isoformat()
+        return paso
+
+    @staticmethod
+    def _anidado(convertir, i):
+        def paso(fila):
+            return None if fila[i] is None else convertir(fila)
+        return paso
+
+    def _relacion(self, nombre, i_pk):
+        def paso(fila):
+            return self._cargados[nombre].get(fila[i_pk], [])
+        return paso
+
+    @staticmethod
+    def _metodo(metodo, indices):
+        def paso(fila):
+            return metodo(*[fila[i] for i in indices])
+        return paso
+
+
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     id = serializers.IntegerField(read_only=True)
     first_name = serializers.CharField(required=True)
     last_name = serializers.CharField(required=True)
@@ -12,32 +220,72 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ('id','first_name','last_name', 'email')
 
-class AdminSerializer(serializers.ModelSerializer):
+class AdminSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user=UserSerializer(read_only=True)
     class Meta:
         model = Administradores
-        fields = '__all__'
+        # Todo menos las huellas de los campos cifrados
+        exclude = ('rfc_huella',)
         
-class AlumnoSerializer(serializers.ModelSerializer):
+class AlumnoSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user=UserSerializer(read_only=True)
     class Meta:
         model = Alumnos
-        fields = "__all__"
+        exclude = ("curp_huella", "rfc_huella")
 
-class MaestroSerializer(serializers.ModelSerializer):
+class MaestroSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user=UserSerializer(read_only=True)
+    # Antes era un TextField con JSON; ahora sale de la tabla MaestroMateria
+    materias_json = serializers.SerializerMethodField()
+
     class Meta:
         model = Maestros
-        fields = '__all__'
+        # Mismo orden que cuando materias_json era columna del modelo
+        fields = ('id', 'user', 'id_trabajador', 'fecha_nacimiento', 'telefono', 'rfc', 'cubiculo',
+                  'edad', 'area_investigacion', 'materias_json', 'creation', 'update')
+        campos_prefetch = {
+            "materias_json": ("materias_rel", "nombre"),
+        }
+
+    def get_materias_json(self, obj):
+        # Usa el prefetch_related("materias_rel") de la vista si existe
+        return [materia.nombre for materia in obj.materias_rel.all()]
 
-class MateriaSerializer(serializers.ModelSerializer):
+class MateriaSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     profesor_nombre = serializers.SerializerMethodField()
 
     class Meta:
         model = Materias 
-        fields = '__all__'
+        # dias_mask es solo para filtrar; el front usa "dias"
+        exclude = ('dias_mask',)
+        # Columnas que necesita cada SerializerMethodField (para proyectar el SELECT)
+        campos_sql = {
+            "profesor_nombre": ("profesor", "profesor__user__first_name", "profesor__user__last_name"),
+        }
 
     def get_profesor_nombre(self, obj):
         if obj.profesor and obj.profesor.user:
-            return f"{obj.profesor.user.first_name} {obj.profesor.user.last_name}"
-        return "Sin asignar"
\ No newline at end of file
+            return self.valores_profesor_nombre(obj.profesor_id, obj.profesor.user.first_name, obj.profesor.user.last_name)
+        return "Sin asignar"
+
+    def valores_profesor_nombre(self, profesor, first_name, last_name):
+        # Misma regla que get_profesor_nombre, pero a partir de columnas (RowConverter)
+        if profesor is not None:
+            return f"{first_name} {last_name}"
+        return "Sin asignar"
+
+class LoginSerializer(AuthTokenSerializer):
+    """AuthTokenSerializer (mismos campos y mensajes) con la autenticación de LoginUtils."""
+
+    def validate(self, attrs):
+        username = attrs.get('username')
+        password = attrs.get('password')
+        if not (username and password):
+            return super().validate(attrs)
+
+        user = LoginUtils.autenticar(username, password)
+        if not user:
+            msg = _('Unable to log in with provided credentials.')
+            raise serializers.ValidationError(msg, code='authorization')
+        attrs['user'] = user
+        return attrs
@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -8,6 +9,9 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.environ.get("SECRET_KEY", "dev-secret-key")
 DEBUG = os.environ.get("DEBUG", "False") == "True"
 
+# Falla las vistas decoradas con QueryBudget si exceden su número de consultas (pruebas/desarrollo)
+QUERY_BUDGET_ENABLED = os.environ.get("QUERY_BUDGET_ENABLED", "False") == "True"
+
 ALLOWED_HOSTS = [
     "localhost",
     "127.0.0.1",
@@ -89,6 +93,89 @@ else:
     }
 
 
+# Cache de respuestas de las vistas GET (ver CacheUtils.cacheable).
+# LocMemCache es un LRU por proceso (MAX_ENTRIES) con TTL (TIMEOUT). Las respuestas
+# se guardan bajo las versiones de las tablas, que se leen de la BD en cada
+# petición, así que un cache por proceso nunca sirve datos viejos: solo se
+# aprovecha menos con varios workers. Un backend compartido, p. ej.:
+#   CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+#   CACHE_LOCATION=redis://10.0.0.3:6379
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.environ.get("CACHE_LOCATION", "app-escolar"),
+        "TIMEOUT": int(os.environ.get("CACHE_TIMEOUT", "300")),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.environ.get("CACHE_MAX_ENTRIES", "1000")),
+        },
+    }
+}
+RESPONSE_CACHE_ALIAS = "default"
+# Con un cache compartido (Redis, memcached, DatabaseCache) las versiones de las
+# tablas también se leen de él en lugar de la BD. Con LocMemCache no se permite
+# (manage.py check falla): cada proceso vería solo sus propias escrituras.
+VERSIONES_EN_CACHE = os.environ.get("VERSIONES_EN_CACHE", "False") == "True"
+# Segundos que dura una versión en el cache compartido; acota el daño si se pierde una publicación
+VERSIONES_CACHE_TTL = int(os.environ.get("VERSIONES_CACHE_TTL", "10"))
+# Las listas en streaming más grandes que esto no se guardan en cache
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", str(5 * 1024 * 1024)))
+
+# Procesos para hashear contraseñas en el comando importar_usuarios (ImportUtils); 0 = uno por CPU
+IMPORT_HASH_WORKERS = int(os.environ.get("IMPORT_HASH_WORKERS", "0"))
+# Filas máximas de importar/<tipo>/: en la petición se hashea en el mismo hilo (~0.25 s
+# de CPU por contraseña); los archivos más grandes van con manage.py importar_usuarios
+IMPORT_MAX_FILAS_PETICION = int(os.environ.get("IMPORT_MAX_FILAS_PETICION", "100"))
+# Hilos que verifican contraseñas en login/ (LoginUtils) y segundos máximos de espera
+# por un turno antes de responder 429; acota el CPU que se va en PBKDF2 durante un pico
+LOGIN_HASH_WORKERS = int(os.environ.get("LOGIN_HASH_WORKERS", "4"))
+LOGIN_HASH_TIMEOUT = float(os.environ.get("LOGIN_HASH_TIMEOUT", "10"))
+
+# Cache en memoria de token -> usuario para BearerTokenAuthentication (TokenCache).
+# TTL en segundos (0 = desactivado). Un logout o una desactivación se ve al
+# instante en el worker que lo hizo; en los demás solo con VERSIONES_EN_CACHE
+# (marca por token en el cache compartido), si no tardan hasta TOKEN_CACHE_TTL.
+TOKEN_CACHE_TTL = int(os.environ.get("TOKEN_CACHE_TTL", "60"))
+TOKEN_CACHE_MAX_ENTRIES = int(os.environ.get("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+
+# Contraseña de la que se deriva la llave de CypherUtils. Para rotarla se pone la
+# nueva en CRYPTO_PASSWORD y las viejas (separadas por coma) en
+# CRYPTO_PASSWORDS_ANTERIORES: se cifra con la nueva y se descifra con cualquiera.
+# En producción (App Engine, GAE_ENV) es obligatoria y sin ella la app no arranca:
+# tomar SECRET_KEY dejaría ilegibles CURP/RFC/teléfonos el día que se rote. Solo
+# en desarrollo se usa SECRET_KEY (manage.py check --deploy también lo reporta).
+CRYPTO_PASSWORD = os.environ.get("CRYPTO_PASSWORD")
+if not CRYPTO_PASSWORD:
+    if os.environ.get("GAE_ENV", "").startswith("standard"):
+        raise ImproperlyConfigured("Falta CRYPTO_PASSWORD: en producción la llave de cifrado no puede salir de SECRET_KEY.")
+    CRYPTO_PASSWORD = SECRET_KEY
+CRYPTO_PASSWORDS_ANTERIORES = [p for p in os.environ.get("CRYPTO_PASSWORDS_ANTERIORES", "").split(",") if p]
+# Llave de las huellas (HMAC) con las que se busca por CURP/RFC cifrados. Si cambia
+# hay que volver a guardar los perfiles; defínela aparte antes de rotar CRYPTO_PASSWORD.
+CRYPTO_HUELLA_KEY = os.environ.get("CRYPTO_HUELLA_KEY", CRYPTO_PASSWORD)
+
+# Servidor de correo (MailsBridge). EMAIL_TIMEOUT evita que un hilo de envío se
+# quede colgado si el servidor SMTP no responde.
+EMAIL_BACKEND = os.environ.get("EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend")
+EMAIL_HOST = os.environ.get("EMAIL_HOST", "localhost")
+EMAIL_PORT = int(os.environ.get("EMAIL_PORT", "25"))
+EMAIL_HOST_USER = os.environ.get("EMAIL_HOST_USER", "")
+EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD", "")
+EMAIL_USE_TLS = os.environ.get("EMAIL_USE_TLS", "False") == "True"
+EMAIL_TIMEOUT = int(os.environ.get("EMAIL_TIMEOUT", "10"))
+# Hilos que mandan correos, tamaño máximo de la cola, segundos que se espera un
+# lugar en la cola antes de mandar el correo desde la petición, y reintentos por correo
+MAIL_WORKERS = int(os.environ.get("MAIL_WORKERS", "2"))
+MAIL_QUEUE_SIZE = int(os.environ.get("MAIL_QUEUE_SIZE", "1000"))
+MAIL_QUEUE_TIMEOUT = float(os.environ.get("MAIL_QUEUE_TIMEOUT", "5"))
+MAIL_RETRIES = int(os.environ.get("MAIL_RETRIES", "3"))
+
+# Revisión de URLs de imágenes (DataUtils.are_urls_images): hilos y conexiones
+# por host, segundos máximos por petición y segundos que se recuerda cada resultado
+URL_CHECK_WORKERS = int(os.environ.get("URL_CHECK_WORKERS", "8"))
+URL_CHECK_TIMEOUT = float(os.environ.get("URL_CHECK_TIMEOUT", "3"))
+URL_CHECK_TTL = int(os.environ.get("URL_CHECK_TTL", "300"))
+
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -114,7 +201,17 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
 
 MEDIA_URL = "/media/"
-MEDIA_ROOT = BASE_DIR / "media"
+# Archivos subidos (MediaUtils) van a default_storage. En App Engine estándar el
+# disco es de solo lectura y no se comparte entre instancias: ahí hay que usar un
+# bucket, p. ej. DEFAULT_FILE_STORAGE=storages.backends.gcloud.GoogleCloudStorage
+# con GS_BUCKET_NAME (paquete django-storages[google]). MEDIA_ROOT solo aplica al
+# storage en disco (desarrollo o un volumen compartido).
+MEDIA_ROOT = os.environ.get("MEDIA_ROOT", str(BASE_DIR / "media"))
+if os.environ.get("DEFAULT_FILE_STORAGE"):
+    DEFAULT_FILE_STORAGE = os.environ["DEFAULT_FILE_STORAGE"]
+GS_BUCKET_NAME = os.environ.get("GS_BUCKET_NAME")
+# Tamaño máximo de un archivo subido a archivos/ (MediaUtils)
+MEDIA_MAX_UPLOAD_BYTES = int(os.environ.get("MEDIA_MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
 
 
 REST_FRAMEWORK = {
@@ -0,0 +1,944 @@
+import concurrent.futures
+import datetime
+import importlib
+import json
+import os
+import queue
+import random
+import smtplib
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import FieldError
+from django.core import mail
+from django.core.checks import run_checks
+from django.core.files.storage import InMemoryStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends import locmem
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from app_escolar_api.cypher_utils import CypherUtils
+from app_escolar_api.data_utils import DataUtils
+from app_escolar_api.horario_utils import HorarioUtils, IndiceHorario
+from app_escolar_api.import_utils import ImportUtils
+from app_escolar_api.list_utils import ListUtils
+from app_escolar_api.login_utils import LoginUtils
+from app_escolar_api.models import (
+    TABLAS_VERSIONADAS, Administradores, Alumnos, BearerTokenAuthentication, Contador, Maestros, Materias, Roles,
+    TokenBusqueda, TokenCache, VersionTabla,
+)
+from app_escolar_api.puentes.mail import MailsBridge
+from app_escolar_api.query_utils import QueryBudgetExceeded
+from app_escolar_api.serializers import AdminSerializer, AlumnoSerializer, MaestroSerializer, MateriaSerializer, RowConverter
+
+
+class ApiTestCase(TestCase):
+    """Un administrador con token (self.c ya autenticado) y tres materias con profesor."""
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create(username="admin@escuela.mx", email="admin@escuela.mx",
+                                         first_name="Ana", last_name="Admin")
+        Administradores.objects.create(user=self.admin, clave_admin="A1")
+        self.token = Token.objects.create(user=self.admin)
+        self.c = APIClient()
+        self.c.credentials(HTTP_AUTHORIZATION="Bearer " + self.token.key)
+        for i in range(3):
+            user = User.objects.create(username="maestro%d@escuela.mx" % i, email="maestro%d@escuela.mx" % i,
+                                       first_name="Maestro%d" % i, last_name="Prueba")
+            maestro = Maestros.objects.create(user=user, id_trabajador="T%d" % i)
+            Materias.objects.create(nrc="N%d" % i, nombre_materia="Materia %d" % i, dias="Lunes, Martes",
+                                    hora_inicio="10:00", hora_fin="11:00", salon="S%d" % i, profesor=maestro)
+
+
+class VersionesTests(ApiTestCase):
+
+    def test_escritura_de_otro_proceso_cambia_el_etag(self):
+        url = "/lista-materias/"
+        etag = self.c.get(url)["ETag"]
+        self.assertEqual(self.c.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Otro worker escribió: la versión cambia en la BD sin pasar por el cache de este proceso
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE app_escolar_api_versiontabla SET version = version + 1 WHERE tabla = %s", ["materias"])
+        response = self.c.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_incrementar_sin_cache_de_versiones(self):
+        VersionTabla.obtener(("materias",))
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            VersionTabla.incrementar("materias")
+        self.assertEqual(callbacks, [])
+        self.assertIsNone(cache.get(VersionTabla.clave("materias")))
+
+    @override_settings(VERSIONES_EN_CACHE=True)
+    def test_versiones_en_cache_requiere_cache_compartido(self):
+        errores = [e.id for e in run_checks()]
+        self.assertIn("app_escolar_api.E001", errores)
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.db.DatabaseCache",
+                                                   "LOCATION": "cache_pruebas"}}):
+            self.assertNotIn("app_escolar_api.E001", [e.id for e in run_checks()])
+
+    @override_settings(VERSIONES_EN_CACHE=True, VERSIONES_CACHE_TTL=60)
+    def test_versiones_en_cache_se_publican_al_confirmar(self):
+        version = VersionTabla.obtener(("materias",))["materias"][0]
+        with self.captureOnCommitCallbacks(execute=True):
+            VersionTabla.incrementar("materias")
+        self.assertEqual(cache.get(VersionTabla.clave("materias"))[0], version + 1)
+        self.assertEqual(VersionTabla.obtener(("materias",))["materias"][0], version + 1)
+
+
+    def test_reemplazar_materias_del_maestro(self):
+        maestro = Maestros.objects.first()
+        maestro.guardar_materias(["Redes", "Compiladores", "Bases de datos"])
+        VersionTabla.objects.get_or_create(tabla="maestros")
+        version = VersionTabla.obtener(("maestros",))["maestros"][0]
+        # DELETE + INSERT + versión (UPDATE), sin una sentencia por materia borrada
+        with self.assertNumQueries(3):
+            maestro.guardar_materias(["Redes"])
+        self.assertEqual(list(maestro.materias_rel.values_list("nombre", flat=True)), ["Redes"])
+        self.assertEqual(VersionTabla.obtener(("maestros",))["maestros"][0], version + 1)
+
+
+class TokenCacheTests(ApiTestCase):
+
+    def test_acierto_sin_consultas(self):
+        auth = BearerTokenAuthentication()
+        with self.assertNumQueries(1):
+            auth.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(0):
+            user, token = auth.authenticate_credentials(self.token.key)
+        self.assertEqual((user.pk, token.key), (self.admin.pk, self.token.key))
+
+    def test_cambio_de_usuario_no_vacia_a_los_demas(self):
+        otro = User.objects.create(username="otro@escuela.mx", email="otro@escuela.mx")
+        otro_token = Token.objects.create(user=otro)
+        auth = BearerTokenAuthentication()
+        auth.authenticate_credentials(self.token.key)
+        auth.authenticate_credentials(otro_token.key)
+        otro.first_name = "Otro"
+        otro.save()
+        with self.assertNumQueries(0):
+            auth.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(1):
+            auth.authenticate_credentials(otro_token.key)
+
+    @override_settings(VERSIONES_EN_CACHE=True)
+    def test_revocacion_en_otro_proceso(self):
+        self.assertEqual(self.c.get("/total-usuarios/").status_code, 200)
+        # Otro worker borra el token y deja su marca; aquí no corre ninguna señal
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM authtoken_token WHERE key = %s", [self.token.key])
+        VersionTabla.cache().set(TokenCache.clave(self.token.key), "otro-worker")
+        self.assertEqual(self.c.get("/total-usuarios/").status_code, 403)
+
+    def test_sin_cache_compartido_espera_el_ttl(self):
+        self.assertEqual(self.c.get("/total-usuarios/").status_code, 200)
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM authtoken_token WHERE key = %s", [self.token.key])
+        self.assertEqual(self.c.get("/total-usuarios/").status_code, 200)
+        with override_settings(TOKEN_CACHE_TTL=0):
+            self.assertEqual(self.c.get("/total-usuarios/").status_code, 403)
+
+
+class BusquedaTests(ApiTestCase):
+
+    def test_palabras_comunes_no_pierden_coincidencias(self):
+        # Más de 500 "juan" y más de 500 "perez": la única persona con las dos va al final
+        nombres = [("Juan", "Gomez%d" % i) for i in range(600)] + [("Ana", "Perez%d" % i) for i in range(600)]
+        nombres += [("Juanita", "Perezoso"), ("Juan", "Perez")]
+        usuarios = User.objects.bulk_create([
+            User(username="p%d@escuela.mx" % i, email="p%d@escuela.mx" % i, first_name=nombre, last_name=apellido)
+            for i, (nombre, apellido) in enumerate(nombres)
+        ])
+        Alumnos.objects.bulk_create([Alumnos(user=user, matricula="B%d" % i) for i, user in enumerate(usuarios)])
+        TokenBusqueda.reindexar_todo()
+
+        response = self.c.get("/buscar/?q=juan perez")
+        self.assertEqual(response.status_code, 200)
+        # Las dos coinciden; la exacta primero
+        self.assertEqual([(p["first_name"], p["last_name"]) for p in response.json()],
+                         [("Juan", "Perez"), ("Juanita", "Perezoso")])
+        self.assertEqual(len(self.c.get("/buscar/?q=juan&limit=100").json()), 100)
+        self.assertEqual(self.c.get("/buscar/?q=perezozo juan").json()[0]["last_name"], "Perezoso")
+
+
+class RegistroTests(ApiTestCase):
+    """Sentencias de cada alta con el grupo del rol ya leído (estado estable de un worker)."""
+
+    def setUp(self):
+        super().setUp()
+        for rol in ("administrador", "maestro", "alumno"):
+            Roles.id_grupo(rol)
+        for tabla in set(TABLAS_VERSIONADAS.values()):
+            VersionTabla.objects.get_or_create(tabla=tabla)
+        # Primera autenticación: el token queda en el cache del proceso
+        self.assertEqual(self.c.get("/total-usuarios/").status_code, 200)
+
+    def registrar(self, ruta, datos, sentencias):
+        # Además de las del alta: el SAVEPOINT/RELEASE del atomic en pruebas
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(sentencias):
+            response = self.c.post(ruta, datos, format="json")
+        self.assertEqual(response.status_code, 201, response.content)
+        return response
+
+    def test_alta_de_alumno(self):
+        self.registrar("/alumnos/", {
+            "rol": "alumno", "first_name": "Luis", "last_name": "Lopez", "email": "luis@escuela.mx",
+            "password": "secreta", "matricula": "202500001", "curp": "lolu000101hpllpsa1", "rfc": "lolu000101",
+            "fecha_nacimiento": "2000-01-01T00:00:00Z", "edad": 25, "telefono": "2220000000",
+            "ocupacion": "Estudiante",
+        }, 9 + 2)
+
+    def test_alta_de_maestro(self):
+        self.registrar("/maestros/", {
+            "rol": "maestro", "first_name": "Rosa", "last_name": "Ruiz", "email": "rosa@escuela.mx",
+            "password": "secreta", "id_trabajador": "T100", "fecha_nacimiento": "1980-01-01T00:00:00Z",
+            "telefono": "2220000000", "rfc": "ruro800101", "cubiculo": "C1", "area_investigacion": "Redes",
+            "materias_json": ["Redes", "Sistemas Operativos"],
+        }, 9 + 2)
+
+    def test_alta_de_administrador(self):
+        self.registrar("/admin/", {
+            "rol": "administrador", "first_name": "Eva", "last_name": "Soto", "email": "eva@escuela.mx",
+            "password": "secreta", "clave_admin": "A2", "telefono": "2220000000", "rfc": "soev900101",
+            "edad": 35, "ocupacion": "Coordinación",
+        }, 8 + 2)
+
+
+class RowConverterTests(ApiTestCase):
+    """La ruta rápida de las listas (values_list + RowConverter) da los mismos bytes que el serializer de DRF."""
+
+    def setUp(self):
+        super().setUp()
+        momento = datetime.datetime(2024, 3, 5, 18, 30, 15, 123456, tzinfo=datetime.timezone.utc)
+        Administradores.objects.filter(user=self.admin).update(telefono="2220000000", update=momento)
+        user = User.objects.create(username="luis@escuela.mx", email="luis@escuela.mx", first_name="Luis", last_name="López")
+        Alumnos.objects.create(user=user, matricula="A1", curp="LOLU000101HPLLPSA1", fecha_nacimiento=momento, edad=20)
+        Maestros.objects.first().guardar_materias(["Redes", "Compiladores"])
+        # Sin profesor ni horario: profesor_nombre = "Sin asignar"
+        Materias.objects.create(nrc="N9", nombre_materia="Libre", dias="")
+
+    def comparar(self, modelo, serializer_class, **recorte):
+        queryset = modelo.objects.order_by("id")
+        serializer = serializer_class(**recorte)
+        self.assertIsNotNone(RowConverter.compilar(serializer))
+        rapida = b"".join(ListUtils.iter_json(queryset, serializer))
+        drf = JSONRenderer().render(serializer_class(queryset, many=True, **recorte).data)
+        self.assertEqual(rapida, drf)
+        return json.loads(rapida)
+
+    def test_administradores(self):
+        filas = self.comparar(Administradores, AdminSerializer)
+        self.assertEqual(filas[0]["update"], "2024-03-05T18:30:15.123456Z")
+        self.assertEqual(filas[0]["user"]["email"], "admin@escuela.mx")
+
+    def test_alumnos(self):
+        filas = self.comparar(Alumnos, AlumnoSerializer)
+        self.assertEqual((filas[0]["curp"], filas[0]["user"]["last_name"]), ("LOLU000101HPLLPSA1", "López"))
+        self.comparar(Alumnos, AlumnoSerializer, exclude=["user", "curp"])
+
+    def test_maestros(self):
+        filas = self.comparar(Maestros, MaestroSerializer)
+        self.assertEqual(filas[0]["materias_json"], ["Redes", "Compiladores"])
+        self.comparar(Maestros, MaestroSerializer, fields=["id", "materias_json"])
+
+    def test_materias(self):
+        filas = self.comparar(Materias, MateriaSerializer)
+        self.assertEqual([fila["profesor_nombre"] for fila in filas],
+                         ["Maestro0 Prueba", "Maestro1 Prueba", "Maestro2 Prueba", "Sin asignar"])
+        self.assertEqual(filas[0]["hora_inicio"], "10:00:00")
+
+
+class LoginTests(TestCase):
+
+    def setUp(self):
+        self.c = APIClient()
+        self.usuarios = {}
+        for rol in ("administrador", "maestro", "alumno"):
+            user = User.objects.create_user(username=rol + "@escuela.mx", email=rol + "@escuela.mx",
+                                            password="secreta", first_name=rol.title(), last_name="Prueba")
+            user.groups.add(Roles.id_grupo(rol))
+            self.usuarios[rol] = user
+        Maestros.objects.create(user=self.usuarios["maestro"], id_trabajador="T1").guardar_materias(["Redes"], nuevo=True)
+        Alumnos.objects.create(user=self.usuarios["alumno"], matricula="A1")
+
+    def login(self, username, password="secreta"):
+        return self.c.post("/login/", {"username": username, "password": password}, format="json")
+
+    def test_cada_rol(self):
+        for rol, user in self.usuarios.items():
+            response = self.login(user.username)
+            self.assertEqual(response.status_code, 200, response.content)
+            cuerpo = response.json()
+            self.assertEqual(cuerpo["rol"], rol)
+            # El primer login crea el token; los siguientes regresan el mismo
+            self.assertEqual(cuerpo["token"], Token.objects.get(user=user).key)
+            self.assertEqual(self.login(user.username).json()["token"], cuerpo["token"])
+        self.assertEqual(self.login("maestro@escuela.mx").json()["materias_json"], '["Redes"]')
+        self.assertEqual(self.login("alumno@escuela.mx").json()["matricula"], "A1")
+
+    def test_credenciales_invalidas(self):
+        self.usuarios["alumno"].is_active = False
+        self.usuarios["alumno"].save()
+        for username, password in (("maestro@escuela.mx", "otra"), ("alumno@escuela.mx", "secreta"),
+                                   ("nadie@escuela.mx", "secreta")):
+            response = self.login(username, password)
+            self.assertEqual(response.status_code, 400, username)
+            self.assertIn("non_field_errors", response.json())
+        self.assertFalse(Token.objects.exists())
+
+    def test_sin_turno_para_el_hash(self):
+        futuro = mock.Mock()
+        futuro.result.side_effect = concurrent.futures.TimeoutError
+        with mock.patch.object(LoginUtils, "pool") as pool:
+            pool.return_value.submit.return_value = futuro
+            response = self.login("administrador@escuela.mx")
+        self.assertEqual(response.status_code, 429)
+        futuro.cancel.assert_called_once()
+
+
+class ServidorImagenes(BaseHTTPRequestHandler):
+    """/foto.png responde HEAD; /sin-head.jpg solo GET (405 al HEAD); /lenta.png tarda; /pagina es HTML."""
+    peticiones = Counter()
+
+    def responder(self, cuerpo):
+        ServidorImagenes.peticiones[self.command, self.path] += 1
+        if self.path == "/lenta.png":
+            time.sleep(1)
+        if self.path == "/sin-head.jpg" and self.command == "HEAD":
+            self.send_response(405)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        tipo = {"/foto.png": "image/png", "/sin-head.jpg": "image/jpeg; charset=binary",
+                "/lenta.png": "image/png"}.get(self.path, "text/html")
+        self.send_response(200)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", "4")
+        self.end_headers()
+        if cuerpo:
+            self.wfile.write(b"0000")
+
+    def do_HEAD(self):
+        self.responder(False)
+
+    def do_GET(self):
+        self.responder(True)
+
+    def log_message(self, *args):
+        pass
+
+
+class DataUtilsTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servidor = ThreadingHTTPServer(("127.0.0.1", 0), ServidorImagenes)
+        cls.servidor.daemon_threads = True
+        threading.Thread(target=cls.servidor.serve_forever, daemon=True).start()
+        cls.base = "http://127.0.0.1:%d" % cls.servidor.server_port
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        DataUtils._tipos.clear()
+        ServidorImagenes.peticiones.clear()
+
+    def test_get_cuando_no_aceptan_head(self):
+        self.assertEqual(DataUtils.content_type(self.base + "/sin-head.jpg"), "image/jpeg")
+        self.assertEqual(ServidorImagenes.peticiones["HEAD", "/sin-head.jpg"], 1)
+        self.assertEqual(ServidorImagenes.peticiones["GET", "/sin-head.jpg"], 1)
+
+    @override_settings(URL_CHECK_TIMEOUT=0.2)
+    def test_timeout(self):
+        inicio = time.monotonic()
+        self.assertFalse(DataUtils.is_url_image(self.base + "/lenta.png"))
+        self.assertLess(time.monotonic() - inicio, 0.9)
+        # El error también se recuerda (TTL_ERROR)
+        self.assertFalse(DataUtils.is_url_image(self.base + "/lenta.png"))
+        self.assertEqual(ServidorImagenes.peticiones["HEAD", "/lenta.png"], 1)
+
+    def test_cache_y_expiracion(self):
+        url = self.base + "/foto.png"
+        self.assertTrue(DataUtils.is_url_image(url))
+        self.assertTrue(DataUtils.is_url_image(url))
+        self.assertEqual(ServidorImagenes.peticiones["HEAD", "/foto.png"], 1)
+        with override_settings(URL_CHECK_TTL=0):
+            DataUtils._tipos.clear()
+            DataUtils.content_type(url)
+            DataUtils.content_type(url)
+        self.assertEqual(ServidorImagenes.peticiones["HEAD", "/foto.png"], 3)
+
+    def test_urls_que_no_son_http(self):
+        self.assertIsNone(DataUtils.content_type("ftp://127.0.0.1/foto.png"))
+        self.assertFalse(DataUtils.is_url_image("/media/foto.png"))
+        self.assertEqual(DataUtils.are_urls_images(["data:image/png;base64,AAAA", "foto.png"]),
+                         {"data:image/png;base64,AAAA": False, "foto.png": False})
+        self.assertEqual(sum(ServidorImagenes.peticiones.values()), 0)
+
+    def test_varias_urls_solo_revisan_las_que_no_estan_en_cache(self):
+        foto, pagina, sin_head = self.base + "/foto.png", self.base + "/pagina", self.base + "/sin-head.jpg"
+        self.assertTrue(DataUtils.is_url_image(foto))
+        self.assertEqual(DataUtils.are_urls_images([foto, pagina, sin_head, foto]),
+                         {foto: True, pagina: False, sin_head: True})
+        self.assertEqual(ServidorImagenes.peticiones["HEAD", "/foto.png"], 1)
+        self.assertEqual(ServidorImagenes.peticiones["HEAD", "/pagina"], 1)
+        # Todas en cache: no se usa el pool
+        with mock.patch.object(DataUtils, "pool") as pool:
+            self.assertEqual(DataUtils.are_urls_images([foto, pagina], formatos=("text/html",)),
+                             {foto: False, pagina: True})
+        pool.assert_not_called()
+        self.assertEqual(ServidorImagenes.peticiones["HEAD", "/pagina"], 1)
+
+
+@override_settings(QUERY_BUDGET_ENABLED=True)
+class ConsultasListasTests(ApiTestCase):
+    """
+    Consultas de cada lista y detalle con el cuerpo ya consumido: en las listas
+    en streaming las filas se leen al enviar, después de que regresa la vista.
+    """
+
+    def setUp(self):
+        super().setUp()
+        for i in range(3):
+            user = User.objects.create(username="alumno%d@escuela.mx" % i, email="alumno%d@escuela.mx" % i,
+                                       first_name="Alumno%d" % i, last_name="Prueba")
+            Alumnos.objects.create(user=user, matricula="M%d" % i)
+        self.maestro = Maestros.objects.first()
+        self.maestro.guardar_materias(["Redes"])
+        self.alumno = Alumnos.objects.first()
+        self.assertEqual(self.c.get("/total-usuarios/").status_code, 200)
+
+    def bajar(self, url, consultas):
+        with self.assertNumQueries(consultas):
+            response = self.c.get(url)
+            contenido = b"".join(response.streaming_content) if response.streaming else response.content
+        self.assertEqual(response.status_code, 200, contenido)
+        return response
+
+    def test_listas_en_streaming(self):
+        for url, consultas in (("/lista-admins/", 2), ("/lista-alumnos/", 2), ("/lista-maestros/", 3),
+                               ("/lista-materias/", 2), ("/materias/", 2)):
+            with self.subTest(url=url):
+                self.assertTrue(self.bajar(url, consultas).streaming)
+
+    def test_listas_paginadas(self):
+        for url, consultas in (("/lista-admins/?limit=2", 2), ("/lista-alumnos/?limit=2", 2),
+                               ("/lista-maestros/?limit=2", 3), ("/lista-materias/?limit=2", 2)):
+            with self.subTest(url=url):
+                self.bajar(url, consultas)
+
+    def test_detalles(self):
+        materia = Materias.objects.first()
+        for url, consultas in (("/admin/?id=%d" % Administradores.objects.get().pk, 2),
+                               ("/alumnos/?id=%d" % self.alumno.pk, 2),
+                               ("/maestros/?id=%d" % self.maestro.pk, 3),
+                               ("/materias/%d/" % materia.pk, 2),
+                               ("/maestros/por-materia/?materia=Redes", 3),
+                               ("/materias/conflictos/", 2),
+                               ("/horario/profesor/%d/" % self.maestro.pk, 3),
+                               ("/horario/salon/S0/", 2),
+                               ("/horario/programa/ICC/", 2)):
+            with self.subTest(url=url):
+                self.bajar(url, consultas)
+
+    def test_el_presupuesto_cuenta_el_streaming(self):
+        # Bloques de una fila: las materias de cada maestro se leen en su propia consulta
+        with mock.patch.object(ListUtils, "CHUNK_SIZE", 1):
+            response = self.c.get("/lista-maestros/")
+            self.assertEqual(response.status_code, 200)
+            with self.assertRaises(QueryBudgetExceeded):
+                b"".join(response.streaming_content)
+
+
+class ArchivosTests(ApiTestCase):
+    """Subida y descarga por default_storage: en disco (MEDIA_ROOT) y en un storage sin disco."""
+
+    PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 40
+
+    def setUp(self):
+        super().setUp()
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=carpeta.name))
+        self.carpeta = carpeta.name
+
+    def subir_y_bajar(self):
+        subido = self.c.post("/archivos/?nombre=logo.txt", self.PNG, content_type="application/octet-stream")
+        self.assertEqual(subido.status_code, 201, subido.content)
+        datos = subido.json()
+        self.assertEqual((datos["content_type"], datos["tamano"]), ("image/png", len(self.PNG)))
+        self.assertTrue(datos["nombre"].endswith(".png"))
+
+        response = self.c.get("/archivos/" + datos["nombre"])
+        self.assertEqual(b"".join(response.streaming_content), self.PNG)
+        response = self.c.get("/archivos/" + datos["nombre"], HTTP_RANGE="bytes=8-15")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), self.PNG[8:16])
+        return datos
+
+    def test_en_disco(self):
+        datos = self.subir_y_bajar()
+        self.assertTrue(os.path.exists(os.path.join(self.carpeta, "archivos", datos["nombre"])))
+        multipart = self.c.post("/archivos/", {"archivo": SimpleUploadedFile("foto.png", self.PNG)}, format="multipart")
+        self.assertEqual(multipart.json()["tamano"], len(self.PNG))
+
+    def test_storage_sin_disco(self):
+        with mock.patch("app_escolar_api.media_utils.default_storage", InMemoryStorage()):
+            self.subir_y_bajar()
+        self.assertFalse(os.path.exists(os.path.join(self.carpeta, "archivos")))
+
+    @override_settings(MEDIA_MAX_UPLOAD_BYTES=1000)
+    def test_demasiado_grande_no_deja_nada(self):
+        response = self.c.post("/archivos/", self.PNG, content_type="application/octet-stream")
+        self.assertEqual(response.status_code, 413)
+        multipart = self.c.post("/archivos/", {"archivo": SimpleUploadedFile("foto.png", self.PNG)}, format="multipart")
+        self.assertEqual(multipart.status_code, 413)
+        self.assertFalse(os.path.exists(os.path.join(self.carpeta, "archivos")))
+
+    def test_nombres_fuera_de_la_carpeta(self):
+        for nombre in ("../settings.py", "..%2Fsettings.py", "a/../../x", "%5C..%5Cx"):
+            with self.subTest(nombre=nombre):
+                self.assertEqual(self.c.get("/archivos/" + nombre).status_code, 404)
+
+    @mock.patch.dict(os.environ, {"GAE_ENV": "standard"})
+    def test_app_engine_requiere_bucket(self):
+        self.assertIn("app_escolar_api.E002", [e.id for e in run_checks()])
+
+
+class ImportarTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin.groups.add(Roles.id_grupo("administrador"))
+
+    def csv(self, filas):
+        lineas = ["first_name,last_name,email,password,matricula"]
+        lineas += ["A%d,B,a%d@escuela.mx,p,I%d" % (i, i, i) for i in range(filas)]
+        return "\n".join(lineas).encode()
+
+    @override_settings(IMPORT_MAX_FILAS_PETICION=3)
+    def test_la_peticion_no_levanta_procesos_ni_pasa_del_maximo(self):
+        with mock.patch("app_escolar_api.import_utils.ProcessPoolExecutor") as pool, \
+                mock.patch.object(ImportUtils, "MINIMO_PARALELO", 1):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.c.post("/importar/alumnos/", self.csv(3), content_type="text/csv")
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()["creados"], 3)
+        pool.assert_not_called()
+
+        response = self.c.post("/importar/alumnos/", self.csv(4), content_type="text/csv")
+        self.assertEqual(response.status_code, 413)
+        self.assertIn("importar_usuarios", response.json()["details"])
+        self.assertFalse(Alumnos.objects.filter(matricula="I3").exists())
+
+
+class CorreoTests(TestCase):
+    """MailsBridge con el backend locmem que usan las pruebas (mail.outbox)."""
+
+    def enviar(self, asunto):
+        MailsBridge.send_mail_async(asunto, from_email="escolar@escuela.mx", to_email="ana@escuela.mx",
+                                    html_message="<p>Inscripción</p>")
+
+    def test_se_encola_al_confirmar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.enviar("Bienvenida")
+            self.assertEqual(mail.outbox, [])
+        self.assertTrue(MailsBridge.esperar(5))
+        self.assertEqual([m.subject for m in mail.outbox], ["Bienvenida"])
+        self.assertIn("Inscripci&#243;n", mail.outbox[0].body)
+
+    def test_rollback_no_manda_nada(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(ValueError), transaction.atomic():
+                self.enviar("Bienvenida")
+                raise ValueError
+        self.assertEqual(callbacks, [])
+        self.assertTrue(MailsBridge.esperar(5))
+        self.assertEqual(mail.outbox, [])
+
+    @override_settings(MAIL_RETRIES=2)
+    @mock.patch.object(MailsBridge, "ESPERA_REINTENTO", 0)
+    def test_reintenta_los_que_fallan(self):
+        original = locmem.EmailBackend.send_messages
+        fallas = []
+
+        def inestable(backend, mensajes):
+            if not fallas:
+                fallas.append(mensajes)
+                raise smtplib.SMTPServerDisconnected("Conexión cerrada")
+            return original(backend, mensajes)
+
+        with mock.patch.object(locmem.EmailBackend, "send_messages", inestable):
+            MailsBridge.send_mail_sync("Aviso", to_email="ana@escuela.mx", html_message_custom="<p>Hola</p>")
+        self.assertEqual(len(fallas), 1)
+        self.assertEqual([m.subject for m in mail.outbox], ["Aviso"])
+
+    @override_settings(MAIL_RETRIES=0, MAIL_QUEUE_TIMEOUT=0)
+    def test_cola_llena_y_servidor_caido_no_lanza(self):
+        llena = queue.Queue(maxsize=1)
+        llena.put(None)
+        with mock.patch.object(MailsBridge, "_cola", llena), \
+                mock.patch.object(locmem.EmailBackend, "send_messages", side_effect=smtplib.SMTPException("caído")), \
+                self.assertLogs("app_escolar_api.puentes.mail", "ERROR"):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.enviar("Bienvenida")
+        self.assertEqual(mail.outbox, [])
+
+
+class LoteMateriasTests(ApiTestCase):
+
+    def lote(self, modo):
+        # El 1 repite el NRC de N0. L3 ocupa el lunes de S1 mientras N1 (índice 3) aún
+        # no se revisa, así que el que choca es el cambio de N1: se revisan en orden
+        return {"modo": modo, "eliminar": [Materias.objects.get(nrc="N2").pk], "materias": [
+            {"nrc": "L1", "nombre": "Uno", "dias": ["Lunes"], "hora_inicio": "10:00", "hora_fin": "11:00", "salon": "S2"},
+            {"nrc": "N0", "nombre": "Dos"},
+            {"nrc": "L3", "nombre": "Tres", "dias": ["Lunes"], "hora_inicio": "10:30", "hora_fin": "11:30", "salon": "S1"},
+            {"id": Materias.objects.get(nrc="N1").pk, "nombre": "Uno cambiada"},
+        ]}
+
+    def test_todo_o_nada(self):
+        response = self.c.post("/materias/lote/", self.lote("todo_o_nada"), format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([(e["indice"], list(e["errores"])) for e in response.json()["errores"]], [(1, ["nrc"]), (3, ["horario"])])
+        self.assertEqual(sorted(Materias.objects.values_list("nrc", flat=True)), ["N0", "N1", "N2"])
+
+    def test_parcial(self):
+        VersionTabla.objects.get_or_create(tabla="materias")
+        version = VersionTabla.obtener(("materias",))["materias"][0]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.c.post("/materias/lote/", self.lote("parcial"), format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        cuerpo = response.json()
+        self.assertEqual(len(cuerpo["creadas"]), 2)
+        self.assertEqual(cuerpo["actualizadas"], [])
+        self.assertEqual([e["indice"] for e in cuerpo["errores"]], [1, 3])
+        # L1 ocupa el salón de N2, que se elimina en el mismo lote
+        self.assertEqual(sorted(Materias.objects.values_list("nrc", flat=True)), ["L1", "L3", "N0", "N1"])
+        self.assertEqual(Materias.objects.get(nrc="N1").nombre_materia, "Materia 1")
+        # La baja y las dos altas suben la versión una sola vez
+        self.assertEqual(VersionTabla.obtener(("materias",))["materias"][0], version + 1)
+
+    def test_nrc_registrado_por_otra_peticion(self):
+        indice = HorarioUtils.indice
+
+        def concurrente(*args, **kwargs):
+            # Otra petición guarda el NRC después de la revisión y antes del INSERT del lote
+            Materias.objects.create(nrc="L2", nombre_materia="Otra")
+            return indice(*args, **kwargs)
+
+        lote = [{"nrc": "L1", "nombre": "Uno"}, {"nrc": "L2", "nombre": "Dos"}]
+        with mock.patch.object(HorarioUtils, "indice", concurrente):
+            response = self.c.post("/materias/lote/", {"materias": lote, "eliminar": [Materias.objects.get(nrc="N0").pk]},
+                                   format="json")
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(response.json()["errores"][-1]["lote"], True)
+        self.assertFalse(Materias.objects.filter(nrc="L1").exists())
+        self.assertTrue(Materias.objects.filter(nrc="N0").exists())
+
+
+class CifradoTests(SimpleTestCase):
+
+    def test_la_migracion_0011_cifra_como_cypher_utils(self):
+        migracion = importlib.import_module("app_escolar_api.migrations.0011_cifrado_datos_personales")
+        cifrado = CypherUtils.encripta("LOLU000101HPLLPSA1")
+        self.assertEqual(migracion.fernet().decrypt(cifrado.encode()).decode(), "LOLU000101HPLLPSA1")
+        self.assertEqual(CypherUtils.desencripta(migracion.fernet().encrypt(b"RFC").decode()), "RFC")
+        self.assertEqual(migracion.huella(" lolu000101 "), CypherUtils.huella("LOLU000101"))
+
+    def test_produccion_exige_crypto_password(self):
+        entorno = {k: v for k, v in os.environ.items() if k != "CRYPTO_PASSWORD"}
+        entorno["GAE_ENV"] = "standard"
+        resultado = subprocess.run([sys.executable, "-c", "import app_escolar_api.settings"],
+                                   env=entorno, capture_output=True, text=True)
+        self.assertNotEqual(resultado.returncode, 0)
+        self.assertIn("CRYPTO_PASSWORD", resultado.stderr)
+        entorno["CRYPTO_PASSWORD"] = "otra-llave"
+        resultado = subprocess.run([sys.executable, "-c", "import app_escolar_api.settings"], env=entorno)
+        self.assertEqual(resultado.returncode, 0)
+
+
+class CamposCifradosTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin.groups.add(Roles.id_grupo("administrador"))
+        user = User.objects.create(username="luis@escuela.mx", email="luis@escuela.mx")
+        self.alumno = Alumnos.objects.create(user=user, matricula="C1", curp="LOLU000101HPLLPSA1", telefono="2221234567")
+
+    def test_ida_y_vuelta(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT curp, telefono FROM app_escolar_api_alumnos WHERE id = %s", [self.alumno.pk])
+            curp, telefono = cursor.fetchone()
+        # En la BD solo está el token Fernet; el modelo regresa el texto plano
+        self.assertNotIn("LOLU", curp)
+        self.assertEqual(CypherUtils.desencripta(telefono), "2221234567")
+        alumno = Alumnos.objects.get(pk=self.alumno.pk)
+        self.assertEqual((alumno.curp, alumno.telefono), ("LOLU000101HPLLPSA1", "2221234567"))
+        self.assertTrue(Alumnos.objects.filter(pk=self.alumno.pk, rfc__isnull=True).exists())
+
+    def test_no_se_filtra_por_el_campo_cifrado(self):
+        with self.assertRaises(FieldError):
+            Alumnos.objects.filter(curp="LOLU000101HPLLPSA1").exists()
+
+    def test_busqueda_por_huella(self):
+        encontrados = Alumnos.objects.filter(curp_huella=CypherUtils.huella(" lolu000101hpllpsa1 "))
+        self.assertEqual(list(encontrados), [self.alumno])
+
+    def test_curp_repetida(self):
+        datos = {
+            "rol": "alumno", "first_name": "Otro", "last_name": "Lopez", "email": "otro@escuela.mx",
+            "password": "secreta", "matricula": "C2", "curp": "lolu000101hpllpsa1", "rfc": "",
+            "fecha_nacimiento": None, "edad": None, "telefono": "", "ocupacion": "",
+        }
+        response = self.c.post("/alumnos/", datos, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("LOLU000101HPLLPSA1", response.json()["message"])
+        # Al actualizar, su propia CURP no cuenta como repetida
+        datos.update(id=self.alumno.pk, matricula="C1", first_name="Luis")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.c.put("/alumnos/", datos, format="json").status_code, 200)
+
+        archivo = ("first_name,last_name,email,password,matricula,curp\n"
+                   "A,B,a1@escuela.mx,p,I1,LOLU000101HPLLPSA1\n"
+                   "A,B,a2@escuela.mx,p,I2,XEXX010101HNEXXXA4\n"
+                   "A,B,a3@escuela.mx,p,I3,xexx010101hnexxxa4\n")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.c.post("/importar/alumnos/", archivo.encode(), content_type="text/csv")
+        self.assertEqual(response.json()["creados"], 1, response.content)
+        errores = {error["fila"]: error["errores"] for error in response.json()["errores"]}
+        self.assertEqual(errores, {1: {"curp": ["LOLU000101HPLLPSA1 ya está registrado."]},
+                                   3: {"curp": ["Valor repetido en la fila 2."]}})
+
+
+class ContadorTests(ApiTestCase):
+
+    def test_obtener_crea_los_que_faltan(self):
+        Alumnos.objects.create(user=User.objects.create(username="a@escuela.mx", email="a@escuela.mx"), matricula="C1")
+        Contador.objects.all().delete()
+        # Lectura, una agregación sobre auth_user y un INSERT de los que faltan
+        with self.assertNumQueries(3):
+            self.assertEqual(Contador.obtener(), {"admins": 1, "maestros": 3, "alumnos": 1})
+        with self.assertNumQueries(1):
+            self.assertEqual(Contador.obtener(), {"admins": 1, "maestros": 3, "alumnos": 1})
+        Contador.objects.filter(nombre="maestros").delete()
+        with self.assertNumQueries(3):
+            self.assertEqual(Contador.obtener()["maestros"], 3)
+
+
+class IndiceHorarioTests(SimpleTestCase):
+
+    @staticmethod
+    def fila(materia_id, inicio, fin, salon="S1", dias="Lunes"):
+        return {"id": materia_id, "nrc": "N%d" % materia_id, "salon": salon, "profesor_id": None, "dias": dias,
+                "hora_inicio": datetime.time(*inicio), "hora_fin": datetime.time(*fin)}
+
+    def nrcs(self, indice, fila):
+        return sorted(choque["nrc"] for choque in indice.choques(fila))
+
+    def test_clases_seguidas_no_chocan(self):
+        indice = IndiceHorario([self.fila(1, (9,), (10,)), self.fila(2, (11,), (12,))])
+        self.assertEqual(self.nrcs(indice, {**self.fila(3, (10,), (11,))}), [])
+        self.assertEqual(self.nrcs(indice, {**self.fila(3, (9, 59), (11, 1))}), ["N1", "N2"])
+
+    def test_choques_que_ya_estaban_en_el_catalogo(self):
+        # N1 y N2 ya chocaban entre sí; una nueva que pisa a las dos las reporta a ambas
+        indice = IndiceHorario([self.fila(1, (8,), (10,)), self.fila(2, (9,), (11,)), self.fila(3, (12,), (13,))])
+        self.assertEqual(self.nrcs(indice, self.fila(4, (9, 30), (12,))), ["N1", "N2"])
+        # Al revisar una que ya estaba se excluye a sí misma
+        self.assertEqual(self.nrcs(indice, self.fila(1, (8,), (10,))), ["N2"])
+
+    def test_clase_larga_temprano(self):
+        filas = [self.fila(0, (7,), (22,))] + [self.fila(i, (8 + i // 4, (i % 4) * 15), (8 + i // 4, (i % 4) * 15 + 10))
+                                               for i in range(1, 40)]
+        indice = IndiceHorario(filas)
+        self.assertEqual(self.nrcs(indice, self.fila(99, (17, 55), (18,))), ["N0"])
+        self.assertEqual(self.nrcs(indice, self.fila(99, (21,), (23,))), ["N0"])
+
+    def test_la_consulta_no_recorre_el_grupo(self):
+        comparaciones = Counter()
+
+        class Minuto(int):
+            # Cuenta cuántas veces se compara una hora de fin
+            def __le__(self, otro):
+                comparaciones["fin"] += 1
+                return int(self) <= otro
+
+            def __gt__(self, otro):
+                comparaciones["fin"] += 1
+                return int(self) > otro
+
+        filas = [{"id": 0, "nrc": "N0", "salon": "S1", "dias": "Lunes", "hora_inicio": 0, "hora_fin": Minuto(10000)}]
+        filas += [{"id": i, "nrc": "N%d" % i, "salon": "S1", "dias": "Lunes", "hora_inicio": 2 * i, "hora_fin": Minuto(2 * i + 1)}
+                  for i in range(1, 4000)]
+        indice = IndiceHorario(filas)
+        comparaciones.clear()
+        with mock.patch.object(HorarioUtils, "choque", lambda clave, otro, desde, hasta: {"nrc": otro[3]}):
+            nrcs = self.nrcs(indice, {"id": None, "salon": "S1", "dias": "Lunes", "hora_inicio": 7001, "hora_fin": 7002})
+        # Solo choca con la clase larga: N3500 (7000-7001) termina justo cuando empieza. Árbol de 12 niveles
+        self.assertEqual(nrcs, ["N0"])
+        self.assertLess(comparaciones["fin"], 100)
+
+    def test_igual_que_comparar_todos_los_pares(self):
+        azar = random.Random(7)
+        filas = []
+        for i in range(300):
+            inicio = azar.randrange(7 * 60, 21 * 60)
+            fin = min(inicio + azar.choice((30, 60, 90, 180, 600)), 23 * 60 + 59)
+            filas.append(self.fila(i, divmod(inicio, 60), divmod(fin, 60), salon=azar.choice("AB"),
+                                   dias=azar.choice(("Lunes", "Martes", "Lunes, Martes"))))
+        # Las primeras 150 al construir y el resto con agregar(), revisando cada una antes
+        indice = IndiceHorario(filas[:150])
+        for posicion in range(150, len(filas)):
+            fila = filas[posicion]
+            esperados = sorted(
+                otra["nrc"] for otra in filas[:posicion]
+                if otra["id"] != fila["id"] and otra["salon"] == fila["salon"]
+                and otra["hora_inicio"] < fila["hora_fin"] and fila["hora_inicio"] < otra["hora_fin"]
+                for dia in set(Materias.indices_dias(otra["dias"])) & set(Materias.indices_dias(fila["dias"]))
+            )
+            self.assertEqual(self.nrcs(indice, fila), esperados, fila)
+            indice.agregar(fila)
+
+
+class ChoquesMateriasTests(ApiTestCase):
+    """POST/PUT de /materias/ contra las tres materias de ApiTestCase (Lunes y Martes de 10 a 11)."""
+
+    def crear(self, **datos):
+        return self.c.post("/materias/", {"nrc": "X1", "nombre": "Nueva", **datos}, format="json")
+
+    def test_salon_y_profesor_ocupados(self):
+        response = self.crear(dias=["Martes"], hora_inicio="10:30", hora_fin="12:00", salon="S1")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["horario"], ["Choca con la materia N1 en el salón S1 el Martes de 10:30 a 11:00."])
+        profesor = Maestros.objects.get(id_trabajador="T2")
+        response = self.crear(dias=["Lunes"], hora_inicio="09:00", hora_fin="10:01", profesor_id=profesor.pk)
+        self.assertEqual(response.json()["horario"], ["Choca con la materia N2 en el profesor el Lunes de 10:00 a 10:01."])
+
+    def test_otro_dia_u_hora_seguida_no_chocan(self):
+        self.assertEqual(self.crear(dias=["Miércoles"], hora_inicio="10:00", hora_fin="11:00", salon="S1").status_code, 201)
+        self.assertEqual(self.crear(nrc="X2", dias=["Lunes"], hora_inicio="11:00", hora_fin="12:00", salon="S1").status_code, 201)
+
+    def test_una_consulta_por_salon_y_profesor(self):
+        materia = Materias.objects.get(nrc="N0")
+        datos = {"dias": "Lunes", "hora_inicio": datetime.time(10), "hora_fin": datetime.time(11)}
+        # La propia materia no choca consigo misma; bloqueo del profesor + la consulta de traslapes
+        with self.assertNumQueries(2):
+            self.assertEqual(HorarioUtils.validar(datos, materia), [])
+        with self.assertNumQueries(1):
+            self.assertEqual(len(HorarioUtils.validar({**datos, "salon": "S1"})), 1)
+
+
+class PaginacionTests(ApiTestCase):
+
+    def test_paginas_por_cursor(self):
+        ids = list(Materias.objects.order_by("id").values_list("id", flat=True))
+        primera = self.c.get("/lista-materias/?limit=2").json()
+        self.assertEqual([m["id"] for m in primera["results"]], ids[:2])
+        self.assertEqual((primera["next"], primera["limit"]), (ids[1], 2))
+        # Una materia borrada entre páginas no mueve el cursor
+        Materias.objects.filter(id=ids[0]).delete()
+        segunda = self.c.get("/lista-materias/?limit=2&after=%d" % primera["next"]).json()
+        self.assertEqual([m["id"] for m in segunda["results"]], ids[2:])
+        self.assertIsNone(segunda["next"])
+        # Página exacta: sin "next" aunque no sobre nada
+        self.assertIsNone(self.c.get("/lista-materias/?limit=2&after=%d" % ids[0]).json()["next"])
+        self.assertEqual(self.c.get("/lista-materias/?after=%d" % ids[-1]).json()["results"], [])
+
+    def test_cursor_invalido(self):
+        for consulta in ("after=abc", "limit=0", "limit=x", "after=1.5"):
+            response = self.c.get("/lista-materias/?" + consulta)
+            self.assertEqual(response.status_code, 400, consulta)
+            self.assertIn("details", response.json())
+
+
+class CamposTests(ApiTestCase):
+
+    def lista(self, url):
+        response = self.c.get(url)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b"".join(response.streaming_content))
+
+    def test_fields_y_exclude(self):
+        filas = self.lista("/lista-materias/?fields=nrc,profesor_nombre")
+        self.assertEqual(filas[0], {"nrc": "N0", "profesor_nombre": "Maestro0 Prueba"})
+        fila = self.lista("/lista-admins/?fields=id,user.email")[0]
+        self.assertEqual(set(fila), {"id", "user"})
+        self.assertEqual(fila["user"], {"email": "admin@escuela.mx"})
+        fila = self.lista("/lista-maestros/?exclude=user,materias_json,telefono")[0]
+        self.assertNotIn("user", fila)
+        self.assertIn("id_trabajador", fila)
+        detalle = self.c.get("/materias/%d/?fields=nrc" % Materias.objects.get(nrc="N1").pk).json()
+        self.assertEqual(detalle, {"nrc": "N1"})
+
+    def test_campo_desconocido(self):
+        for url in ("/lista-materias/?fields=nrc,precio", "/lista-alumnos/?exclude=user.telefono",
+                    "/lista-maestros/?fields=id_trabajador.x", "/materias/?fields=nrc&limit=1&exclude=nada"):
+            response = self.c.get(url)
+            self.assertEqual(response.status_code, 400, url)
+            self.assertIn("Campo desconocido", response.json()["details"])
+
+
+class HorarioTests(ApiTestCase):
+    """Además de las de ApiTestCase (N0-N2, lunes y martes de 10 a 11, salones S0-S2)."""
+
+    def setUp(self):
+        super().setUp()
+        self.maestro = Maestros.objects.get(id_trabajador="T0")
+        for nrc, dias, inicio, fin in (("M1", "Miércoles", "08:00", "09:00"), ("M2", "Lunes, Miércoles", "12:00", "14:00"),
+                                       ("M3", "Sábado", None, None)):
+            Materias.objects.create(nrc=nrc, nombre_materia=nrc, dias=dias, hora_inicio=inicio, hora_fin=fin,
+                                    salon="S0", profesor=self.maestro if nrc != "M2" else None)
+
+    def nrcs(self, consulta):
+        response = self.c.get("/lista-materias/?" + consulta)
+        self.assertEqual(response.status_code, 200)
+        return sorted(materia["nrc"] for materia in json.loads(b"".join(response.streaming_content)))
+
+    def test_dias_y_rango_de_horas(self):
+        self.assertEqual(self.nrcs("dias=miercoles"), ["M1", "M2"])
+        self.assertEqual(self.nrcs("dias=Martes,Sábado"), ["M3", "N0", "N1", "N2"])
+        # Las que están en clase en algún momento del rango; terminar justo al empezar no cuenta
+        self.assertEqual(self.nrcs("dias=Lunes&desde=10:30&hasta=12:30"), ["M2", "N0", "N1", "N2"])
+        self.assertEqual(self.nrcs("desde=11:00&hasta=12:00"), [])
+        self.assertEqual(self.nrcs("dias=Miércoles&hasta=9:00 AM"), ["M1"])
+        for consulta in ("dias=Lunes,Feriado", "dias=,", "desde=25:99"):
+            self.assertEqual(self.c.get("/lista-materias/?" + consulta).status_code, 400, consulta)
+
+    def test_horario_del_salon(self):
+        horario = self.c.get("/horario/salon/S0/").json()
+        self.assertEqual((horario["salon"], horario["total"]), ("S0", 4))
+        self.assertEqual([clase["nrc"] for clase in horario["dias"]["Lunes"]], ["N0", "M2"])
+        self.assertEqual([clase["nrc"] for clase in horario["dias"]["Miércoles"]], ["M1", "M2"])
+        self.assertEqual(horario["dias"]["Domingo"], [])
+        self.assertEqual([clase["nrc"] for clase in horario["sin_horario"]], ["M3"])
+        m2 = horario["dias"]["Lunes"][1]
+        self.assertEqual((m2["hora_inicio"], m2["hora_fin"], m2["profesor_nombre"]), ("12:00:00", "14:00:00", "Sin asignar"))
+
+    def test_horario_del_profesor(self):
+        horario = self.c.get("/horario/profesor/%d/" % self.maestro.pk).json()
+        self.assertEqual((horario["profesor"], horario["profesor_nombre"], horario["total"]),
+                         (self.maestro.pk, "Maestro0 Prueba", 3))
+        self.assertEqual({dia: [clase["nrc"] for clase in clases] for dia, clases in horario["dias"].items() if clases},
+                         {"Lunes": ["N0"], "Martes": ["N0"], "Miércoles": ["M1"]})
+        self.assertEqual(horario["dias"]["Lunes"][0]["profesor_nombre"], "Maestro0 Prueba")
+        self.assertEqual(self.c.get("/horario/profesor/999999/").status_code, 404)
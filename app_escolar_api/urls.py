@@ -1,7 +1,7 @@
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from app_escolar_api.views import  materias, users, alumnos, maestros, auth
+from app_escolar_api.views import  materias, users, alumnos, maestros, auth, busqueda, importacion, archivos, horario
 
 urlpatterns = [
     # Create Admin
@@ -15,8 +15,14 @@ urlpatterns = [
     path('maestros/', maestros.MaestrosView.as_view()),
     # Listar Maestros
     path('lista-maestros/', maestros.MaestrosAll.as_view()),
+    # Maestros que pueden impartir una materia (?materia=)
+    path('maestros/por-materia/', maestros.MaestrosPorMateria.as_view()),
+    # Alta masiva de alumnos o maestros desde CSV / JSONL
+    path('importar/<str:tipo>/', importacion.ImportarView.as_view()),
     # Total de usuarios
     path('total-usuarios/', users.TotalUsers.as_view()),
+    # Búsqueda de personas (alumnos, maestros y administradores)
+    path('buscar/', busqueda.BuscarView.as_view()),
     # Login
     path('login/', auth.CustomAuthToken.as_view()),
     # Logout
@@ -24,8 +30,19 @@ urlpatterns = [
     # Materias
     path('lista-materias/', materias.MateriasAll.as_view()),
     path('materias/', materias.MateriasView.as_view()),
+    # Alta / cambios / bajas de muchas materias en una transacción
+    path('materias/lote/', materias.MateriasLoteView.as_view()),
+    # Materias que chocan de salón o de profesor
+    path('materias/conflictos/', materias.ConflictosView.as_view()),
     path('materias/<int:id>/', materias.MateriasView.as_view()),
     path('materias/verificar-nrc/<str:nrc>/', materias.VerificarNrcView.as_view()),
+    # Horario semanal por profesor, salón y programa educativo
+    path('horario/profesor/<int:id>/', horario.HorarioProfesorView.as_view()),
+    path('horario/salon/<str:salon>/', horario.HorarioSalonView.as_view()),
+    path('horario/programa/<str:programa_educativo>/', horario.HorarioProgramaView.as_view()),
+    # Archivos subidos (en disco, con Range)
+    path('archivos/', archivos.ArchivosView.as_view()),
+    path('archivos/<path:nombre>', archivos.ArchivoView.as_view()),
 ]
 
 if settings.DEBUG:
@@ -4,6 +4,20 @@ import base64
 
 class Utils:
 
+    # Bytes que se leen por vuelta al codificar en base64; múltiplo de 3 para
+    # que los pedazos se puedan concatenar sin relleno "=" a la mitad
+    CHUNK_B64 = 3 * 64 * 1024
+
+    # (desplazamiento, firma, content type); ver mimeFromBytes
+    FIRMAS = (
+        (0, b"\xff\xd8\xff", "image/jpeg"),
+        (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+        (0, b"GIF87a", "image/gif"),
+        (0, b"GIF89a", "image/gif"),
+        (0, b"%PDF-", "application/pdf"),
+        (0, b"\x1a\x45\xdf\xa3", "video/webm"),
+    )
+
     @staticmethod
     def randomString(stringLength=10):
         """Generate a random string of fixed length """
@@ -16,10 +30,52 @@ class Utils:
         digits = string.digits
         return ''.join(random.choice(digits) for i in range(numberLength))
 
+    @staticmethod
+    def mimeFromBytes(head, filename=None):
+        """
+        Content type a partir de los primeros bytes del archivo (bastan 16); si
+        no se reconoce la firma se usa el nombre como antes.
+        """
+        for inicio, firma, content_type in Utils.FIRMAS:
+            if head[inicio:inicio + len(firma)] == firma:
+                return content_type
+        if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+            return "image/webp"
+        if head[4:8] == b"ftyp":
+            # MP4 y derivados: la marca dice cuál
+            marca = head[8:12]
+            if marca == b"M4V ":
+                return "video/x-m4v"
+            if marca == b"qt  ":
+                return "video/quicktime"
+            return "video/mp4"
+        return Utils.mimeFromFilename(filename or "")
+
+    @staticmethod
+    def b64Chunks(file, chunk_size=None):
+        """
+        Base64 del archivo por pedazos (str), leyendo chunk_size bytes a la vez:
+        la memoria no depende del tamaño del archivo.
+        """
+        chunk_size = chunk_size or Utils.CHUNK_B64
+        chunk_size -= chunk_size % 3
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                return
+            yield base64.b64encode(chunk).decode()
+
+    @staticmethod
+    def b64Join(file, prefix=""):
+        # Un solo str al final en lugar de read() + b64encode + decode + concatenar
+        buffer = bytearray(prefix.encode())
+        for chunk in Utils.b64Chunks(file):
+            buffer += chunk.encode()
+        return buffer.decode()
+
     @staticmethod
     def requestRawFileToB64(file):
-        file_b64 = str(base64.b64encode(file.read()).decode())
-        return file_b64
+        return Utils.b64Join(file)
 
     @staticmethod
     def mimeFromFilename(filename):
@@ -30,18 +86,13 @@ class Utils:
             content_type = "video/mp4"
         else:
             content_type = "application/octet-stream"
-        
+
         return content_type
 
     @staticmethod
     def requestFileToB64(logo):
-
-        content_type = ""
-        if '.jpg' in logo.name or '.jpeg' in logo.name:
-            content_type = "data:image/jpeg;base64,"
-        elif '.png' in logo.name:
-            content_type = "data:image/png;base64,"
-
-        logo_b64 = content_type+str(base64.b64encode(logo.read()).decode())
-
-        return logo_b64
\ No newline at end of file
+        head = logo.read(16)
+        logo.seek(0)
+        content_type = Utils.mimeFromBytes(head, logo.name)
+        prefix = "data:%s;base64," % content_type if content_type.startswith("image/") else ""
+        return Utils.b64Join(logo, prefix)
@@ -1,5 +1,5 @@
 from django.db.models import *
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from app_escolar_api.serializers import UserSerializer
 from app_escolar_api.serializers import *
 from app_escolar_api.models import *
@@ -10,22 +10,26 @@ from rest_framework.response import Response
 from django.contrib.auth.models import Group
 import json
 from django.shortcuts import get_object_or_404
+from app_escolar_api.list_utils import ListUtils
+from app_escolar_api.query_utils import QueryBudget
+from app_escolar_api.cache_utils import CacheUtils
+from app_escolar_api.registro_utils import RegistroUtils
 
 
 class AlumnosAll(generics.CreateAPIView):
     # Obtener la lista de todos los maestros activos
     # Necesita permisos de autenticación de usuario para poder acceder a la petición
     permission_classes = (permissions.IsAuthenticated,)
+    @QueryBudget(2)
+    @CacheUtils.cacheable("alumnos")
     def get(self, request, *args, **kwargs):
-        alumnos = Alumnos.objects.filter(user__is_active=1).order_by("id")
-        lista = AlumnoSerializer(alumnos, many=True).data
-        for alumno in lista:
-            if isinstance(alumno, dict) and "materias_json" in alumno:
-                try:
-                    alumno["materias_json"] = json.loads(alumno["materias_json"])
-                except Exception:
-                    alumno["materias_json"] = []
-        return Response(lista, 200)
+        # select_related: el UserSerializer anidado sale del mismo JOIN
+        alumnos = Alumnos.objects.select_related("user").filter(user__is_active=1).order_by("id")
+        # Paginación opcional: ?after=<id>&limit=N
+        if ListUtils.quiere_paginar(request):
+            return ListUtils.paginar(request, alumnos, AlumnoSerializer)
+        # Sin paginación: la lista completa se envía en streaming por bloques
+        return ListUtils.stream(request, alumnos, AlumnoSerializer)
     
 
 class AlumnosView(generics.CreateAPIView):
@@ -37,13 +41,22 @@ class AlumnosView(generics.CreateAPIView):
         return []  # POST no requiere autenticación
     
     #Obtener maestro por ID
+    @QueryBudget(2)
+    @CacheUtils.cacheable("alumnos")
     def get(self, request, *args, **kwargs):
-        alumno = get_object_or_404(Alumnos, id = request.GET.get("id"))
-        alumno = AlumnoSerializer(alumno, many=False).data
+        # ?fields= / ?exclude= también aplican al detalle
+        try:
+            alumnos, serializer = ListUtils.preparar(request, Alumnos.objects.select_related("user"), AlumnoSerializer)
+        except ValueError as e:
+            return Response({"details": str(e)}, 400)
+        alumno = get_object_or_404(alumnos, id = request.GET.get("id"))
+        alumno = serializer.to_representation(alumno)
         # Si todo es correcto, regresamos la información
         return Response(alumno, 200)
     
     #Registrar nuevo usuario
+    # 9 sentencias + la primera lectura del grupo en el proceso + savepoint en pruebas
+    @QueryBudget(12)
     @transaction.atomic
     def post(self, request, *args, **kwargs):
 
@@ -51,41 +64,31 @@ class AlumnosView(generics.CreateAPIView):
         if user.is_valid():
             #Grab user data
             role = request.data['rol']
-            first_name = request.data['first_name']
-            last_name = request.data['last_name']
             email = request.data['email']
-            password = request.data['password']
             #Valida si existe el usuario o bien el email registrado
-            existing_user = User.objects.filter(email=email).first()
-
-            if existing_user:
+            if RegistroUtils.email_registrado(email):
                 return Response({"message":"Username "+email+", is already taken"},400)
+            if RegistroUtils.curp_registrada(request.data["curp"]):
+                return Response({"message":"La CURP "+str(request.data["curp"]).upper()+" ya está registrada"},400)
 
-            user = User.objects.create( username = email,
-                                        email = email,
-                                        first_name = first_name,
-                                        last_name = last_name,
-                                        is_active = 1)
-
-
-            user.save()
-            user.set_password(password)
-            user.save()
-
-            group, created = Group.objects.get_or_create(name=role)
-            group.user_set.add(user)
-            user.save()
-
-            #Create a profile for the user
-            alumno = Alumnos.objects.create(user=user,
-                                            matricula= request.data["matricula"],
-                                            curp= request.data["curp"].upper(),
-                                            rfc= request.data["rfc"].upper(),
-                                            fecha_nacimiento= request.data["fecha_nacimiento"],
-                                            edad= request.data["edad"],
-                                            telefono= request.data["telefono"],
-                                            ocupacion= request.data["ocupacion"])
-            alumno.save()
+            # Usuario (contraseña ya hasheada), grupo y perfil: un INSERT cada uno
+            try:
+                alumno = RegistroUtils.registrar(Alumnos, role,
+                                                 request.data['first_name'],
+                                                 request.data['last_name'],
+                                                 email,
+                                                 request.data['password'],
+                                                 matricula= request.data["matricula"],
+                                                 curp= request.data["curp"].upper(),
+                                                 rfc= request.data["rfc"].upper(),
+                                                 fecha_nacimiento= request.data["fecha_nacimiento"],
+                                                 edad= request.data["edad"],
+                                                 telefono= request.data["telefono"],
+                                                 ocupacion= request.data["ocupacion"])
+            except IntegrityError:
+                # Restricción alumno_matricula_unica; también se deshace el usuario creado
+                transaction.set_rollback(True)
+                return Response({"message":"La matrícula "+str(request.data["matricula"])+" ya está registrada"},400)
 
             return Response({"Alumno creado con ID: ": alumno.id }, 201)
         return Response(user.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -96,7 +99,9 @@ class AlumnosView(generics.CreateAPIView):
         # Verifica que el usuario esté autenticado
         permission_classes = (permissions.IsAuthenticated,)
         # Primero obtenemos el administrador a actualizar
-        alumno = get_object_or_404(Alumnos, id=request.data["id"])
+        alumno = get_object_or_404(Alumnos.objects.select_related("user"), id=request.data["id"])
+        if RegistroUtils.curp_registrada(request.data["curp"], excluir=alumno.pk):
+            return Response({"message":"La CURP "+str(request.data["curp"]).upper()+" ya está registrada"},400)
         alumno.matricula = request.data["matricula"]
         alumno.curp = request.data["curp"] 
         alumno.rfc = request.data["rfc"]
@@ -104,7 +109,12 @@ class AlumnosView(generics.CreateAPIView):
         alumno.edad = request.data["edad"]
         alumno.telefono = request.data["telefono"]
         alumno.ocupacion= request.data["ocupacion"]
-        alumno.save()
+        try:
+            with transaction.atomic():
+                alumno.save()
+        except IntegrityError:
+            transaction.set_rollback(True)
+            return Response({"message":"La matrícula "+str(alumno.matricula)+" ya está registrada"},400)
          # Actualizamos los datos del usuario asociado (tabla auth_user de Django)
         user = alumno.user
         user.first_name = request.data["first_name"]
@@ -117,7 +127,7 @@ class AlumnosView(generics.CreateAPIView):
     # Eliminar alumno con delete (Borrar realmente)
     @transaction.atomic
     def delete(self, request, *args, **kwargs):
-        alumno = get_object_or_404(Alumnos, id=request.GET.get("id"))
+        alumno = get_object_or_404(Alumnos.objects.select_related("user"), id=request.GET.get("id"))
         try:
             alumno.user.delete()
             return Response({"details":"Alumno eliminado"},200)
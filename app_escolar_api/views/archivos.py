@@ -0,0 +1,49 @@
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from app_escolar_api.media_utils import ArchivoDemasiadoGrande, MediaUtils
+
+
+class ArchivosView(APIView):
+    """
+    POST /archivos/
+    Sube un archivo (logo, foto, video) a default_storage sin cargarlo completo en
+    memoria: multipart con el archivo en "archivo", o el archivo directo en el
+    cuerpo (?nombre= opcional). Responde {"nombre", "url", "content_type", "tamano"}.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request, *args, **kwargs):
+        if request.content_type.startswith("multipart/"):
+            archivo = request.FILES.get("archivo")
+            if archivo is None:
+                return Response({"details": "Falta el archivo (campo 'archivo')."}, 400)
+            stream, nombre = archivo, archivo.name
+        else:
+            stream, nombre = request.stream, request.GET.get("nombre", "")
+            if stream is None:
+                return Response({"details": "El cuerpo de la petición está vacío."}, 400)
+
+        try:
+            datos = MediaUtils.guardar(stream, nombre)
+        except ArchivoDemasiadoGrande as e:
+            return Response({"details": str(e)}, 413)
+        return Response(datos, 201)
+
+
+class ArchivoView(APIView):
+    """
+    GET /archivos/<nombre>
+    El archivo por pedazos, con Range para que los videos se puedan adelantar.
+    ?formato=base64 lo manda como data URI (también en streaming).
+    Los nombres son aleatorios; quien tiene la URL puede verlo, como en MEDIA_URL.
+    """
+    permission_classes = (permissions.AllowAny,)
+
+    def get(self, request, nombre, *args, **kwargs):
+        try:
+            if request.GET.get("formato") == "base64":
+                return MediaUtils.servir_b64(nombre)
+            return MediaUtils.servir(request, nombre)
+        except (ValueError, FileNotFoundError, IsADirectoryError):
+            return Response({"details": "No existe el archivo."}, 404)
@@ -7,9 +7,18 @@ from rest_framework import status
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
 from rest_framework.response import Response
+from app_escolar_api.views.maestros import materias_json_como_texto
+from app_escolar_api.login_utils import LoginUtils
+from app_escolar_api.query_utils import QueryBudget
 
 class CustomAuthToken(ObtainAuthToken):
+    # Usuario, token y rol en una consulta; contraseña verificada en el pool de LoginUtils
+    serializer_class = LoginSerializer
 
+    # 1 (usuario + token + rol) + perfil + materias del maestro; el primer login
+    # de un usuario crea su token (get_or_create) y el primero de cada rol en el
+    # proceso lee el nombre del grupo
+    @QueryBudget(8)
     def post(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data,
                                         context={'request': request})
@@ -17,30 +26,27 @@ class CustomAuthToken(ObtainAuthToken):
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data['user']
         if user.is_active:
-            # Obtener perfil y roles del usuario
-            roles = user.groups.all()
-            role_names = []
-            # Verifico si el usuario tiene un perfil asociado
-            for role in roles:
-                role_names.append(role.name)
-
-            #Si solo es un rol especifico asignamos el elemento 0
-            role_names = role_names[0]
+            # Rol del usuario (su primer grupo), resuelto con el mapa de Roles
+            role_names = LoginUtils.rol(user)
             
             #Esta función genera la clave dinámica (token) para iniciar sesión
-            token, created = Token.objects.get_or_create(user=user)
+            token = LoginUtils.token(user)
             
            #Verificar que tipo de usuario quiere iniciar sesión
             
             if role_names == 'alumno':
                 alumno = Alumnos.objects.filter(user=user).first()
+                if alumno:
+                    alumno.user = user
                 alumno = AlumnoSerializer(alumno).data
                 alumno["token"] = token.key
                 alumno["rol"] = "alumno"
                 return Response(alumno,200)
             if role_names == 'maestro':
-                maestro = Maestros.objects.filter(user=user).first()
-                maestro = MaestroSerializer(maestro).data
+                maestro = Maestros.objects.prefetch_related("materias_rel").filter(user=user).first()
+                if maestro:
+                    maestro.user = user
+                maestro = materias_json_como_texto(MaestroSerializer(maestro).data)
                 maestro["token"] = token.key
                 maestro["rol"] = "maestro"
                 return Response(maestro,200)
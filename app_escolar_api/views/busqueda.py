@@ -0,0 +1,143 @@
+from difflib import SequenceMatcher
+from functools import reduce
+from operator import or_
+
+from django.db.models import Case, Count, Exists, Max, OuterRef, Q, Value, When
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from app_escolar_api.cache_utils import CacheUtils
+from app_escolar_api.models import PERFILES_BUSQUEDA, TokenBusqueda
+from app_escolar_api.query_utils import QueryBudget
+
+
+class BuscarView(APIView):
+    """
+    GET /buscar/?q=juan per&tipo=alumno&limit=20
+
+    Búsqueda de alumnos, maestros y administradores por nombre, correo,
+    matrícula, CURP, RFC, id de trabajador o clave de administrador.
+    Cada palabra de ?q= se busca como prefijo en TokenBusqueda (ver
+    TokenBusqueda.prefijo); si una palabra no tiene coincidencias se intenta una
+    búsqueda aproximada entre los tokens que comparten sus dos primeras letras.
+    CURP y RFC se guardan cifrados y solo coinciden escritos completos.
+    Un perfil debe coincidir con todas las palabras. La intersección se hace en
+    SQL: se parte de la palabra con menos tokens y las demás se exigen con
+    EXISTS sobre los tokens del mismo perfil (índice (tipo, perfil_id)); las
+    coincidencias exactas suman más y salen primero.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    LIMITE_DEFAULT = 20
+    LIMITE_MAXIMO = 100
+    MAXIMO_PALABRAS = 5
+    # Tokens distintos que se comparan en la búsqueda aproximada
+    CANDIDATOS_APROXIMADOS = 2000
+    SIMILITUD_MINIMA = 0.75
+    # Puntaje por palabra: token exacto, prefijo, aproximada
+    EXACTA, PREFIJO, APROXIMADA = 3, 2, 1
+
+    def tokens(self, tipo):
+        tokens = TokenBusqueda.objects.all()
+        if tipo:
+            tokens = tokens.filter(tipo=tipo)
+        return tokens
+
+    def condiciones(self, palabra):
+        """(tokens que coinciden con la palabra, tokens que coinciden exacto)"""
+        # CURP y RFC están indexados por huella: coincidencia exacta en la misma consulta
+        exactos = Q(token__in=[palabra, TokenBusqueda.token_huella(palabra)])
+        return TokenBusqueda.prefijo(palabra) | exactos, exactos
+
+    def aproximados(self, palabra, tipo):
+        """Tokens con el mismo inicio y similitud suficiente (errores de dedo)."""
+        if len(palabra) < 3:
+            return []
+        tokens = (self.tokens(tipo).filter(TokenBusqueda.prefijo(palabra[:2]))
+                  .order_by("token").values_list("token", flat=True).distinct()[:self.CANDIDATOS_APROXIMADOS])
+        return [token for token in tokens
+                if abs(len(token) - len(palabra)) <= 2
+                and SequenceMatcher(None, palabra, token).ratio() >= self.SIMILITUD_MINIMA]
+
+    @QueryBudget(11)
+    @CacheUtils.cacheable("busqueda")
+    def get(self, request, *args, **kwargs):
+        tipos = {tipo: (modelo, campos) for modelo, (tipo, campos) in PERFILES_BUSQUEDA.items()}
+        tipo = request.GET.get("tipo") or None
+        if tipo and tipo not in tipos:
+            return Response({"details": "El parámetro 'tipo' debe ser uno de: " + ", ".join(tipos)}, 400)
+        try:
+            limite = min(int(request.GET.get("limit") or self.LIMITE_DEFAULT), self.LIMITE_MAXIMO)
+        except ValueError:
+            return Response({"details": "El parámetro 'limit' debe ser un entero."}, 400)
+
+        palabras = []
+        for palabra in TokenBusqueda.normalizar(request.GET.get("q", "")).split():
+            # Los tokens de huella no se buscan por prefijo
+            if palabra.startswith(TokenBusqueda.PREFIJO_HUELLA):
+                continue
+            if palabra not in palabras:
+                palabras.append(palabra)
+        palabras = palabras[:self.MAXIMO_PALABRAS]
+        if not palabras:
+            return Response([], 200)
+
+        # Cuántos tokens tiene cada palabra, todas en una consulta
+        condiciones = {palabra: self.condiciones(palabra) for palabra in palabras}
+        conteos = self.tokens(tipo).filter(reduce(or_, (c for c, exactos in condiciones.values()))).aggregate(**{
+            "p%d" % i: Count("id", filter=condiciones[palabra][0]) for i, palabra in enumerate(palabras)
+        })
+        # palabra -> (orden, condición, condición exacta o None, puntaje si no es exacta)
+        busqueda = {}
+        for i, palabra in enumerate(palabras):
+            condicion, exactos = condiciones[palabra]
+            if conteos["p%d" % i]:
+                busqueda[palabra] = ((0, conteos["p%d" % i]), condicion, exactos, self.PREFIJO)
+                continue
+            similares = self.aproximados(palabra, tipo)
+            if not similares:
+                return Response([], 200)
+            busqueda[palabra] = ((1, len(similares)), Q(token__in=similares), None, self.APROXIMADA)
+        orden = sorted(palabras, key=lambda palabra: busqueda[palabra][0])
+
+        # Se parte de la palabra más selectiva; las demás se exigen sobre el mismo perfil
+        _, condicion, exactos, base = busqueda[orden[0]]
+        filas = self.tokens(tipo).filter(condicion, user__is_active=True)
+        puntaje = Max(Case(When(exactos, then=Value(self.EXACTA)), default=Value(base))) if exactos else Value(base)
+        for palabra in orden[1:]:
+            _, condicion, exactos, base = busqueda[palabra]
+            mismo_perfil = TokenBusqueda.objects.filter(tipo=OuterRef("tipo"), perfil_id=OuterRef("perfil_id"))
+            filas = filas.filter(Exists(mismo_perfil.filter(condicion)))
+            puntaje = puntaje + Value(base)
+            if exactos:
+                puntaje = puntaje + Max(Case(When(Exists(mismo_perfil.filter(exactos)), then=Value(self.EXACTA - base)),
+                                             default=Value(0)))
+        mejores = [
+            ((tipo_perfil, perfil_id), total)
+            for tipo_perfil, perfil_id, total in filas.values("tipo", "perfil_id")
+            .annotate(puntaje=puntaje).order_by("-puntaje", "tipo", "perfil_id")
+            .values_list("tipo", "perfil_id", "puntaje")[:limite]
+        ]
+
+        # Datos de los perfiles encontrados: una consulta por tipo
+        perfiles = {}
+        for tipo_perfil, (modelo, campos) in tipos.items():
+            ids = [perfil_id for (t, perfil_id), puntaje in mejores if t == tipo_perfil]
+            if not ids:
+                continue
+            filas = modelo.objects.filter(id__in=ids, user__is_active=True).values_list(
+                "id", "user_id", "user__first_name", "user__last_name", "user__email", campos[0]
+            )
+            for perfil_id, user_id, first_name, last_name, email, identificador in filas:
+                perfiles[(tipo_perfil, perfil_id)] = {
+                    "tipo": tipo_perfil,
+                    "id": perfil_id,
+                    "user_id": user_id,
+                    "first_name": first_name,
+                    "last_name": last_name,
+                    "email": email,
+                    "identificador": identificador,
+                }
+
+        return Response([perfiles[clave] for clave, puntaje in mejores if clave in perfiles], 200)
@@ -0,0 +1,58 @@
+from django.shortcuts import get_object_or_404
+
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from app_escolar_api.models import Maestros, Materias
+from app_escolar_api.horario_utils import HorarioUtils
+from app_escolar_api.query_utils import QueryBudget
+from app_escolar_api.cache_utils import CacheUtils
+
+
+class HorarioProfesorView(APIView):
+    """
+    GET /horario/profesor/<id>/
+    Cuadrícula semanal del profesor (ver HorarioUtils.semana):
+      { "profesor": id, "profesor_nombre": "...", "total": N,
+        "dias": {"Lunes": [clases], ..., "Domingo": []}, "sin_horario": [clases] }
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    @QueryBudget(3)
+    @CacheUtils.cacheable("materias")
+    def get(self, request, id, *args, **kwargs):
+        maestro = get_object_or_404(Maestros.objects.select_related("user"), id=id)
+        horario = HorarioUtils.semana(maestro.materias_impartidas.all())
+        return Response({
+            "profesor": maestro.id,
+            "profesor_nombre": f"{maestro.user.first_name} {maestro.user.last_name}",
+            **horario,
+        }, 200)
+
+
+class HorarioSalonView(APIView):
+    """
+    GET /horario/salon/<salon>/
+    Cuadrícula semanal de las clases del salón: { "salon": "...", "total": N, "dias": {...}, "sin_horario": [...] }
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    @QueryBudget(2)
+    @CacheUtils.cacheable("materias")
+    def get(self, request, salon, *args, **kwargs):
+        return Response({"salon": salon, **HorarioUtils.semana(Materias.objects.filter(salon=salon))}, 200)
+
+
+class HorarioProgramaView(APIView):
+    """
+    GET /horario/programa/<programa_educativo>/
+    Cuadrícula semanal del programa educativo: { "programa_educativo": "...", "total": N, "dias": {...}, "sin_horario": [...] }
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    @QueryBudget(2)
+    @CacheUtils.cacheable("materias")
+    def get(self, request, programa_educativo, *args, **kwargs):
+        materias = Materias.objects.filter(programa_educativo=programa_educativo)
+        return Response({"programa_educativo": programa_educativo, **HorarioUtils.semana(materias)}, 200)
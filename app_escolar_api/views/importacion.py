@@ -0,0 +1,59 @@
+import io
+from django.conf import settings
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from app_escolar_api.import_utils import ImportUtils
+
+
+class ImportarView(APIView):
+    """
+    POST /importar/<alumnos|maestros>/
+    Alta masiva desde CSV o JSONL: multipart con el archivo en "archivo", o el
+    archivo directo en el cuerpo (Content-Type text/csv o application/x-ndjson).
+    ?formato=csv|jsonl si no se puede deducir; ?todo_o_nada=1 para no insertar
+    nada si alguna fila tiene errores.
+    Columnas: first_name, last_name, email, password y las del perfil
+    (materias_json como lista JSON para maestros).
+    Hasta IMPORT_MAX_FILAS_PETICION filas: las contraseñas se hashean aquí, en el
+    hilo de la petición. Los archivos más grandes se importan con el comando
+    manage.py importar_usuarios, que reparte el hash entre procesos.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request, tipo, *args, **kwargs):
+        if tipo not in ImportUtils.TIPOS:
+            return Response({"details": "Tipo no soportado: " + tipo}, 404)
+        # Solo los administradores dan de alta usuarios en masa
+        if not request.user.groups.filter(name="administrador").exists():
+            return Response({"details": "Forbidden"}, 403)
+
+        if request.content_type.startswith("multipart/"):
+            archivo = request.FILES.get("archivo")
+            if archivo is None:
+                return Response({"details": "Falta el archivo (campo 'archivo')."}, 400)
+            nombre = archivo.name
+        else:
+            archivo = io.BytesIO(request.body)
+            nombre = ""
+
+        try:
+            formato = ImportUtils.formato(nombre, request.content_type, request.GET.get("formato"))
+            filas = ImportUtils.leer(archivo, formato)
+        except ValueError as e:
+            return Response({"details": str(e)}, 400)
+
+        maximo = getattr(settings, "IMPORT_MAX_FILAS_PETICION", 100)
+        if len(filas) > maximo:
+            return Response({"details": "El archivo tiene %d filas y por petición se aceptan hasta %d; "
+                                        "impórtalo con manage.py importar_usuarios %s <archivo>." % (len(filas), maximo, tipo)}, 413)
+
+        try:
+            resultado = ImportUtils.importar(filas, tipo, todo_o_nada=request.GET.get("todo_o_nada") in ("1", "true"),
+                                             workers=1)
+        except ValueError as e:
+            return Response({"details": str(e)}, 400)
+
+        if resultado["errores"] and not resultado["creados"]:
+            return Response(resultado, 400)
+        return Response(resultado, 201 if not resultado["errores"] else 200)
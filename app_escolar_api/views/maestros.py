@@ -1,5 +1,5 @@
 from django.db.models import *
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from app_escolar_api.serializers import UserSerializer
 from app_escolar_api.serializers import *
 from app_escolar_api.models import *
@@ -10,21 +10,52 @@ from rest_framework.response import Response
 from django.contrib.auth.models import Group
 import json
 from django.shortcuts import get_object_or_404
+from app_escolar_api.list_utils import ListUtils
+from app_escolar_api.query_utils import QueryBudget
+from app_escolar_api.cache_utils import CacheUtils
+from app_escolar_api.registro_utils import RegistroUtils
+
+
+def materias_json_como_texto(maestro):
+    # El detalle (y el login) siempre regresaron materias_json como el texto JSON
+    # guardado en la columna; las listas lo regresan como arreglo
+    if isinstance(maestro, dict) and isinstance(maestro.get("materias_json"), list):
+        maestro["materias_json"] = json.dumps(maestro["materias_json"])
+    return maestro
 
 class MaestrosAll(generics.CreateAPIView):
      # Obtener la lista de todos los maestros activos
     # Necesita permisos de autenticación de usuario para poder acceder a la petición
     permission_classes = (permissions.IsAuthenticated,)
+    @QueryBudget(3)
+    @CacheUtils.cacheable("maestros")
+    def get(self, request, *args, **kwargs):
+        # select_related: el UserSerializer anidado sale del mismo JOIN
+        maestros = Maestros.objects.select_related("user").filter(user__is_active=1).order_by("id")
+        # Paginación opcional: ?after=<id>&limit=N
+        if ListUtils.quiere_paginar(request):
+            return ListUtils.paginar(request, maestros, MaestroSerializer)
+        # Sin paginación: la lista completa se envía en streaming por bloques
+        return ListUtils.stream(request, maestros, MaestroSerializer)
+
+
+class MaestrosPorMateria(generics.CreateAPIView):
+    # Maestros activos que pueden impartir una materia: ?materia=<nombre>
+    # Usa el índice de MaestroMateria.nombre en lugar de leer el materias_json de todos
+    permission_classes = (permissions.IsAuthenticated,)
+    @QueryBudget(3)
+    @CacheUtils.cacheable("maestros")
     def get(self, request, *args, **kwargs):
-        maestros = Maestros.objects.filter(user__is_active=1).order_by("id")
-        lista = MaestroSerializer(maestros, many=True).data
-        for maestro in lista:
-            if isinstance(maestro, dict) and "materias_json" in maestro:
-                try:
-                    maestro["materias_json"] = json.loads(maestro["materias_json"])
-                except Exception:
-                    maestro["materias_json"] = []
-        return Response(lista, 200)
+        materia = request.GET.get("materia")
+        if not materia:
+            return Response({"details": "El parámetro 'materia' es obligatorio."}, 400)
+        maestros = Maestros.objects.select_related("user").filter(
+            user__is_active=1,
+            id__in=MaestroMateria.objects.filter(nombre=materia).values("maestro_id")
+        ).order_by("id")
+        if ListUtils.quiere_paginar(request):
+            return ListUtils.paginar(request, maestros, MaestroSerializer)
+        return ListUtils.stream(request, maestros, MaestroSerializer)
     
 
 class MaestrosView(generics.CreateAPIView):
@@ -36,47 +67,48 @@ class MaestrosView(generics.CreateAPIView):
         return []  # POST no requiere autenticación
     
     #Obtener maestro por ID
+    @QueryBudget(3)
+    @CacheUtils.cacheable("maestros")
     def get(self, request, *args, **kwargs):
-        maestro = get_object_or_404(Maestros, id = request.GET.get("id"))
-        maestro = MaestroSerializer(maestro, many=False).data
+        # ?fields= / ?exclude= también aplican al detalle
+        try:
+            maestros, serializer = ListUtils.preparar(request, Maestros.objects.select_related("user").prefetch_related("materias_rel"), MaestroSerializer)
+        except ValueError as e:
+            return Response({"details": str(e)}, 400)
+        maestro = get_object_or_404(maestros, id = request.GET.get("id"))
+        maestro = materias_json_como_texto(serializer.to_representation(maestro))
         # Si todo es correcto, regresamos la información
         return Response(maestro, 200)
     
     #Registrar nuevo usuario maestro
+    # 9 sentencias (con las materias) + la primera lectura del grupo en el proceso + savepoint en pruebas
+    @QueryBudget(12)
     @transaction.atomic
     def post(self, request, *args, **kwargs):
         user = UserSerializer(data=request.data)
         if user.is_valid():
             role = request.data['rol']
-            first_name = request.data['first_name']
-            last_name = request.data['last_name']
             email = request.data['email']
-            password = request.data['password']
-            existing_user = User.objects.filter(email=email).first()
-            if existing_user:
+            if RegistroUtils.email_registrado(email):
                 return Response({"message":"Username "+email+", is already taken"},400)
-            user = User.objects.create( username = email,
-                                        email = email,
-                                        first_name = first_name,
-                                        last_name = last_name,
-                                        is_active = 1)
-            user.save()
-            user.set_password(password)
-            user.save()
-            
-            group, created = Group.objects.get_or_create(name=role)
-            group.user_set.add(user)
-            user.save()
-            #Create a profile for the user
-            maestro = Maestros.objects.create(user=user,
-                                            id_trabajador= request.data["id_trabajador"],
-                                            fecha_nacimiento= request.data["fecha_nacimiento"],
-                                            telefono= request.data["telefono"],
-                                            rfc= request.data["rfc"].upper(),
-                                            cubiculo= request.data["cubiculo"],
-                                            area_investigacion= request.data["area_investigacion"],
-                                            materias_json = json.dumps(request.data["materias_json"]))
-            maestro.save()
+            # Usuario (contraseña ya hasheada), grupo y perfil: un INSERT cada uno
+            try:
+                maestro = RegistroUtils.registrar(Maestros, role,
+                                                  request.data['first_name'],
+                                                  request.data['last_name'],
+                                                  email,
+                                                  request.data['password'],
+                                                  id_trabajador= request.data["id_trabajador"],
+                                                  fecha_nacimiento= request.data["fecha_nacimiento"],
+                                                  telefono= request.data["telefono"],
+                                                  rfc= request.data["rfc"].upper(),
+                                                  cubiculo= request.data["cubiculo"],
+                                                  area_investigacion= request.data["area_investigacion"])
+            except IntegrityError:
+                # Restricción maestro_id_trabajador_unico; también se deshace el usuario creado
+                transaction.set_rollback(True)
+                return Response({"message":"El ID de trabajador "+str(request.data["id_trabajador"])+" ya está registrado"},400)
+            maestro.guardar_materias(request.data["materias_json"], nuevo=True)
             return Response({"maestro_created_id": maestro.id }, 201)
         return Response(user.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -86,28 +118,33 @@ class MaestrosView(generics.CreateAPIView):
         # Verifica que el usuario esté autenticado
         permission_classes = (permissions.IsAuthenticated,)
         # Primero obtenemos el administrador a actualizar
-        maestro = get_object_or_404(Maestros, id=request.data["id"])
+        maestro = get_object_or_404(Maestros.objects.select_related("user"), id=request.data["id"])
         maestro.id_trabajador = request.data["id_trabajador"]
         maestro.fecha_nacimiento = request.data["fecha_nacimiento"]
         maestro.telefono = request.data["telefono"]
         maestro.rfc = request.data["rfc"]
         maestro.cubiculo = request.data["cubiculo"]
         maestro.area_investigacion= request.data["area_investigacion"]
-        maestro.materias_json = request.data["materias_json"]
-        maestro.save()
+        try:
+            with transaction.atomic():
+                maestro.save()
+        except IntegrityError:
+            transaction.set_rollback(True)
+            return Response({"message":"El ID de trabajador "+str(maestro.id_trabajador)+" ya está registrado"},400)
+        maestro.guardar_materias(request.data["materias_json"])
         # Actualizamos los datos del usuario asociado (tabla auth_user de Django)
         user = maestro.user
         user.first_name = request.data["first_name"]
         user.last_name = request.data["last_name"]
         user.save()
         
-        return Response({"message": "Maestro actualizado correctamente", "maestro": MaestroSerializer(maestro).data}, 200)
+        return Response({"message": "Maestro actualizado correctamente", "maestro": materias_json_como_texto(MaestroSerializer(maestro).data)}, 200)
         # return Response(user,200)
           
     # Eliminar maestro con delete (Borrar realmente)
     @transaction.atomic
     def delete(self, request, *args, **kwargs):
-        maestro = get_object_or_404(Maestros, id=request.GET.get("id"))
+        maestro = get_object_or_404(Maestros.objects.select_related("user"), id=request.GET.get("id"))
         try:
             maestro.user.delete()
             return Response({"details":"Maestro eliminado"},200)
@@ -1,4 +1,5 @@
-from django.db import transaction
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
 from django.shortcuts import get_object_or_404
 
 from rest_framework import permissions, status
@@ -6,8 +7,12 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.generics import GenericAPIView
 
-from app_escolar_api.models import Materias, Maestros
+from app_escolar_api.models import Materias, Maestros, VersionTabla
 from app_escolar_api.serializers import MateriaSerializer
+from app_escolar_api.list_utils import ListUtils
+from app_escolar_api.query_utils import QueryBudget
+from app_escolar_api.cache_utils import CacheUtils
+from app_escolar_api.horario_utils import HorarioUtils
 from datetime import datetime
 
 
@@ -45,17 +50,77 @@ def normalizar_hora(valor):
     return valor
 
 
+def filtrar_horario(request, materias):
+    """
+    Filtros opcionales de las listas de materias:
+      ?dias=Lunes,Miércoles          -> las que se dan alguno de esos días
+      ?desde=10:00&hasta=12:00       -> las que están en clase en algún momento de ese rango
+    Los días van por dias_mask (IN sobre las máscaras que los incluyen) y las
+    horas por el mismo índice (dias_mask, hora_inicio, hora_fin), en lugar de
+    dias LIKE '%Miércoles%' sobre toda la tabla.
+    Lanza ValueError con un mensaje legible si algún valor no es válido.
+    """
+    dias = request.GET.get("dias")
+    if dias:
+        nombres = [dia.strip() for dia in dias.split(",") if dia.strip()]
+        if not nombres or not all(Materias.indices_dias([nombre]) for nombre in nombres):
+            raise ValueError("El parámetro 'dias' debe ser una lista de días (Lunes, Martes, ...).")
+        materias = materias.filter(dias_mask__in=Materias.mascaras_con(Materias.mascara_dias(nombres)))
+
+    for parametro, filtro in (("desde", "hora_fin__gt"), ("hasta", "hora_inicio__lt")):
+        valor = request.GET.get(parametro)
+        if not valor:
+            continue
+        try:
+            hora = datetime.strptime(normalizar_hora(valor), "%H:%M:%S").time()
+        except ValueError:
+            raise ValueError("El parámetro '%s' debe ser una hora (10:00, 2:00 PM)." % parametro)
+        materias = materias.filter(**{filtro: hora})
+    return materias
+
+
 class MateriasAll(APIView):
     """
     Vista de compatibilidad:
     GET /materias-all/  -> lista todas las materias
+    GET /materias-all/?after=<id>&limit=N  -> lista paginada por cursor
+    GET /materias-all/?fields=id,nrc,profesor_nombre  -> solo esas columnas
+    GET /materias-all/?dias=Miércoles&desde=10:00&hasta=12:00  -> ver filtrar_horario
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    @QueryBudget(2)
+    @CacheUtils.cacheable("materias")
+    def get(self, request, *args, **kwargs):
+        # profesor_nombre necesita profesor.user: lo traemos en el mismo JOIN
+        materias = Materias.objects.select_related("profesor__user").order_by("id")
+        try:
+            materias = filtrar_horario(request, materias)
+        except ValueError as e:
+            return Response({"details": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if ListUtils.quiere_paginar(request):
+            return ListUtils.paginar(request, materias, MateriaSerializer)
+        # Sin paginación: la lista completa se envía en streaming por bloques
+        return ListUtils.stream(request, materias, MateriaSerializer)
+
+
+class ConflictosView(APIView):
+    """
+    GET /materias/conflictos/  -> todas las materias que chocan de horario
+    Responde: { "total": N, "conflictos": [ {"tipo": "salon" | "profesor",
+                "recurso": salón o id del profesor, "dia": "Lunes",
+                "materias": [id, id], "nrcs": [nrc, nrc], "desde": "10:00", "hasta": "11:00"} ] }
+    Revisa el catálogo completo en un solo barrido (HorarioUtils.auditar).
     """
     permission_classes = (permissions.IsAuthenticated,)
 
+    @QueryBudget(2)
+    @CacheUtils.cacheable("materias")
     def get(self, request, *args, **kwargs):
-        materias = Materias.objects.all().order_by("id")
-        serializer = MateriaSerializer(materias, many=True)
-        return Response(serializer.data, 200)
+        materias = (Materias.objects.exclude(hora_inicio=None).exclude(hora_fin=None)
+                    .values_list(*HorarioUtils.COLUMNAS))
+        conflictos = HorarioUtils.auditar(dict(zip(HorarioUtils.COLUMNAS, valores)) for valores in materias.iterator())
+        return Response({"total": len(conflictos), "conflictos": conflictos}, 200)
 
 
 class VerificarNrcView(APIView):
@@ -75,6 +140,9 @@ class MateriasView(GenericAPIView):
     Vista principal que se adapta al FRONT actual:
 
       - GET    /materias/           -> lista todas
+      - GET    /materias/?after=<id>&limit=N -> lista paginada por cursor
+      - GET    /materias/?fields=a,b / ?exclude=a,b -> recorta campos (lista y detalle)
+      - GET    /materias/?dias=Lunes&desde=10:00&hasta=12:00 -> filtra la lista por días y horas
       - GET    /materias/<id>/      -> detalle
       - POST   /materias/           -> crear
       - PUT    /materias/<id>/      -> actualizar
@@ -84,6 +152,9 @@ class MateriasView(GenericAPIView):
       - 'nombre'       -> 'nombre_materia'
       - 'profesor_id'  -> 'profesor'
       - 'dias' (lista) -> string "Lunes, Martes, ..."
+
+    POST y PUT responden 400 {"horario": [...]} si el salón o el profesor ya
+    tienen clase a esa hora (HorarioUtils.validar).
     """
     permission_classes = (permissions.IsAuthenticated,)
     serializer_class = MateriaSerializer
@@ -98,18 +169,30 @@ class MateriasView(GenericAPIView):
     # =========================
     # GET (lista o detalle)
     # =========================
+    @QueryBudget(2)
+    @CacheUtils.cacheable("materias")
     def get(self, request, *args, **kwargs):
         materia_id = self._get_id(request, **kwargs)
+        # profesor_nombre necesita profesor.user: lo traemos en el mismo JOIN
+        materias = Materias.objects.select_related("profesor__user")
 
         if materia_id:
-            materia = get_object_or_404(Materias, id=materia_id)
-            serializer = MateriaSerializer(materia)
-            return Response(serializer.data, 200)
-
-        # Sin id: lista todas
-        materias = Materias.objects.all().order_by("id")
-        serializer = MateriaSerializer(materias, many=True)
-        return Response(serializer.data, 200)
+            # ?fields= / ?exclude= también aplican al detalle
+            try:
+                materias, serializer = ListUtils.preparar(request, materias, MateriaSerializer)
+            except ValueError as e:
+                return Response({"details": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            materia = get_object_or_404(materias, id=materia_id)
+            return Response(serializer.to_representation(materia), 200)
+
+        # Sin id: lista todas (o paginada con ?after=<id>&limit=N)
+        try:
+            materias = filtrar_horario(request, materias.order_by("id"))
+        except ValueError as e:
+            return Response({"details": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if ListUtils.quiere_paginar(request):
+            return ListUtils.paginar(request, materias, MateriaSerializer)
+        return ListUtils.stream(request, materias, MateriaSerializer)
 
     # =========================
     # POST (crear)
@@ -154,6 +237,10 @@ class MateriasView(GenericAPIView):
 
         serializer = MateriaSerializer(data=data)
         if serializer.is_valid():
+            # El salón y el profesor no pueden tener dos clases a la misma hora
+            choques = HorarioUtils.validar(serializer.validated_data)
+            if choques:
+                return Response({"horario": choques}, status=status.HTTP_400_BAD_REQUEST)
             serializer.save()
             return Response({"materia_created_id": serializer.data["id"]}, 201)
 
@@ -196,6 +283,9 @@ class MateriasView(GenericAPIView):
 
         serializer = MateriaSerializer(materia, data=data, partial=True)
         if serializer.is_valid():
+            choques = HorarioUtils.validar(serializer.validated_data, materia)
+            if choques:
+                return Response({"horario": choques}, status=status.HTTP_400_BAD_REQUEST)
             serializer.save()
             return Response({"message": "Materia actualizada correctamente"}, 200)
 
@@ -211,3 +301,191 @@ class MateriasView(GenericAPIView):
         materia = get_object_or_404(Materias, id=materia_id)
         materia.delete()
         return Response({"message": "Materia eliminada correctamente"}, 200)
+
+
+class MateriasLoteView(APIView):
+    """
+    POST /materias/lote/  -> alta, cambios y bajas de muchas materias en una sola petición
+
+    Cuerpo:
+      {
+        "modo": "todo_o_nada" | "parcial",   (default todo_o_nada)
+        "materias": [ {...}, ... ],           con "id" se actualiza, sin "id" se crea
+        "eliminar": [id, ...]
+      }
+    o directamente el arreglo de materias. Cada materia acepta los mismos campos
+    que POST /materias/ (nombre, profesor_id, dias como lista, horas '2:00 PM').
+
+    Los NRC, profesores y materias existentes se leen con una consulta IN cada
+    uno; todo se escribe con bulk_create / bulk_update en una transacción.
+    Los choques de horario (salón o profesor) se revisan contra lo guardado y
+    entre las materias del lote, y se reportan como {"horario": [...]}.
+    Respuesta: {"creadas": [ids], "actualizadas": [ids], "eliminadas": [ids],
+                "errores": [{"indice": i, "errores": {campo: [...]}}]}
+    (los errores de "eliminar" traen {"eliminar": id} en lugar de "indice", y
+    si un alta concurrente gana un NRC al guardar, 400 con {"lote": true} y nada guardado)
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    MODOS = ("todo_o_nada", "parcial")
+    # Campos que se pueden escribir desde el lote (el resto los pone el modelo)
+    CAMPOS = ("nrc", "nombre_materia", "seccion", "dias", "hora_inicio", "hora_fin", "salon",
+              "programa_educativo", "creditos")
+
+    @staticmethod
+    def mapear(data, horas):
+        """Mismas conversiones que POST /materias/; las horas se normalizan una vez por valor distinto."""
+        data = dict(data)
+        if "nombre" in data and "nombre_materia" not in data:
+            data["nombre_materia"] = data["nombre"]
+        if data.get("profesor_id"):
+            data["profesor"] = data["profesor_id"]
+        if isinstance(data.get("dias"), list):
+            data["dias"] = ", ".join(data["dias"])
+        for campo in ("hora_inicio", "hora_fin"):
+            if campo in data:
+                valor = data[campo]
+                clave = str(valor) if valor is not None else None
+                if clave not in horas:
+                    horas[clave] = normalizar_hora(valor)
+                data[campo] = horas[clave]
+        return data
+
+    def post(self, request, *args, **kwargs):
+        cuerpo = request.data
+        if isinstance(cuerpo, list):
+            cuerpo = {"materias": cuerpo}
+        modo = cuerpo.get("modo") or request.GET.get("modo") or "todo_o_nada"
+        materias = cuerpo.get("materias") or []
+        eliminar = cuerpo.get("eliminar") or []
+        if modo not in self.MODOS:
+            return Response({"details": "modo debe ser todo_o_nada o parcial."}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(materias, list) or not isinstance(eliminar, list) or not all(isinstance(m, dict) for m in materias):
+            return Response({"details": "materias y eliminar deben ser listas."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            eliminar = [int(materia_id) for materia_id in eliminar]
+        except (TypeError, ValueError):
+            return Response({"eliminar": ["Los ids deben ser enteros."]}, status=status.HTTP_400_BAD_REQUEST)
+
+        horas = {}
+        datos = [self.mapear(data, horas) for data in materias]
+
+        # Una consulta por tipo de dato referenciado en el lote
+        nrcs = {data.get("nrc") for data in datos if data.get("nrc")}
+        nrc_existentes = dict(Materias.objects.filter(nrc__in=nrcs).values_list("nrc", "id"))
+        profesores = {data["profesor"] for data in datos if data.get("profesor")}
+        profesores_existentes = set(Maestros.objects.filter(id__in=[p for p in profesores if str(p).isdigit()]).values_list("id", flat=True))
+        ids = {data["id"] for data in datos if data.get("id")} | set(eliminar)
+        actuales = Materias.objects.in_bulk([i for i in ids if str(i).isdigit()])
+
+        errores = []
+        nuevas, cambiadas = [], []
+        # Materias que pasaron las validaciones de campos, y el horario que tenían las que se actualizan
+        validas, previas = [], {}
+        # NRC -> índice en el lote; los NRC de materias que se eliminan quedan libres
+        nrc_en_lote = {}
+        eliminadas = set(eliminar) & set(actuales)
+        for materia_id in eliminar:
+            if materia_id not in actuales:
+                errores.append({"eliminar": materia_id, "errores": {"id": ["La materia %s no existe." % materia_id]}})
+
+        for indice, data in enumerate(datos):
+            errores_materia = {}
+            materia_id = data.get("id")
+            if materia_id:
+                materia = actuales.get(int(materia_id)) if str(materia_id).isdigit() else None
+                if materia is None or materia.pk in eliminadas:
+                    errores.append({"indice": indice, "errores": {"id": ["La materia %s no existe." % materia_id]}})
+                    continue
+                previas[materia.pk] = HorarioUtils.fila(materia)
+            else:
+                materia = Materias()
+
+            for campo in self.CAMPOS:
+                if campo in data:
+                    setattr(materia, campo, data[campo])
+            if "profesor" in data:
+                materia.profesor_id = data["profesor"] or None
+
+            nrc = materia.nrc
+            duenio = nrc_existentes.get(nrc)
+            if nrc and duenio is not None and duenio != materia.pk and duenio not in eliminadas:
+                errores_materia["nrc"] = ["El NRC ya existe en la base de datos."]
+            elif nrc in nrc_en_lote:
+                errores_materia["nrc"] = ["NRC repetido en el lote (materia %d)." % nrc_en_lote[nrc]]
+            if data.get("profesor"):
+                if str(materia.profesor_id).isdigit() and int(materia.profesor_id) in profesores_existentes:
+                    materia.profesor_id = int(materia.profesor_id)
+                else:
+                    errores_materia["profesor"] = ["El profesor seleccionado no existe."]
+
+            try:
+                materia.clean_fields(exclude=["id", "profesor"] + list(errores_materia))
+            except ValidationError as e:
+                errores_materia.update(e.message_dict)
+
+            if errores_materia:
+                errores.append({"indice": indice, "errores": errores_materia})
+                continue
+            nrc_en_lote[nrc] = indice
+            validas.append((indice, materia))
+
+        # Choques de horario contra lo guardado y entre las materias del lote, en
+        # orden: las que se eliminan o se actualizan dejan libre su horario anterior
+        filas = [HorarioUtils.fila(materia) for indice, materia in validas]
+        horarios = HorarioUtils.indice(filas + list(previas.values()), excluir=eliminadas | set(previas))
+        actualizadas = {materia.pk for indice, materia in validas}
+        for materia_id, previa in previas.items():
+            # Las que no pasaron las validaciones se quedan como están
+            if materia_id not in eliminadas and materia_id not in actualizadas:
+                horarios.agregar(previa)
+        for (indice, materia), fila in zip(validas, filas):
+            choques = horarios.choques(fila)
+            if choques:
+                errores.append({"indice": indice, "errores": {"horario": [HorarioUtils.mensaje(c) for c in choques]}})
+                if materia.pk:
+                    # Se queda como estaba
+                    horarios.agregar(previas[materia.pk])
+                continue
+            horarios.agregar(fila)
+            (cambiadas if materia.pk else nuevas).append(materia)
+        errores.sort(key=lambda error: error.get("indice", -1))
+
+        if errores and modo == "todo_o_nada":
+            return Response({"creadas": [], "actualizadas": [], "eliminadas": [], "errores": errores},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            with transaction.atomic():
+                if eliminadas:
+                    # _raw_delete: un DELETE por bloque, sin las señales (y el aumento de versión)
+                    # que .delete() manda por materia; nada apunta a Materias, no hay cascadas
+                    for bloque in ListUtils.bloques(sorted(eliminadas), ListUtils.CHUNK_SIZE):
+                        Materias.objects.filter(id__in=bloque)._raw_delete(Materias.objects.db)
+                if cambiadas:
+                    # bulk_update no llama a pre_save: la máscara de días se calcula aquí
+                    for materia in cambiadas:
+                        materia.dias_mask = Materias.mascara_dias(materia.dias)
+                    Materias.objects.bulk_update(cambiadas, self.CAMPOS + ("profesor", "dias_mask"), batch_size=ListUtils.CHUNK_SIZE)
+                if nuevas:
+                    Materias.objects.bulk_create(nuevas, batch_size=ListUtils.CHUNK_SIZE)
+                if eliminadas or cambiadas or nuevas:
+                    # bulk_create / bulk_update no mandan señales
+                    VersionTabla.incrementar("materias")
+        except IntegrityError:
+            # Otra petición guardó el mismo NRC entre la revisión y el INSERT: no se guardó nada
+            errores.append({"lote": True, "errores": {"nrc": [
+                "Otra petición registró alguno de estos NRC mientras se procesaba el lote; no se guardó nada, vuelve a intentar."
+            ]}})
+            return Response({"creadas": [], "actualizadas": [], "eliminadas": [], "errores": errores},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        respuesta = {
+            "creadas": [m.pk for m in nuevas],
+            "actualizadas": [m.pk for m in cambiadas],
+            "eliminadas": sorted(eliminadas),
+            "errores": errores,
+        }
+        if errores and not (nuevas or cambiadas or eliminadas):
+            return Response(respuesta, status=status.HTTP_400_BAD_REQUEST)
+        return Response(respuesta, 200)
@@ -10,15 +10,25 @@ from rest_framework.response import Response
 from django.contrib.auth.models import Group
 import json
 from django.shortcuts import get_object_or_404
+from app_escolar_api.list_utils import ListUtils
+from app_escolar_api.query_utils import QueryBudget
+from app_escolar_api.cache_utils import CacheUtils
+from app_escolar_api.registro_utils import RegistroUtils
 
 class AdminAll(generics.CreateAPIView):
     #Esta función es esencial para todo donde se requiera autorización de inicio de sesión (token)
     permission_classes = (permissions.IsAuthenticated,)
     # Invocamos la petición GET para obtener todos los administradores
+    @QueryBudget(2)
+    @CacheUtils.cacheable("administradores")
     def get(self, request, *args, **kwargs):
-        admin = Administradores.objects.filter(user__is_active = 1).order_by("id")
-        lista = AdminSerializer(admin, many=True).data
-        return Response(lista, 200)
+        # select_related: el UserSerializer anidado sale del mismo JOIN
+        admin = Administradores.objects.select_related("user").filter(user__is_active = 1).order_by("id")
+        # Paginación opcional: ?after=<id>&limit=N
+        if ListUtils.quiere_paginar(request):
+            return ListUtils.paginar(request, admin, AdminSerializer)
+        # Sin paginación: la lista completa se envía en streaming por bloques
+        return ListUtils.stream(request, admin, AdminSerializer)
 
 class AdminView(generics.CreateAPIView):
    # Permisos por método (sobrescribe el comportamiento default)
@@ -29,12 +39,21 @@ class AdminView(generics.CreateAPIView):
         return []  # POST no requiere autenticación
     
     #Obtener usuario por ID
+    @QueryBudget(2)
+    @CacheUtils.cacheable("administradores")
     def get(self, request, *args, **kwargs):
-        admin = get_object_or_404(Administradores, id = request.GET.get("id"))
-        admin = AdminSerializer(admin, many=False).data
+        # ?fields= / ?exclude= también aplican al detalle
+        try:
+            admins, serializer = ListUtils.preparar(request, Administradores.objects.select_related("user"), AdminSerializer)
+        except ValueError as e:
+            return Response({"details": str(e)}, 400)
+        admin = get_object_or_404(admins, id = request.GET.get("id"))
+        admin = serializer.to_representation(admin)
         # Si todo es correcto, regresamos la información
         return Response(admin, 200)
     
+    # 8 sentencias + la primera lectura del grupo en el proceso + savepoint en pruebas
+    @QueryBudget(11)
     @transaction.atomic
     def post(self, request, *args, **kwargs):
 
@@ -63,27 +82,12 @@ class AdminView(generics.CreateAPIView):
             return Response({"error": "El correo no es válido."}, 400)
 
         # Validar duplicado
-        if User.objects.filter(email=email).exists():
+        if RegistroUtils.email_registrado(email):
             return Response({"error": f"El email {email} ya está registrado."}, 400)
 
-        # Crear usuario
-        user = User.objects.create(
-            username=email,
-            email=email,
-            first_name=first_name,
-            last_name=last_name,
-            is_active=True
-        )
-        user.set_password(password)
-        user.save()
-
-        # Crear o asignar grupo
-        group, created = Group.objects.get_or_create(name=role)
-        group.user_set.add(user)
-
-        # Crear Administrador
-        admin = Administradores.objects.create(
-            user=user,
+        # Usuario (contraseña ya hasheada), grupo y Administrador: un INSERT cada uno
+        admin = RegistroUtils.registrar(
+            Administradores, role, first_name, last_name, email, password,
             clave_admin=request.data["clave_admin"],
             telefono=request.data["telefono"],
             rfc=request.data["rfc"].upper(),
@@ -102,7 +106,7 @@ class AdminView(generics.CreateAPIView):
         # Verifica que el usuario esté autenticado
         permission_classes = (permissions.IsAuthenticated,)
         # Primero obtenemos el administrador a actualizar
-        admin = get_object_or_404(Administradores, id=request.data["id"])
+        admin = get_object_or_404(Administradores.objects.select_related("user"), id=request.data["id"])
         admin.clave_admin = request.data["clave_admin"]
         admin.telefono = request.data["telefono"]
         admin.rfc = request.data["rfc"]
@@ -121,7 +125,7 @@ class AdminView(generics.CreateAPIView):
     # Eliminar administrador con delete (Borrar realmente)
     @transaction.atomic
     def delete(self, request, *args, **kwargs):
-        administrador = get_object_or_404(Administradores, id=request.GET.get("id"))
+        administrador = get_object_or_404(Administradores.objects.select_related("user"), id=request.GET.get("id"))
         try:
             administrador.user.delete()
             return Response({"details":"Administrador eliminado"},200)
@@ -130,34 +134,18 @@ class AdminView(generics.CreateAPIView):
         
 class TotalUsers(generics.CreateAPIView):
     #Contar el total de cada tipo de usuarios
+    @QueryBudget(3)
     def get(self, request, *args, **kwargs):
-        # TOTAL ADMINISTRADORES
-        admin_qs = Administradores.objects.filter(user__is_active=True)
-        total_admins = admin_qs.count()
-
-        # TOTAL MAESTROS
-        maestros_qs = Maestros.objects.filter(user__is_active=True)
-        lista_maestros = MaestroSerializer(maestros_qs, many=True).data
-
-        # Convertir materias_json solo si existen maestros
-        for maestro in lista_maestros:
-            try:
-                maestro["materias_json"] = json.loads(maestro["materias_json"])
-            except Exception:
-                maestro["materias_json"] = []  # fallback seguro
-
-        total_maestros = maestros_qs.count()
-
-        # TOTAL ALUMNOS
-        alumnos_qs = Alumnos.objects.filter(user__is_active=True)
-        total_alumnos = alumnos_qs.count()
+        # Los contadores se mantienen al crear/eliminar/activar usuarios (ver models.Contador),
+        # así que aquí solo se lee una fila por tipo
+        totales = Contador.obtener()
 
         # Respuesta final SIEMPRE válida
         return Response(
             {
-                "admins": total_admins,
-                "maestros": total_maestros,
-                "alumnos": total_alumnos
+                "admins": totales["admins"],
+                "maestros": totales["maestros"],
+                "alumnos": totales["alumnos"]
             },
             status=200
         )
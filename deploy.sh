@@ -1 +1,14 @@
-gcloud app deploy --project pik-api
+#!/bin/sh
+# CRYPTO_PASSWORD (llave de CURP/RFC/teléfonos cifrados) vive en Secret Manager,
+# no en el repo; sin ella la app no arranca en App Engine. Se crea una sola vez:
+#   printf '%s' "<contraseña larga>" | gcloud secrets create crypto-password --data-file=- --project pik-api
+# Este script la lee y despliega una copia de app.yaml con env_variables.
+set -e
+PROYECTO=pik-api
+CRYPTO_PASSWORD=$(gcloud secrets versions access latest --secret=crypto-password --project "$PROYECTO")
+trap 'rm -f app.deploy.yaml' EXIT
+{
+    cat app.yaml
+    printf "\nenv_variables:\n  CRYPTO_PASSWORD: '%s'\n" "$(printf '%s' "$CRYPTO_PASSWORD" | sed "s/'/''/g")"
+} > app.deploy.yaml
+gcloud app deploy app.deploy.yaml --project "$PROYECTO"